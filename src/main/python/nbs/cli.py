@@ -0,0 +1,283 @@
+"""
+Command-line tools to process many song files at once, without the GUI.
+
+Files are distributed over a pool of worker processes in chunks, and each file is
+processed independently: a file that can't be read is reported, and doesn't stop
+the others from being processed. A JSON object is written for each file, one per
+line, in the order the files were given.
+
+Usage:
+    python -m nbs.cli info SONGS_DIR > info.jsonl
+    python -m nbs.cli validate SONGS_DIR --jobs 8 --report report.jsonl
+    python -m nbs.cli convert SONGS_DIR --version 5 --output CONVERTED_DIR
+    python -m nbs.cli convert ARCHIVE_DIR --compress xz --replace
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from functools import partial
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO
+
+import numpy as np
+
+from nbs.core.data import NBS_VERSION, Song
+from nbs.core.file import (
+    COMPRESSION_EXTENSIONS,
+    get_compression,
+    load_song,
+    read_song_header,
+    save_song,
+)
+
+SONG_EXTENSION = ".nbs"
+SONG_EXTENSIONS = (SONG_EXTENSION,) + tuple(
+    SONG_EXTENSION + extension for extension in COMPRESSION_EXTENSIONS
+)
+
+Result = Dict[str, Any]
+
+
+def find_songs(paths: Iterable[str]) -> Iterator[str]:
+    """Yield the paths in `paths`, with directories replaced by the songs in them."""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(SONG_EXTENSIONS):
+                    yield os.path.join(root, name)
+
+
+def get_output_path(path: str, roots: Sequence[str], output: str) -> str:
+    """
+    Return the path in the `output` directory for the song at `path`. Songs found
+    in one of the directories in `roots` keep their path relative to it.
+    """
+    path = os.path.normpath(path)
+    for root in roots:
+        if os.path.isdir(root) and os.path.commonpath([root, path]) == root:
+            return os.path.join(output, os.path.relpath(path, root))
+    return os.path.join(output, os.path.basename(path))
+
+
+def set_compression(path: str, compression: Optional[str]) -> str:
+    """
+    Return `path` with the extension of the given compression format (or with no
+    compression extension if `compression` is "none").
+    """
+    if get_compression(path) is not None:
+        path, _ = os.path.splitext(path)
+    for extension, name in COMPRESSION_EXTENSIONS.items():
+        if name == compression:
+            return path + extension
+    return path
+
+
+########## Commands ##########
+
+
+def song_info(path: str) -> Result:
+    """Return the header of a song, and a summary of its notes."""
+    info = read_song_header(path)
+    return {
+        **asdict(info.header),
+        "note_count": info.note_count,
+        "layer_count": info.layer_count,
+        "length": info.length,
+        "duration": info.duration,
+    }
+
+
+def validate_song(path: str) -> Result:
+    """Read a whole song, and return a summary of it with the problems found."""
+    song = load_song(path)
+    return {
+        "version": song.header.version,
+        "note_count": len(song.notes),
+        "layer_count": len(song.layers),
+        "instrument_count": len(song.instruments),
+        "problems": find_problems(song),
+    }
+
+
+def find_problems(song: Song) -> List[str]:
+    """
+    Return a description of each problem found in `song`: things the NBS format
+    allows, but that Note Block Studio doesn't expect.
+    """
+    notes = song.notes
+    problems = []
+    outside = np.count_nonzero(notes.layer >= len(song.layers))
+    if outside > 0:
+        problems.append(f"{outside} notes in layers past the last layer")
+    instrument_count = song.header.default_instruments + len(song.instruments)
+    unknown = np.count_nonzero(notes.instrument >= instrument_count)
+    if unknown > 0:
+        problems.append(f"{unknown} notes with unknown instruments")
+    cells = notes.tick.astype(np.int64) << 32 | notes.layer.astype(np.int64)
+    overlapping = len(cells) - len(np.unique(cells))
+    if overlapping > 0:
+        problems.append(f"{overlapping} notes in the same cell as another note")
+    return problems
+
+
+def convert_song(path: str, output: str, version: int, replace: bool = False) -> Result:
+    """
+    Save the song at `path` to `output` in the given NBS `version`, compressed
+    according to the extension of `output`. If `replace` is set, the song at
+    `path` is removed once it's been saved to another path.
+    """
+    song = load_song(path)
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    save_song(song, output, version=version)
+    if replace and os.path.abspath(output) != os.path.abspath(path):
+        os.remove(path)
+    return {
+        "output": output,
+        "from_version": song.header.version,
+        "version": version,
+        "note_count": len(song.notes),
+        "size": os.path.getsize(output),
+    }
+
+
+def run_job(
+    command: str,
+    job: Sequence[str],
+    version: int = NBS_VERSION,
+    replace: bool = False,
+) -> Result:
+    """
+    Run `command` on the song at `job[0]` (writing to `job[1]` for conversions),
+    and return the result, or the error that prevented it.
+    """
+    path = job[0]
+    try:
+        if command == "info":
+            result = song_info(path)
+        elif command == "validate":
+            result = validate_song(path)
+        else:
+            result = convert_song(path, job[1], version, replace)
+    except Exception as e:
+        return {"path": path, "ok": False, "error": f"{type(e).__name__}: {e}"}
+    return {"path": path, "ok": True, **result}
+
+
+def run_jobs(
+    command: str,
+    jobs: Sequence[Sequence[str]],
+    workers: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+    version: int = NBS_VERSION,
+    replace: bool = False,
+) -> Iterator[Result]:
+    """
+    Run `command` on all `jobs` in a pool of `workers` processes (one per CPU by
+    default), and yield the results in order as they're available. Jobs are sent
+    to the workers in chunks of `chunk_size`, which is chosen so that each worker
+    gets several chunks by default.
+    """
+    function = partial(run_job, command, version=version, replace=replace)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) <= 1:
+        yield from map(function, jobs)
+        return
+    if chunk_size is None:
+        chunk_size = max(1, min(64, len(jobs) // (workers * 4)))
+    with ProcessPoolExecutor(min(workers, len(jobs))) as executor:
+        yield from executor.map(function, jobs, chunksize=chunk_size)
+
+
+########## Entry point ##########
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="nbs", description="Process song files in batch."
+    )
+    parser.add_argument(
+        "command",
+        choices=["info", "validate", "convert"],
+        help="read the song headers, read and check the whole songs, "
+        "or save the songs in another version",
+    )
+    parser.add_argument(
+        "paths", nargs="+", help="song files, or directories to search for songs"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, help="number of worker processes (default: CPUs)"
+    )
+    parser.add_argument("--chunk-size", type=int, help="songs sent to a worker at once")
+    parser.add_argument(
+        "-r", "--report", default="-", help="JSON lines report file (default: stdout)"
+    )
+    parser.add_argument(
+        "-o", "--output", help="directory for converted songs (default: in place)"
+    )
+    parser.add_argument(
+        "--version",
+        type=int,
+        default=NBS_VERSION,
+        choices=range(NBS_VERSION + 1),
+        help=f"NBS version of converted songs (default: {NBS_VERSION})",
+    )
+    parser.add_argument(
+        "--compress",
+        choices=["none", *COMPRESSION_EXTENSIONS.values()],
+        help="compression of converted songs (default: as the original songs)",
+    )
+    parser.add_argument(
+        "--replace",
+        action="store_true",
+        help="remove the original songs once converted to another path",
+    )
+    return parser.parse_args(argv)
+
+
+def write_report(results: Iterable[Result], file: TextIO) -> int:
+    """Write `results` to `file` as JSON lines, and return how many failed."""
+    failed = 0
+    for result in results:
+        failed += not result["ok"]
+        file.write(json.dumps(result, ensure_ascii=False) + "\n")
+    return failed
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    paths = list(find_songs(args.paths))
+    if args.output is not None:
+        roots = [os.path.normpath(path) for path in args.paths]
+        jobs = [(path, get_output_path(path, roots, args.output)) for path in paths]
+    else:
+        jobs = [(path, path) for path in paths]
+    if args.compress is not None:
+        jobs = [(path, set_compression(output, args.compress)) for path, output in jobs]
+
+    start = time.perf_counter()
+    results = run_jobs(
+        args.command, jobs, args.jobs, args.chunk_size, args.version, args.replace
+    )
+    if args.report == "-":
+        failed = write_report(results, sys.stdout)
+    else:
+        with open(args.report, "w", encoding="utf-8") as f:
+            failed = write_report(results, f)
+    elapsed = time.perf_counter() - start
+    print(
+        f"Processed {len(jobs)} songs in {elapsed:.1f}s ({failed} failed)",
+        file=sys.stderr,
+    )
+    return 1 if failed > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
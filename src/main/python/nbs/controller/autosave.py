@@ -0,0 +1,135 @@
+from dataclasses import replace
+from typing import Optional
+
+import numpy as np
+from PyQt5 import QtCore
+
+from nbs.controller.note import NoteChange
+from nbs.controller.song import SongController
+from nbs.core.data import NoteStore
+from nbs.core.journal import DEFAULT_COMPACT_SIZE, Journal
+from nbs.utils.file import PathLike
+
+# Milliseconds between checks for errors writing the journal
+ERROR_CHECK_INTERVAL = 2000
+
+
+class AutosaveController(QtCore.QObject):
+    """
+    Object that records every edit made to the song in a `Journal`, so that the
+    song can be recovered with `read_journal()` if the application crashes.
+
+    Changes to the notes are recorded as they're made. Changes to the layers and
+    instruments are recorded once per pass of the event loop, as many of them
+    are usually made at once. Songs being loaded aren't recorded until they're
+    fully loaded, and then replace the journal.
+
+    If the journal can't be written (e.g. the disk is full), `autosaveFailed` is
+    emitted, and a new snapshot is taken regularly until one is written.
+    """
+
+    autosaveFailed = QtCore.pyqtSignal(str)
+
+    def __init__(
+        self,
+        songController: SongController,
+        path: PathLike,
+        compactSize: int = DEFAULT_COMPACT_SIZE,
+        parent: Optional[QtCore.QObject] = None,
+    ) -> None:
+        super().__init__(parent)
+        self.songController = songController
+        self.noteController = songController.noteController
+        self.journal = Journal(path, compactSize)
+        self.running = False
+        self.failed = False
+
+        self.songTimer = QtCore.QTimer(self)
+        self.songTimer.setSingleShot(True)
+        self.songTimer.setInterval(0)
+        self.songTimer.timeout.connect(self.recordSong)
+
+        self.errorTimer = QtCore.QTimer(self)
+        self.errorTimer.setInterval(ERROR_CHECK_INTERVAL)
+        self.errorTimer.timeout.connect(self.checkJournal)
+
+        self.noteController.notesChanged.connect(self.onNotesChanged)
+        layers = songController.layerController
+        for signal in (
+            layers.layerAdded,
+            layers.layerRemoved,
+            layers.layerSwapped,
+            layers.layerNameChanged,
+            layers.layerVolumeChanged,
+            layers.layerPanningChanged,
+            layers.layerLockChanged,
+            layers.layerSoloChanged,
+        ):
+            signal.connect(self.onSongChanged)
+        instruments = songController.instrumentController
+        for signal in (
+            instruments.instrumentAdded,
+            instruments.instrumentChanged,
+            instruments.instrumentRemoved,
+            instruments.instrumentSwapped,
+        ):
+            signal.connect(self.onSongChanged)
+        songController.songLoaded.connect(self.snapshot)
+        songController.songLoadCanceled.connect(self.snapshot)
+
+    def start(self) -> None:
+        """Start a new journal with the current song."""
+        self.running = True
+        self.snapshot()
+        self.errorTimer.start()
+
+    def stop(self) -> None:
+        """Stop recording, and delete the journal, e.g. when quitting normally."""
+        self.running = False
+        self.songTimer.stop()
+        self.errorTimer.stop()
+        self.journal.close(discard=True)
+
+    @QtCore.pyqtSlot()
+    def snapshot(self) -> None:
+        if not self.running or self.songController.isLoading:
+            return
+        self.songTimer.stop()
+        self.journal.snapshot(self.songController.snapshot(), self.noteController.ids)
+
+    @QtCore.pyqtSlot()
+    def checkJournal(self) -> None:
+        error = self.journal.error
+        if error is None:
+            self.failed = False
+            return
+        if not self.failed:
+            self.failed = True
+            self.autosaveFailed.emit(str(error))
+        # The changes since the error weren't recorded, so start over
+        self.snapshot()
+
+    def onNotesChanged(self, change: NoteChange) -> None:
+        if not self.running or self.songController.isLoading:
+            return
+        if change.reset:
+            self.snapshot()
+            return
+        ids = np.concatenate((change.added, change.modified))
+        self.journal.record_notes(
+            change.removed, ids, self.noteController.getNotes(ids)
+        )
+        if self.journal.needs_snapshot:
+            self.snapshot()
+
+    def onSongChanged(self, *args) -> None:
+        if self.running and not self.songController.isLoading:
+            self.songTimer.start()
+
+    @QtCore.pyqtSlot()
+    def recordSong(self) -> None:
+        if not self.running:
+            return
+        # Copy everything but the notes, which are recorded separately
+        song = replace(self.songController.song, notes=NoteStore())
+        self.journal.record_song(song.snapshot())
@@ -1,14 +1,14 @@
 import pickle
-from typing import List, Optional
+from typing import Optional
 
 from PyQt5 import QtCore, QtGui
 
-from nbs.core.data import Note
+from nbs.core.data import NoteStore
 
 MIMETYPE = "application/nbs-noteblock-selection"
 
 
-def selectionToMimeData(notes: List[Note]) -> QtCore.QMimeData:
+def selectionToMimeData(notes: NoteStore) -> QtCore.QMimeData:
     mimeData = QtCore.QMimeData()
     mimeData.setData(
         MIMETYPE,
@@ -17,15 +17,17 @@ def selectionToMimeData(notes: List[Note]) -> QtCore.QMimeData:
     return mimeData
 
 
-def mimeDataToSelection(mimeData: QtCore.QMimeData) -> List[Note]:
+def mimeDataToSelection(mimeData: QtCore.QMimeData) -> NoteStore:
     if not mimeData.hasFormat(MIMETYPE):
         raise ValueError("MimeData does not contain a valid selection")
-    data: List[Note] = pickle.loads(mimeData.data(MIMETYPE))
+    data = pickle.loads(mimeData.data(MIMETYPE))
+    if not isinstance(data, NoteStore):
+        raise ValueError("MimeData does not contain a valid selection")
     return data
 
 
 class ClipboardController(QtCore.QObject):
-    clipboardChanged = QtCore.pyqtSignal(list)
+    clipboardChanged = QtCore.pyqtSignal(object)
     clipboardCountChanged = QtCore.pyqtSignal(int)
 
     def __init__(
@@ -34,7 +36,7 @@ class ClipboardController(QtCore.QObject):
         super().__init__(parent)
         self._clipboard = clipboard
         self._clipboard.dataChanged.connect(self._onClipboardChanged)
-        self._content: List[Note] = []
+        self._content = NoteStore()
 
     def _setMimeData(self, mimeData: QtCore.QMimeData) -> None:
         if mimeData.hasFormat(MIMETYPE):
@@ -54,16 +56,16 @@ class ClipboardController(QtCore.QObject):
         try:
             self._content = mimeDataToSelection(self._clipboard.mimeData())
         except ValueError:
-            self._content = []
+            self._content = NoteStore()
         self.clipboardChanged.emit(self._content)
         self.clipboardCountChanged.emit(len(self._content))
 
-    @QtCore.pyqtSlot(list)
-    def setContent(self, notes: List[Note]) -> None:
+    @QtCore.pyqtSlot(object)
+    def setContent(self, notes: NoteStore) -> None:
         self._setMimeData(selectionToMimeData(notes))
         self.clipboardChanged.emit(notes)
         self.clipboardCountChanged.emit(len(notes))
 
     @QtCore.pyqtSlot()
-    def getContent(self) -> List[Note]:
+    def getContent(self) -> NoteStore:
         return self._content
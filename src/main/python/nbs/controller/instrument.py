@@ -128,6 +128,7 @@ class InstrumentController(QtCore.QObject):
     instrumentAdded = QtCore.pyqtSignal(InstrumentInstance)
     instrumentChanged = QtCore.pyqtSignal(int, InstrumentInstance)
     instrumentRemoved = QtCore.pyqtSignal(int)
+    instrumentRemoveRefused = QtCore.pyqtSignal(int)
     instrumentSwapped = QtCore.pyqtSignal(int, int)
 
     instrumentNameChanged = QtCore.pyqtSignal(int, str)
@@ -138,7 +139,7 @@ class InstrumentController(QtCore.QObject):
     instrumentListUpdated = QtCore.pyqtSignal(list)
     currentInstrumentChanged = QtCore.pyqtSignal(int)
 
-    instrumentSoundLoadRequested = QtCore.pyqtSignal(str)
+    instrumentSoundLoadRequested = QtCore.pyqtSignal(int, str)
 
     def __init__(
         self, instruments: Sequence[Instrument], parent: Optional[QtCore.QObject] = None
@@ -190,7 +191,9 @@ class InstrumentController(QtCore.QObject):
         Adds the instrument `ins` to the instrument list, and emits the appropriate signals.
         """
         instrumentInstance = self._loadInstrument(ins)
-        self.instrumentSoundLoadRequested.emit(str(instrumentInstance.absSoundPath))
+        self.instrumentSoundLoadRequested.emit(
+            instrumentInstance.id, str(instrumentInstance.absSoundPath)
+        )
         self.instrumentAdded.emit(instrumentInstance)
         self.instrumentListUpdated.emit(self.instruments)
 
@@ -198,8 +201,12 @@ class InstrumentController(QtCore.QObject):
     def removeInstrument(self, id: int) -> None:
         """
         Remove the instrument with ID `id` from the instrument list,
-        emitting the appropriate signals.
+        emitting the appropriate signals. Instruments used by note blocks
+        aren't removed: `instrumentRemoveRefused` is emitted instead.
         """
+        if self.instruments[id].blockCount > 0:
+            self.instrumentRemoveRefused.emit(id)
+            return
         self.instruments.pop(id)
         self.instrumentRemoved.emit(id)
         self.instrumentListUpdated.emit(self.instruments)
@@ -230,21 +237,8 @@ class InstrumentController(QtCore.QObject):
     #       attributes to change, and then emit a signal for each attribute
     #       that changed. This would allow for more flexibility in the future.
 
-    # TODO: It's weird that the main window should be responsible for updating
-    #       the instrument block count. It would be better if the instrument controller
-    #       was tied to a SongController that had methods to add/remove blocks,
-    #       and took care of it for the MainWindow, hiding the complexity (a Facade pattern).
-
-    @QtCore.pyqtSlot(int)
-    def addBlockToCount(self, id: int) -> None:
-        self.instruments[id].blockCount += 1
-
-    @QtCore.pyqtSlot(int)
-    def removeBlockFromCount(self, id: int) -> None:
-        self.instruments[id].blockCount -= 1
-
-    def changeBlockCount(self, id: int, amount: int) -> None:
-        self.instruments[id].blockCount += amount
+    # The block count of each instrument is kept up to date by the SongController,
+    # from the statistics of the NoteController.
 
     @QtCore.pyqtSlot(int, int)
     def setBlockCount(self, id: int, count: int) -> None:
@@ -269,7 +263,7 @@ class InstrumentController(QtCore.QObject):
         ins = self.instruments[id]
         ins.sound_path = copy_sound_file(sound)
         self.instrumentSoundChanged.emit(id, sound)
-        self.instrumentSoundLoadRequested.emit(str(ins.sound_path))
+        self.instrumentSoundLoadRequested.emit(id, str(ins.sound_path))
         self.instrumentChanged.emit(id, self.instruments[id])
         self.instrumentListUpdated.emit(self.instruments)
 
@@ -3,6 +3,12 @@ from typing import List, Optional, Sequence
 from PyQt5 import QtCore
 
 from nbs.core.data import Layer
+from nbs.core.history import (
+    History,
+    InsertLayerCommand,
+    RemoveLayerCommand,
+    SwapLayersCommand,
+)
 
 EMPTY_LAYER = Layer()
 
@@ -21,9 +27,15 @@ class LayerController(QtCore.QObject):
     layerLockChanged = QtCore.pyqtSignal(int, bool)
     layerSoloChanged = QtCore.pyqtSignal(int, bool)
 
-    def __init__(self, layers: List[Layer], parent: QtCore.QObject = None) -> None:
+    def __init__(
+        self,
+        layers: List[Layer],
+        history: Optional[History] = None,
+        parent: QtCore.QObject = None,
+    ) -> None:
         super().__init__(parent)
         self.layers = layers
+        self.history = history if history is not None else History()
         self.workspaceLayerCount = 0
 
     def setWorkspaceLayerCount(self, count: int) -> None:
@@ -112,12 +124,18 @@ class LayerController(QtCore.QObject):
             layer = Layer()
         self.layers.insert(index, layer)
         self.layerAdded.emit(index, layer)
+        self.history.push(InsertLayerCommand(self, index, layer))
         self.updatePopulatedLayerCount()
 
     @QtCore.pyqtSlot(int)
     def removeLayer(self, id: int) -> None:
-        self.layers.pop(id)
-        self.layerRemoved.emit(id)
+        # Objects connected to `layerRemoved` may record their own changes (e.g. the
+        # notes removed along with the layer), so they're grouped with the removal.
+        # The layer command is pushed last so that it's undone first.
+        with self.history.group("Remove layer"):
+            layer = self.layers.pop(id)
+            self.layerRemoved.emit(id)
+            self.history.push(RemoveLayerCommand(self, id, layer))
         self.updatePopulatedLayerCount()
 
     @QtCore.pyqtSlot(int, str)
@@ -160,4 +178,5 @@ class LayerController(QtCore.QObject):
             raise ValueError("Can't swap layers with negative IDs")
         self.layers[id1], self.layers[id2] = self.layers[id2], self.layers[id1]
         self.layerSwapped.emit(id1, id2)
+        self.history.push(SwapLayersCommand(self, id1, id2))
         self.updatePopulatedLayerCount()
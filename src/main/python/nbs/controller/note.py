@@ -0,0 +1,470 @@
+"""
+The note controller owns the notes in a song, and is the single source of truth
+for them. Views (such as the note block area) don't modify notes directly: they
+request changes to the controller, and update themselves when it notifies them
+of what changed.
+
+This module doesn't depend on Qt, so the note data can be edited and tested
+without a running application.
+"""
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import FrozenSet, Iterable, Iterator, List, Optional, Set, Union
+
+import numpy as np
+
+from nbs.core.data import NoteStore
+from nbs.core.history import (
+    AddNotesCommand,
+    ChangeNotesCommand,
+    History,
+    MoveNotesCommand,
+    RemoveNotesCommand,
+)
+from nbs.core.selection import Selection
+from nbs.core.signal import Signal
+from nbs.core.stats import NoteStatistics
+
+Values = Union[int, np.ndarray]
+
+
+def _empty_ids() -> np.ndarray:
+    return np.zeros(0, np.int64)
+
+
+def _contains(sortedIds: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """Return a mask of which of `ids` are present in the sorted array `sortedIds`."""
+    if len(sortedIds) == 0:
+        return np.zeros(len(ids), dtype=bool)
+    index = np.searchsorted(sortedIds, ids)
+    return sortedIds[np.minimum(index, len(sortedIds) - 1)] == ids
+
+
+def _cells(ticks: np.ndarray, layers: np.ndarray) -> np.ndarray:
+    """Encode (tick, layer) positions as integers that sort by tick, then by layer."""
+    return np.asarray(ticks, np.int64) << 32 | np.asarray(layers, np.int64)
+
+
+def _clampOffsets(values: np.ndarray, offsets: Values) -> Values:
+    """
+    Return `offsets`, raised by the same amount for all values if needed so that
+    none of `values` is moved below 0.
+    """
+    lowest = int((values.astype(np.int64) + offsets).min())
+    return offsets - lowest if lowest < 0 else offsets
+
+
+def _groupRanks(groups: np.ndarray) -> np.ndarray:
+    """Return the index of each item of the sorted array `groups` within its group."""
+    if len(groups) == 0:
+        return np.zeros(0, np.int64)
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    lengths = np.diff(np.r_[starts, len(groups)])
+    return np.arange(len(groups)) - np.repeat(starts, lengths)
+
+
+def _stackNotes(
+    ticks: np.ndarray, layers: np.ndarray, occupied: np.ndarray
+) -> np.ndarray:
+    """
+    Return new layers for notes placed at `ticks` and `layers`, so that no two of
+    them share a cell, and none of them is in a cell in `occupied` (given as
+    `_cells()`). Notes that would overlap are moved down to the next free layer,
+    keeping their vertical order.
+
+    All notes are placed in a single pass: each layer is converted to its rank
+    among the free layers of its tick, the notes in each tick are given distinct
+    ranks, and the ranks are converted back to layers.
+    """
+    ticks = np.asarray(ticks, np.int64)
+    layers = np.asarray(layers, np.int64)
+    size = len(ticks)
+    if size == 0:
+        return layers
+    occupied = np.unique(occupied)
+
+    # Rank of each layer among the free layers of its tick
+    tickStart = np.searchsorted(occupied, ticks << 32)
+    free = layers - (np.searchsorted(occupied, _cells(ticks, layers)) - tickStart)
+
+    # In each tick, give each note the lowest rank that isn't below its own rank
+    # or the rank of the note above it: rank[i] = max(free[i], rank[i - 1] + 1)
+    order = np.lexsort((layers, free, ticks))
+    sortedTicks = ticks[order]
+    position = _groupRanks(sortedTicks)
+    offset = free[order] - position + size
+    group = np.cumsum(np.r_[0, sortedTicks[1:] != sortedTicks[:-1]])
+    span = int(offset.max()) + 1
+    offset = np.maximum.accumulate(offset + group * span) - group * span - size
+    rank = np.empty(size, np.int64)
+    rank[order] = position + offset
+
+    # The free layer with a given rank is above the occupied cells of its tick whose
+    # layer, minus the number of occupied cells above them, isn't past the rank
+    occupiedTicks = occupied >> 32
+    occupiedLayers = occupied & 0xFFFFFFFF
+    adjusted = _cells(occupiedTicks, occupiedLayers - _groupRanks(occupiedTicks))
+    tickStart = np.searchsorted(adjusted, ticks << 32)
+    skipped = np.searchsorted(adjusted, _cells(ticks, rank), side="right") - tickStart
+    return rank + skipped
+
+
+@dataclass
+class NoteChange:
+    """
+    The changes made to the notes of a `NoteController` in a single transaction.
+
+    Notes are identified by their IDs. A note that was removed and added again in
+    the same transaction is reported as modified. If `reset` is set, all notes were
+    replaced, and `added` holds the IDs of all notes in the controller.
+    """
+
+    added: np.ndarray = field(default_factory=_empty_ids)
+    removed: np.ndarray = field(default_factory=_empty_ids)
+    modified: np.ndarray = field(default_factory=_empty_ids)
+    # Names of the columns that were modified
+    fields: FrozenSet[str] = frozenset()
+    # The notes that were removed, in the same order as `removed`
+    removedNotes: NoteStore = field(default_factory=NoteStore)
+    reset: bool = False
+
+    def __bool__(self) -> bool:
+        return (
+            self.reset
+            or len(self.added) > 0
+            or len(self.removed) > 0
+            or len(self.modified) > 0
+        )
+
+
+class _Transaction:
+    """Accumulates the changes made during a transaction."""
+
+    def __init__(self, startIds: np.ndarray) -> None:
+        self.startIds = startIds
+        self.touched: List[np.ndarray] = []
+        self.removed: List[np.ndarray] = []
+        self.removedNotes: List[NoteStore] = []
+        self.fields: Set[str] = set()
+        self.reset = False
+
+
+class NoteController:
+    """
+    Object that manages the notes in a song.
+
+    Notes are kept in a `NoteStore`, sorted by a unique ID that never changes and
+    is never reused, so that other objects (e.g. the commands in the history) can
+    keep referring to a note while others are added or removed.
+
+    Edits are recorded in `history`, and made in transactions: `notesChanged` is
+    emitted once per transaction, with a `NoteChange` describing all the changes
+    made during it. Each editing method runs in its own transaction, unless it's
+    called inside `transaction()`.
+
+    `stats` is updated on every edit, so aggregates such as the note count or the
+    song length can be read at any time without going through the notes.
+    `selection` holds the IDs of the selected notes; notes are deselected when
+    they're removed.
+    """
+
+    def __init__(
+        self, notes: Optional[NoteStore] = None, history: Optional[History] = None
+    ) -> None:
+        self.notes = NoteStore()
+        self.ids = _empty_ids()
+        self.nextId = 0
+        self.history = history if history is not None else History()
+        self.notesChanged = Signal()
+        self.stats = NoteStatistics()
+        self.selection = Selection()
+        self._transaction: Optional[_Transaction] = None
+        if notes is not None:
+            self.load(notes)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, id: int) -> bool:
+        return bool(_contains(self.ids, np.array([id]))[0])
+
+    ########## Queries ##########
+
+    def getRows(self, ids: np.ndarray) -> np.ndarray:
+        """Return the positions of the notes with IDs `ids` in the store."""
+        ids = np.asarray(ids, np.int64)
+        if not _contains(self.ids, ids).all():
+            raise KeyError("Some of the given note IDs don't exist")
+        return np.searchsorted(self.ids, ids)
+
+    def getNotes(self, ids: np.ndarray) -> NoteStore:
+        """Return a copy of the notes with IDs `ids`."""
+        return self.notes[self.getRows(ids)]
+
+    def snapshot(self) -> NoteStore:
+        """Return a read-only copy of all notes, in constant time."""
+        return self.notes.snapshot()
+
+    ########## Transactions ##########
+
+    @contextmanager
+    def transaction(self, description: str = "") -> Iterator[None]:
+        """
+        Group all changes made inside this context in a single change notification
+        and a single step in the history. Nested transactions are merged into the
+        outermost one.
+        """
+        if self._transaction is not None:
+            yield
+            return
+        self._transaction = _Transaction(self.ids)
+        try:
+            with self.history.group(description):
+                yield
+        finally:
+            transaction, self._transaction = self._transaction, None
+            change = self._getChange(transaction)
+            if change:
+                self.notesChanged.emit(change)
+
+    def _getChange(self, transaction: _Transaction) -> NoteChange:
+        if transaction.reset:
+            return NoteChange(added=self.ids, reset=True)
+        if not transaction.touched:
+            return NoteChange()
+
+        touched = np.unique(np.concatenate(transaction.touched))
+        before = _contains(transaction.startIds, touched)
+        after = _contains(self.ids, touched)
+        removed = touched[before & ~after]
+
+        removedNotes = NoteStore()
+        if len(removed) > 0:
+            # Take the notes as they were when they were first removed
+            removedIds = np.concatenate(transaction.removed)
+            uniqueIds, first = np.unique(removedIds, return_index=True)
+            allRemoved = NoteStore()
+            for notes in transaction.removedNotes:
+                allRemoved.extend(notes)
+            removedNotes = allRemoved[first[np.searchsorted(uniqueIds, removed)]]
+
+        modified = touched[before & after]
+        fields = set(transaction.fields)
+        if (
+            transaction.removed
+            and np.isin(modified, np.concatenate(transaction.removed)).any()
+        ):
+            # Notes that were removed and added again may have changed in any way
+            fields.update(NoteStore.COLUMNS)
+
+        return NoteChange(
+            added=touched[~before & after],
+            removed=removed,
+            modified=modified,
+            fields=frozenset(fields),
+            removedNotes=removedNotes,
+        )
+
+    def _touch(self, ids: np.ndarray, fields: Iterable[str] = ()) -> None:
+        self._transaction.touched.append(ids)
+        self._transaction.fields.update(fields)
+
+    ########## Editing ##########
+
+    def load(self, notes: NoteStore) -> None:
+        """Replace all notes in the controller with `notes`. This isn't recorded."""
+        if notes is self.notes:
+            notes = notes.copy()
+        self.selection.clear()
+        with self.transaction():
+            self.notes.clear()
+            self.notes.extend(notes)
+            self.stats.reset(self.notes)
+            self.ids = np.arange(len(notes), dtype=np.int64)
+            self.nextId = len(notes)
+            self._transaction.reset = True
+
+    def addNotes(
+        self, notes: NoteStore, ids: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """
+        Add `notes` to the controller, and return their IDs. New IDs are assigned
+        to them, unless `ids` is given (e.g. to restore notes that were removed).
+        """
+        if ids is None:
+            ids = np.arange(self.nextId, self.nextId + len(notes), dtype=np.int64)
+        else:
+            ids = np.asarray(ids, np.int64)
+            if _contains(self.ids, ids).any():
+                raise ValueError("Some of the given note IDs already exist")
+        if len(ids) == 0:
+            return ids
+        self.nextId = max(self.nextId, int(ids.max()) + 1)
+
+        with self.transaction():
+            self.history.push(AddNotesCommand(self, ids, notes.copy()))
+            self.notes.extend(notes)
+            self.stats.add(notes)
+            allIds = np.concatenate((self.ids, ids))
+            if (len(self.ids) > 0 and ids[0] < self.ids[-1]) or np.any(
+                ids[1:] < ids[:-1]
+            ):
+                order = np.argsort(allIds, kind="stable")
+                for name in NoteStore.COLUMNS:
+                    column = self.notes.writeable_column(name)
+                    column[:] = column[order]
+                allIds = allIds[order]
+            self.ids = allIds
+            self._touch(ids)
+        return ids
+
+    def appendNotes(self, notes: NoteStore) -> np.ndarray:
+        """
+        Add `notes` to the controller with new IDs, and return them. Like `load()`,
+        this isn't recorded, so a song can be loaded in parts.
+        """
+        ids = np.arange(self.nextId, self.nextId + len(notes), dtype=np.int64)
+        if len(ids) == 0:
+            return ids
+        self.nextId += len(notes)
+        with self.transaction():
+            self.notes.extend(notes)
+            self.stats.add(notes)
+            self.ids = np.concatenate((self.ids, ids))
+            self._touch(ids)
+        return ids
+
+    def removeNotes(self, ids: np.ndarray) -> None:
+        ids = np.asarray(ids, np.int64)
+        if len(ids) == 0:
+            return
+        rows = self.getRows(ids)
+        with self.transaction():
+            removed = self.notes[rows]
+            self.history.push(RemoveNotesCommand(self, ids, removed))
+            self.notes.delete(rows)
+            self.stats.remove(removed)
+            self.selection.deselect(ids)
+            self.ids = np.delete(self.ids, rows)
+            self._transaction.removed.append(ids)
+            self._transaction.removedNotes.append(removed)
+            self._touch(ids)
+
+    def moveNotes(self, ids: np.ndarray, ticks: Values, layers: Values) -> None:
+        """
+        Move notes by `ticks` and `layers`, given for all notes or for each note.
+        Notes stop at the first tick and layer, keeping their relative positions.
+        """
+        ids = np.asarray(ids, np.int64)
+        if len(ids) == 0:
+            return
+        rows = self.getRows(ids)
+        old = self.notes[rows]
+        ticks = _clampOffsets(old.tick, ticks)
+        layers = _clampOffsets(old.layer, layers)
+        with self.transaction():
+            self.history.push(MoveNotesCommand(self, ids, ticks, layers))
+            self.notes.writeable_column("tick")[rows] += ticks
+            self.notes.writeable_column("layer")[rows] += layers
+            self.stats.replace(old, self.notes[rows])
+            self._touch(ids, {"tick", "layer"})
+
+    def placeNotes(self, ids: np.ndarray, ticks: Values, layers: Values) -> None:
+        """
+        Move notes to `ticks` and `layers`. Notes that would overlap another note are
+        moved down to the next free layer.
+        """
+        ids = np.asarray(ids, np.int64)
+        if len(ids) == 0:
+            return
+        rows = self.getRows(ids)
+        others = np.ones(len(self.notes), dtype=bool)
+        others[rows] = False
+        occupied = _cells(self.notes.tick[others], self.notes.layer[others])
+        ticks = np.broadcast_to(np.asarray(ticks, np.int64), len(ids))
+        layers = _stackNotes(ticks, np.broadcast_to(layers, len(ids)), occupied)
+        self.moveNotes(
+            ids, ticks - self.notes.tick[rows], layers - self.notes.layer[rows]
+        )
+
+    def stretchNotes(self, ids: np.ndarray, factor: float) -> None:
+        """
+        Scale the distance of notes to the first of them by `factor` (e.g. 2 to expand
+        them, or 0.5 to compress them). Notes that would overlap another note are
+        moved down to the next free layer.
+        """
+        ids = np.asarray(ids, np.int64)
+        if len(ids) == 0:
+            return
+        rows = self.getRows(ids)
+        ticks = self.notes.tick[rows].astype(np.int64)
+        origin = ticks.min()
+        ticks = origin + np.floor((ticks - origin) * factor).astype(np.int64)
+        self.placeNotes(ids, ticks, self.notes.layer[rows])
+
+    def setNoteValues(self, ids: np.ndarray, name: str, values: Values) -> None:
+        """Set the column `name` of some notes to `values`, given for all notes or for each note."""
+        ids = np.asarray(ids, np.int64)
+        if len(ids) == 0:
+            return
+        rows = self.getRows(ids)
+        with self.transaction():
+            column = self.notes.writeable_column(name)
+            old = column[rows]
+            self.history.push(ChangeNotesCommand(self, ids, name, old, values))
+            oldNotes = self.notes[rows]
+            column[rows] = values
+            self.stats.replace(oldNotes, self.notes[rows])
+            self._touch(ids, {name})
+
+    def changeNoteValues(self, ids: np.ndarray, name: str, amounts: Values) -> None:
+        """
+        Add `amounts` to the column `name` of some notes, keeping the values within
+        the range allowed for that column (see `NoteStore.LIMITS`).
+        """
+        ids = np.asarray(ids, np.int64)
+        values = self.notes.column(name)[self.getRows(ids)].astype(np.int64) + amounts
+        if name in NoteStore.LIMITS:
+            values = np.clip(values, *NoteStore.LIMITS[name])
+        self.setNoteValues(ids, name, values.astype(NoteStore.COLUMNS[name]))
+
+    def transposeNotes(self, ids: np.ndarray, steps: int) -> None:
+        self.changeNoteValues(ids, "key", steps)
+
+    ########## Layers ##########
+
+    # Layer insertion, removal and swapping are recorded in the history by the
+    # layer controller. Moving the notes along with the layers is a consequence
+    # of those commands, so it isn't recorded here, except for the notes that are
+    # removed along with a layer.
+
+    def insertLayer(self, id: int) -> None:
+        """Shift the notes in layer `id` and below it one layer down."""
+        with self.transaction():
+            self._shiftLayers(id, 1)
+
+    def removeLayer(self, id: int) -> None:
+        """Remove the notes in layer `id`, and shift the notes below it one layer up."""
+        with self.transaction():
+            self.removeNotes(self.ids[self.notes.layer == id])
+            self._shiftLayers(id + 1, -1)
+
+    def swapLayers(self, id1: int, id2: int) -> None:
+        with self.transaction():
+            layer = self.notes.writeable_column("layer")
+            rows1 = np.flatnonzero(layer == id1)
+            rows2 = np.flatnonzero(layer == id2)
+            rows = np.concatenate((rows1, rows2))
+            old = self.notes[rows]
+            layer[rows1] = id2
+            layer[rows2] = id1
+            self.stats.replace(old, self.notes[rows])
+            self._touch(self.ids[rows], {"layer"})
+
+    def _shiftLayers(self, start: int, offset: int) -> None:
+        rows = np.flatnonzero(self.notes.layer >= start)
+        old = self.notes[rows]
+        self.notes.writeable_column("layer")[rows] += offset
+        self.stats.replace(old, self.notes[rows])
+        self._touch(self.ids[rows], {"layer"})
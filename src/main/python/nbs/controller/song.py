@@ -1,11 +1,214 @@
-from typing import Optional
+from typing import Callable, Optional, Tuple, Union
 
+import numpy as np
 from PyQt5 import QtCore
 
 from nbs.controller.instrument import InstrumentController
 from nbs.controller.layer import LayerController
+from nbs.controller.note import NoteChange, NoteController
 from nbs.controller.playback import PlaybackController
-from nbs.core.data import Song, SongHeader
+from nbs.core.cache import SongCache
+from nbs.core.data import (
+    EditorState,
+    NoteStore,
+    Song,
+    SongHeader,
+    SongInfo,
+    SongSnapshot,
+)
+from nbs.core.file import (
+    ProjectFile,
+    is_project,
+    load_song,
+    open_project,
+    save_project,
+    save_song,
+)
+from nbs.utils.file import PathLike
+
+# Number of notes added to the song at a time while it's being loaded
+LOAD_CHUNK_SIZE = 1000
+
+# Number of ticks from the playback position whose notes are loaded right after
+# the visible ones, so the song can be played while it's being loaded
+LOAD_PLAYBACK_TICKS = 256
+
+
+class SaveSongWorkerSignals(QtCore.QObject):
+    finished = QtCore.pyqtSignal(str)
+    failed = QtCore.pyqtSignal(str, str)
+
+
+class SaveSongWorker(QtCore.QRunnable):
+    """
+    Save a song snapshot to a file from a thread pool. Songs are saved as projects,
+    with the editor state, if the path has the project extension.
+    """
+
+    def __init__(
+        self,
+        snapshot: SongSnapshot,
+        path: PathLike,
+        editor: Optional[EditorState] = None,
+    ) -> None:
+        super().__init__()
+        self.snapshot = snapshot
+        self.path = str(path)
+        self.editor = editor
+        self.signals = SaveSongWorkerSignals()
+
+    def run(self) -> None:
+        try:
+            if is_project(self.path):
+                save_project(self.snapshot, self.path, self.editor)
+            else:
+                save_song(self.snapshot, self.path)
+        except Exception as e:
+            self.signals.failed.emit(self.path, str(e))
+        else:
+            self.signals.finished.emit(self.path)
+
+
+class LoadSongWorkerSignals(QtCore.QObject):
+    finished = QtCore.pyqtSignal(str, object)
+    failed = QtCore.pyqtSignal(str, str)
+
+
+class LoadSongWorker(QtCore.QRunnable):
+    """
+    Read a song from a file from a thread pool. Project files are only opened:
+    their notes are read as they're loaded.
+    """
+
+    def __init__(self, path: PathLike, cache: Optional[SongCache] = None) -> None:
+        super().__init__()
+        self.path = str(path)
+        self.cache = cache
+        self.signals = LoadSongWorkerSignals()
+
+    def run(self) -> None:
+        try:
+            if is_project(self.path):
+                result: Union[Song, ProjectFile] = open_project(self.path)
+            else:
+                result = load_song(self.path, cache=self.cache)
+                # Sort the notes here, so they're ready to be loaded in time order
+                result.notes = PendingNotes.sortByTick(result.notes)
+        except Exception as e:
+            self.signals.failed.emit(self.path, str(e))
+        else:
+            self.signals.finished.emit(self.path, result)
+
+
+class PendingNotes:
+    """
+    The notes of a song that haven't been loaded yet.
+
+    Notes are taken in chunks, in time order, except that the notes in some ranges
+    of ticks (e.g. the ones visible on screen) can be taken before the others.
+    """
+
+    def __init__(self, notes: NoteStore) -> None:
+        self.notes = self.sortByTick(notes)
+        self.pending = np.ones(len(notes), dtype=bool)
+        self.remaining = len(notes)
+        # All notes before this row have been taken
+        self.cursor = 0
+
+    def __len__(self) -> int:
+        return self.remaining
+
+    @property
+    def total(self) -> int:
+        return len(self.notes)
+
+    @staticmethod
+    def sortByTick(notes: NoteStore) -> NoteStore:
+        """Return `notes` sorted by tick, keeping the order of notes in each tick."""
+        if np.all(notes.tick[1:] >= notes.tick[:-1]):
+            return notes
+        return notes[np.argsort(notes.tick, kind="stable")]
+
+    def take(self, size: int, *ranges: Tuple[int, int]) -> NoteStore:
+        """
+        Take up to `size` notes, from the first of the `(start, stop)` ranges of
+        ticks with pending notes, or else from the earliest pending ticks.
+        """
+        rows = np.zeros(0, dtype=np.intp)
+        for start, stop in ranges:
+            first, last = np.searchsorted(self.notes.tick, [start, stop])
+            rows = first + np.flatnonzero(self.pending[first:last])[:size]
+            if len(rows) > 0:
+                break
+        while len(rows) == 0 and self.cursor < len(self.notes):
+            end = self.cursor + size
+            rows = self.cursor + np.flatnonzero(self.pending[self.cursor : end])
+            self.cursor = end
+        self.pending[rows] = False
+        self.remaining -= len(rows)
+        return self.notes[rows]
+
+    def takeAll(self) -> NoteStore:
+        rows = np.flatnonzero(self.pending)
+        self.pending[:] = False
+        self.remaining = 0
+        return self.notes[rows]
+
+    def close(self) -> None:
+        self.notes = NoteStore()
+
+
+class PendingChunks:
+    """
+    The notes of a project file that haven't been loaded yet.
+
+    Chunks of the file are only decoded when their notes are taken: the chunks
+    with notes in the given ranges of ticks before the others, which are taken in
+    time order (see `PendingNotes`).
+    """
+
+    def __init__(self, project: ProjectFile) -> None:
+        self.project = project
+        self.pendingChunks = np.ones(project.chunk_count, dtype=bool)
+        self.remaining = project.note_count
+        # Notes of the decoded chunk that haven't been taken yet
+        self.decoded = PendingNotes(NoteStore())
+
+    def __len__(self) -> int:
+        return self.remaining
+
+    @property
+    def total(self) -> int:
+        return self.project.note_count
+
+    def take(self, size: int, *ranges: Tuple[int, int]) -> NoteStore:
+        if len(self.decoded) == 0:
+            chunks = np.zeros(0, dtype=np.intp)
+            for start, stop in ranges:
+                chunks = self.project.find_chunks(start, stop)
+                chunks = chunks[self.pendingChunks[chunks]]
+                if len(chunks) > 0:
+                    break
+            if len(chunks) == 0:
+                chunks = np.flatnonzero(self.pendingChunks)
+            if len(chunks) > 0:
+                index = int(chunks[0])
+                self.pendingChunks[index] = False
+                self.decoded = PendingNotes(self.project.read_chunk(index))
+        notes = self.decoded.take(size, *ranges)
+        self.remaining -= len(notes)
+        return notes
+
+    def takeAll(self) -> NoteStore:
+        notes = self.decoded.takeAll()
+        for index in np.flatnonzero(self.pendingChunks).tolist():
+            notes.extend(self.project.read_chunk(index))
+        self.pendingChunks[:] = False
+        self.remaining = 0
+        return notes
+
+    def close(self) -> None:
+        self.project.close()
 
 
 class SongController(QtCore.QObject):
@@ -16,36 +219,220 @@ class SongController(QtCore.QObject):
     the "single source of truth" for the song data.
     """
 
+    songSaved = QtCore.pyqtSignal(str)
+    songSaveFailed = QtCore.pyqtSignal(str, str)
+    songRead = QtCore.pyqtSignal(str, object)
+    songLoadProgress = QtCore.pyqtSignal(int, int)
+    songLoaded = QtCore.pyqtSignal()
+    songLoadFailed = QtCore.pyqtSignal(str, str)
+    songLoadCanceled = QtCore.pyqtSignal()
+
     def __init__(
         self,
+        noteController: NoteController,
         layerController: LayerController,
         instrumentController: InstrumentController,
         playbackController: PlaybackController,
         parent: Optional[QtCore.QObject] = None,
     ):
         super().__init__(parent)
-        # TODO: A NoteController should exist and be here as well
+        self.noteController = noteController
         self.layerController = layerController
         self.instrumentController = instrumentController
         self.playbackController = playbackController
         self.song = Song(
             header=SongHeader(),
-            notes=[],
+            notes=noteController.notes,
             layers=layerController.layers,
             instruments=instrumentController.instruments,
         )
 
         # For convenience
+        self.notes = self.noteController.notes
         self.layers = self.layerController.layers
         self.instruments = self.instrumentController.instruments
 
+        self.noteController.notesChanged.connect(self.onNotesChanged)
+
+        self.threadPool = QtCore.QThreadPool(self)
+        # Saves and loads happen in the order requested
+        self.threadPool.setMaxThreadCount(1)
+
+        # Parsed songs are cached here, if set
+        self.songCache: Optional[SongCache] = None
+        # Returns the state of the editor to save with projects
+        self.editorState: Callable[[], EditorState] = EditorState
+        # State of the editor saved with the last project read, if any
+        self.editor: Optional[EditorState] = None
+
+        # The song being read, and the notes of the song being loaded
+        self.loadWorker: Optional[LoadSongWorker] = None
+        self.pendingNotes: Union[PendingNotes, PendingChunks, None] = None
+        # Returns the range of ticks whose notes are loaded first
+        self.visibleTicks: Callable[[], Tuple[int, int]] = lambda: (0, 0)
+        self.loadTimer = QtCore.QTimer(self)
+        self.loadTimer.setInterval(0)
+        self.loadTimer.timeout.connect(self.loadNextChunk)
+
+    def snapshot(self) -> SongSnapshot:
+        """
+        Return an immutable copy of the current song, which can be safely read from
+        other threads while the song continues to be edited.
+        """
+        return self.song.snapshot()
+
+    def saveSong(self, path: PathLike) -> None:
+        """
+        Save the current song to `path` in the background. `songSaved` or
+        `songSaveFailed` is emitted once the file has been written.
+        """
+        # Don't save a partially loaded song
+        self.finishLoad()
+        worker = SaveSongWorker(self.snapshot(), path, self.editorState())
+        worker.signals.finished.connect(self.songSaved)
+        worker.signals.failed.connect(self.songSaveFailed)
+        self.threadPool.start(worker)
+
+    def waitForSave(self, msecs: int = -1) -> bool:
+        """Block until all pending saves are done. Return `False` on timeout."""
+        return self.threadPool.waitForDone(msecs)
+
+    def openSong(self, path: PathLike) -> None:
+        """
+        Read the song at `path` in the background, then load it. `songRead` is
+        emitted with a `SongInfo` once the file has been read (and `editor` set to
+        the editor state saved with projects), and `songLoadFailed` if it couldn't.
+        """
+        self.cancelLoad()
+        worker = LoadSongWorker(path, self.songCache)
+        worker.signals.finished.connect(self.onSongRead)
+        worker.signals.failed.connect(self.onSongReadFailed)
+        self.loadWorker = worker
+        self.threadPool.start(worker)
+
+    @QtCore.pyqtSlot(str, object)
+    def onSongRead(self, path: str, result: Union[Song, ProjectFile]) -> None:
+        if self.loadWorker is None or self.sender() is not self.loadWorker.signals:
+            if isinstance(result, ProjectFile):
+                result.close()
+            return  # Canceled
+        self.loadWorker = None
+        if isinstance(result, ProjectFile):
+            self.loadProject(result)
+            self.editor = result.editor
+            self.songRead.emit(path, result.info)
+        else:
+            self.loadSong(result)
+            self.editor = None
+            notes = result.notes
+            length = int(notes.tick.max()) + 1 if len(notes) > 0 else 0
+            info = SongInfo(result.header, len(notes), len(result.layers), length)
+            self.songRead.emit(path, info)
+
+    @QtCore.pyqtSlot(str, str)
+    def onSongReadFailed(self, path: str, error: str) -> None:
+        if self.loadWorker is None or self.sender() is not self.loadWorker.signals:
+            return
+        self.loadWorker = None
+        self.songLoadFailed.emit(path, error)
+
     def resetSong(self) -> None:
+        self.cancelLoad()
+        self.noteController.load(NoteStore())
         self.layerController.resetLayers()
         self.instrumentController.resetInstruments()
+        self.updateInstrumentBlockCounts()
         self.playbackController.reset()
 
     def loadSong(self, song: Song) -> None:
+        """
+        Load `song`. Its notes are added in chunks, in time order, starting with
+        the ticks returned by `visibleTicks` and then the ones about to be played
+        from the playback position, while the event loop keeps running: the song
+        can be edited and played while they're being added.
+        `songLoadProgress` is emitted after each chunk, and `songLoaded` once all
+        notes are loaded.
+        """
+        self._startLoad(song, PendingNotes(song.notes))
+
+    def loadProject(self, project: ProjectFile) -> None:
+        """
+        Load the song in `project` like `loadSong()`, decoding the chunks of notes
+        in the file as they're added. The file is closed once they're all added.
+        """
+        self._startLoad(project.song(NoteStore()), PendingChunks(project))
+
+    def _startLoad(
+        self, song: Song, pending: Union[PendingNotes, PendingChunks]
+    ) -> None:
+        self.cancelLoad()
+        self.noteController.load(NoteStore())
         self.layerController.loadLayers(song.layers)
         self.instrumentController.resetInstruments()
         self.instrumentController.loadInstrumentsFromList(song.instruments)
+        self.updateInstrumentBlockCounts()
         self.playbackController.setTempo(song.header.tempo)
+        self.pendingNotes = pending
+        self.songLoadProgress.emit(0, pending.total)
+        self.loadTimer.start()
+
+    @property
+    def isLoading(self) -> bool:
+        return self.loadWorker is not None or self.pendingNotes is not None
+
+    @QtCore.pyqtSlot()
+    def loadNextChunk(self) -> None:
+        """Add the next chunk of notes of the song being loaded."""
+        pending = self.pendingNotes
+        if pending is None:
+            return
+        visible = self.visibleTicks()
+        tick = int(self.playbackController.currentTick)
+        playback = (tick, tick + LOAD_PLAYBACK_TICKS)
+        self.noteController.appendNotes(
+            pending.take(LOAD_CHUNK_SIZE, visible, playback)
+        )
+        self.songLoadProgress.emit(pending.total - len(pending), pending.total)
+        if len(pending) == 0:
+            self.loadTimer.stop()
+            self.pendingNotes = None
+            pending.close()
+            self.songLoaded.emit()
+
+    def finishLoad(self) -> None:
+        """Add all remaining notes of the song being loaded at once."""
+        if self.pendingNotes is not None:
+            self.noteController.appendNotes(self.pendingNotes.takeAll())
+            self.loadNextChunk()
+
+    def cancelLoad(self) -> None:
+        """
+        Stop loading a song. If its notes were being added, the partially loaded
+        song is discarded, and an empty song is loaded.
+        """
+        if not self.isLoading:
+            return
+        self.loadWorker = None
+        if self.pendingNotes is not None:
+            self.loadTimer.stop()
+            self.pendingNotes.close()
+            self.pendingNotes = None
+            self.noteController.load(NoteStore())
+            self.layerController.resetLayers()
+            self.instrumentController.resetInstruments()
+            self.updateInstrumentBlockCounts()
+            self.noteController.history.clear()
+        self.songLoadCanceled.emit()
+
+    def onNotesChanged(self, change: NoteChange) -> None:
+        if (
+            len(change.added) > 0
+            or len(change.removed) > 0
+            or "instrument" in change.fields
+        ):
+            self.updateInstrumentBlockCounts()
+
+    def updateInstrumentBlockCounts(self) -> None:
+        stats = self.noteController.stats
+        for id in range(len(self.instruments)):
+            self.instrumentController.setBlockCount(id, stats.count_in_instrument(id))
@@ -1,193 +1,297 @@
-from datetime import datetime, timedelta
-from typing import List, Optional, Sequence, Tuple
-
+import ctypes
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Callable, Deque, Dict, Optional, Sequence, Tuple
+
+import numpy as np
 import soundfile as sf
-from openal import alc
-from openal.audio import SoundData, SoundSink, SoundSource
+from openal import al
+from openal.audio import SoundSink
 from PyQt5 import QtCore
 
+from nbs.core.mixer import CHANNELS, DEFAULT_SAMPLE_RATE, Mixer, VoiceStats, to_mono
+from nbs.core.note_queue import NOTE_RECORD, NoteQueue
+from nbs.core.resample import BASE_KEY, CacheStats
 from nbs.utils.file import PathLike
 
-
-def key_to_pitch(key: float) -> float:
-    return 2 ** (key / 12)
-
-
-class NoSourceAvailableException(Exception):
-    pass
-
-
-class SoundInstance:
-    def __init__(
-        self,
-        sound: SoundData,
-        source: SoundSource,
-        volume: float = 1.0,
-        pitch: float = 1.0,
-        pan: float = 0.0,
-    ) -> None:
-        self.sound = sound
-        self.source = source
-        self.volume = volume
-        self.pitch = pitch
-        self.pan = pan
-        sample_size = sound.channels * sound.bitrate // 8
-        sample_rate = sound.frequency
-        length_samples = sound.size * (1 / pitch)
-        length_seconds = length_samples / (sample_size * sample_rate)
-        self.end_time = datetime.now() + timedelta(seconds=length_seconds)
-
-    def __repr__(self) -> str:
-        return f"<{self.__class__.__name__} ({len(self.sound.data)} samples)>"
-
-
-class AudioSourcePool:
-    def __init__(self, sources: int = 1024) -> None:
-        self.free_sources = [SoundSource() for _ in range(sources)]
-
-    def get_source(self) -> SoundSource:
-        if self.free_sources:
-            return self.free_sources.pop()
-        else:
-            raise NoSourceAvailableException("No free audio sources available")
-
-    def release_source(self, source: SoundSource) -> None:
-        self.free_sources.append(source)
+# Seconds between passes of the audio thread's loop
+UPDATE_INTERVAL = 0.005
+# Seconds between updates of the sound count
+COUNT_INTERVAL = 0.016
+# Seconds between updates of the statistics
+STATS_INTERVAL = 1.0
+# Buffers queued on the OpenAL source, refilled as they're played
+STREAM_BUFFERS = 4
+# Sounds decoded at once
+LOAD_WORKERS = min(8, os.cpu_count() or 1)
 
 
 class AudioOutputHandler:
-    def __init__(self):
-        self.active_sounds: List[SoundInstance] = []
-        self.source_pool = AudioSourcePool()
-        attributes = [
-            alc.ALC_MONO_SOURCES,
-            0,  # Request 256 mono sources
-            alc.ALC_STEREO_SOURCES,
-            1024,  # Request 1024 stereo sources
-        ]
-        self.sink = SoundSink(None, attributes)
+    """
+    Streams the output of a `Mixer` to a single OpenAL source.
+
+    The source plays a fixed set of `STREAM_BUFFERS` buffers, which hold
+    `latency` seconds of audio between them. `update()` must be called
+    regularly: it refills the buffers that the source finished playing and
+    queues them again, and restarts the source if it stopped because it ran out
+    of audio. The OpenAL objects must only be used from the thread that created
+    the handler.
+
+    The `openal.al` functions are plain ctypes bindings of the C API, so IDs and
+    values are returned through pointers.
+    """
+
+    def __init__(self, mixer: Mixer, latency: float = 0.03):
+        self.mixer = mixer
+        self.sample_rate = mixer.sample_rate
+        self.latency = latency
+        self.buffer_frames = math.ceil(latency * self.sample_rate / STREAM_BUFFERS)
+        self.sink = SoundSink()
         self.sink.activate()
-        self.mutex = QtCore.QMutex()
-
-    def push_sound(
-        self, samples: SoundData, pitch: float, volume: float, panning: float
-    ) -> None:
-        self.mutex.lock()
-        try:
-            try:
-                source = self.source_pool.get_source()
-            except NoSourceAvailableException:
-                z = self.active_sounds.pop(0)
-                self.sink.stop(z.source)
-                self.source_pool.release_source(z.source)
-                z.source.bufferqueue.clear()
-                source = self.source_pool.get_source()
-
-            source.gain = volume
-            source.pitch = pitch
-            source.position = [panning, 0, 0]
-            source.looping = False
-            source.queue(samples)
-
-            sound = SoundInstance(samples, source, volume, pitch, panning)
-            self.active_sounds.insert(0, sound)
-
-            self.sink.play(source)
-        finally:
-            self.mutex.unlock()
-
-    def update(self):
-        self.mutex.lock()
-        try:
-            # TODO: use a deque instead of a list / it might be possible
-            # to avoid checking every single sound, if they're sorted by
-            # end time
-            for sound in self.active_sounds:
-                # TODO: test polling the source state instead of using a timer
-                # if sound.source["dataproperties"]["source_state"] == al.PLAYING:
-                if datetime.now() >= sound.end_time:
-                    self.active_sounds.remove(sound)
-                    self.sink.stop(sound.source)
-                    self.source_pool.release_source(sound.source)
-                    sound.source.bufferqueue.clear()
-            self.sink.update()
-        finally:
-            self.mutex.unlock()
+        self.source = ctypes.c_uint()
+        al.alGenSources(1, ctypes.byref(self.source))
+        self.buffers = (ctypes.c_uint * STREAM_BUFFERS)()
+        al.alGenBuffers(STREAM_BUFFERS, self.buffers)
+        for buffer in self.buffers:
+            self._queue(buffer)
+        al.alSourcePlay(self.source)
+
+    def update(self) -> None:
+        processed = self._getSourcei(al.AL_BUFFERS_PROCESSED)
+        if processed > 0:
+            buffers = (ctypes.c_uint * processed)()
+            al.alSourceUnqueueBuffers(self.source, processed, buffers)
+            for buffer in buffers:
+                self._queue(buffer)
+        # The source stops when it plays all its buffers before they're refilled
+        if self._getSourcei(al.AL_SOURCE_STATE) != al.AL_PLAYING:
+            al.alSourcePlay(self.source)
+
+    def close(self) -> None:
+        al.alSourceStop(self.source)
+        al.alDeleteSources(1, ctypes.byref(self.source))
+        al.alDeleteBuffers(STREAM_BUFFERS, self.buffers)
+
+    def _getSourcei(self, param: int) -> int:
+        value = ctypes.c_int()
+        al.alGetSourcei(self.source, param, ctypes.byref(value))
+        return value.value
+
+    def _queue(self, buffer: int) -> None:
+        """Fill `buffer` with the next frames of the mixer, and queue it."""
+        self.mixer.fill(self.buffer_frames)
+        data = self.mixer.buffer.read(self.buffer_frames).tobytes()
+        al.alBufferData(
+            buffer, al.AL_FORMAT_STEREO16, data, len(data), self.sample_rate
+        )
+        al.alSourceQueueBuffers(self.source, 1, ctypes.byref(ctypes.c_uint(buffer)))
+
+
+@dataclass
+class AudioStats:
+    # Statistics of the resample cache and of the voices of the mixer, and the
+    # number of notes dropped because the audio thread fell behind
+    cache: CacheStats
+    voices: VoiceStats
+    dropped_notes: int
+
+
+@dataclass
+class _SoundLoad:
+    # The ID the sound will be added as, which changes if an earlier sound is
+    # removed while it's loading
+    id: int
+    path: PathLike
 
 
 class AudioEngine(QtCore.QObject):
+    """
+    Plays sounds in a dedicated audio thread, which owns the mixer and all the
+    OpenAL state.
+
+    Notes are passed to the audio thread through a lock-free `NoteQueue`, so
+    playing a note never blocks the calling thread, and the audio thread runs its
+    own loop, so a busy event loop never delays a note. Other requests (loading
+    sounds, etc.) are rare, and are passed as commands through a deque. The
+    slots of the engine can be called from any one thread, usually the GUI
+    thread.
+
+    Sounds are decoded in a pool of threads (libsndfile releases the GIL, so
+    decodes overlap), and each one is added to the mixer under the ID it was
+    requested with, in whichever order they finish. Only the latest load of each
+    ID is added: the result of a load that was requested again, or whose sound
+    was removed, is dropped. `soundLoadProgress` reports how many of the sounds
+    requested so far are loaded, and `soundsLoaded` is emitted once they all are.
+    """
+
     soundLoaded = QtCore.pyqtSignal(int, bool)
+    soundLoadFailed = QtCore.pyqtSignal(str, str)
+    soundLoadProgress = QtCore.pyqtSignal(int, int)
+    soundsLoaded = QtCore.pyqtSignal()
     soundCountUpdated = QtCore.pyqtSignal(int)
+    statsUpdated = QtCore.pyqtSignal(AudioStats)
     finished = QtCore.pyqtSignal()
 
     def __init__(
         self,
         parent: Optional[QtCore.QObject] = None,
-        sample_rate: int = 44100,
-        channels: int = 2,
+        sample_rate: int = DEFAULT_SAMPLE_RATE,
+        channels: int = CHANNELS,
     ):
         super().__init__(parent)
         self.sample_rate = sample_rate
         self.channels = channels
         self.master_volume = 0.5
-        self.sounds: List[SoundData] = []
-        self.handler = AudioOutputHandler()
-
-        # Set up update timer
-        self.update_timer = QtCore.QTimer()
-        self.update_timer.setTimerType(QtCore.Qt.TimerType.PreciseTimer)
-        self.update_timer.setInterval(16)
-        self.update_timer.timeout.connect(self._update)
-        self.update_timer.start()
-
-    def run(self):
-        pass
+        self.mixer = Mixer(sample_rate)
+        self.notes = NoteQueue()
+        self._commands: Deque[Callable[[], None]] = deque()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._loader = ThreadPoolExecutor(LOAD_WORKERS, "SoundLoader")
+        # Sounds requested and loaded since the last time all were loaded
+        self._loadLock = threading.Lock()
+        self._loadsRequested = 0
+        self._loadsFinished = 0
+        # Latest load of each sound ID that hasn't finished yet. Only used by
+        # the audio thread
+        self._pendingLoads: Dict[int, _SoundLoad] = {}
+
+    def start(self) -> None:
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="Audio", daemon=True)
+        self._thread.start()
 
+    @QtCore.pyqtSlot()
     def stop(self):
         print("Stopping audio engine")
+        self._running = False
+        self._loader.shutdown(wait=False, cancel_futures=True)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
         self.finished.emit()
 
-    @QtCore.pyqtSlot(str)
-    def loadSound(self, path: PathLike) -> None:
-        # TODO: use unique ID as sound identifier instead of index
-        print("LOADING:", path)
-        try:
-            samples, samplerate = sf.read(path, dtype="int16", always_2d=True)
-        except sf.LibsndfileError:
-            self.sounds.append(None)
-            print("Failed to load sound")
-            return
-        buf = samples.tobytes("C")
-        channels = samples.shape[1]
-        bitrate = samples.dtype.itemsize * 8
-
-        print(channels, bitrate, len(buf), samplerate)
-        data = SoundData(buf, channels, bitrate, len(buf), samplerate)
-        self.sounds.append(data)
-
-        print(f"Loaded {path}")
-        self.soundLoaded.emit(len(self.sounds) - 1, True)
+    def stats(self) -> AudioStats:
+        """Return a copy of the current statistics of the engine."""
+        return AudioStats(
+            replace(self.mixer.cache.stats),
+            replace(self.mixer.stats),
+            self.notes.dropped,
+        )
+
+    @QtCore.pyqtSlot(int, str)
+    def loadSound(self, id: int, path: PathLike) -> None:
+        """Load the sound at `path` as sound `id`, replacing any sound with that ID."""
+        with self._loadLock:
+            self._loadsRequested += 1
+            loaded, total = self._loadsFinished, self._loadsRequested
+        self.soundLoadProgress.emit(loaded, total)
+        load = _SoundLoad(id, path)
+        # Queued before the load can finish, so the audio thread always knows
+        # the load by the time its result arrives
+        self._commands.append(lambda: self._startLoad(load))
+        future = self._loader.submit(_decodeSound, path)
+        # Called in the loading thread: the mixer is only touched by the audio thread
+        future.add_done_callback(
+            lambda future: self._commands.append(lambda: self._addSound(load, future))
+        )
 
     @QtCore.pyqtSlot(int)
     def removeSound(self, index: int) -> None:
-        del self.sounds[index]
+        self._commands.append(lambda: self._removeSound(index))
+
+    @QtCore.pyqtSlot(list)
+    def warmUp(self, pitches: Sequence[Tuple[int, float]]) -> None:
+        """
+        Resample the sounds at the given (sound, key) pairs in the background,
+        e.g. the ones a song plays, as returned by `note_pitches()`.
+        """
+        self._commands.append(lambda: self.mixer.warm_up(pitches))
 
     @QtCore.pyqtSlot(int, float, float, float)
     def playSound(self, index: int, volume: float, key: float, panning: float):
-        sound = self.sounds[index] if index < len(self.sounds) else None
-        if sound is None:
-            return
-        # data = SoundData(*sound)
-        pitch = key_to_pitch(key)
-        volume *= self.master_volume
-        self.handler.push_sound(sound, pitch, volume, panning)
+        """Play a sound `key` semitones above its pitch."""
+        self.notes.push_note(index, key, volume * self.master_volume, panning)
 
-    @QtCore.pyqtSlot(list)
-    def playSounds(self, sounds: Sequence[Tuple[int, float, float, float]]):
-        for sound in sounds:
-            self.playSound(*sound)
+    @QtCore.pyqtSlot(int, int)
+    def playKey(self, instrument: int, key: int) -> None:
+        """Play an instrument at a piano key, at full volume."""
+        self.playSound(instrument, 1.0, key - BASE_KEY, 0.0)
 
-    @QtCore.pyqtSlot()
-    def _update(self):
-        self.handler.update()
-        self.soundCountUpdated.emit(len(self.handler.active_sounds))
+    @QtCore.pyqtSlot(list)
+    def playNotes(self, notes: Sequence[Tuple[int, float, float, float]]) -> None:
+        """Play a list of (instrument, key, volume, panning) notes at once."""
+        records = np.array(notes, NOTE_RECORD)
+        records["key"] -= BASE_KEY
+        records["volume"] *= self.master_volume
+        self.notes.push(records)
+
+    ########## Audio thread ##########
+
+    def _run(self) -> None:
+        handler = AudioOutputHandler(self.mixer)
+        lastCount = lastStats = 0.0
+        while self._running:
+            while self._commands:
+                self._commands.popleft()()
+            for sound, key, volume, panning in self.notes.pop().tolist():
+                self.mixer.play(sound, volume, key, panning)
+            handler.update()
+
+            now = time.monotonic()
+            if now - lastCount >= COUNT_INTERVAL:
+                lastCount = now
+                self.soundCountUpdated.emit(self.mixer.voice_count)
+            if now - lastStats >= STATS_INTERVAL:
+                lastStats = now
+                self.statsUpdated.emit(self.stats())
+            time.sleep(UPDATE_INTERVAL)
+        handler.close()
+
+    def _startLoad(self, load: _SoundLoad) -> None:
+        # Replaces any earlier load of the same ID, whose result is then dropped
+        self._pendingLoads[load.id] = load
+
+    def _removeSound(self, index: int) -> None:
+        self.mixer.remove_sound(index)
+        # Loads of later sounds move down one ID, like the sounds themselves, and
+        # the load of the removed sound is dropped
+        pendingLoads = {}
+        for id, load in self._pendingLoads.items():
+            if id > index:
+                load.id -= 1
+            if id != index:
+                pendingLoads[load.id] = load
+        self._pendingLoads = pendingLoads
+
+    def _addSound(self, load: _SoundLoad, future: Future) -> None:
+        if self._pendingLoads.get(load.id) is load:
+            del self._pendingLoads[load.id]
+            try:
+                samples, samplerate = future.result()
+            except Exception as e:
+                self.soundLoadFailed.emit(str(load.path), str(e))
+                self.mixer.set_sound(load.id, None, self.sample_rate)
+                self.soundLoaded.emit(load.id, False)
+            else:
+                self.mixer.set_sound(load.id, samples, samplerate)
+                self.soundLoaded.emit(load.id, True)
+
+        with self._loadLock:
+            self._loadsFinished += 1
+            loaded, total = self._loadsFinished, self._loadsRequested
+            if loaded == total:
+                self._loadsRequested = self._loadsFinished = 0
+        self.soundLoadProgress.emit(loaded, total)
+        if loaded == total:
+            self.soundsLoaded.emit()
+
+
+def _decodeSound(path: PathLike) -> Tuple[np.ndarray, int]:
+    samples, samplerate = sf.read(path, dtype="int16", always_2d=True)
+    return to_mono(samples), samplerate
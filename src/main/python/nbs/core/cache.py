@@ -0,0 +1,190 @@
+"""
+An on-disk cache of parsed songs, so that reopening a song doesn't decode its
+notes again.
+
+Songs are stored under the hash of the (decompressed) contents of their files,
+with the note columns as raw arrays. A cached song is loaded by memory-mapping its entry and
+viewing the columns in place, which costs about as much as mapping the file.
+To avoid hashing a file that hasn't changed since it was last opened, the hash
+is also recorded under the path of the file, with its size and modification
+time.
+
+The least recently used entries are removed when the cache grows past its size
+limit.
+"""
+
+import hashlib
+import json
+import os
+from mmap import ACCESS_COPY
+from mmap import mmap as MemoryMap
+from struct import Struct
+from typing import Dict, Optional
+
+import numpy as np
+
+from nbs.core.data import NoteStore, Song
+from nbs.core.file import (
+    _open_song,
+    _song_from_metadata,
+    _song_metadata,
+    parse_song,
+)
+from nbs.utils.file import PathLike, atomic_write
+
+DEFAULT_CACHE_SIZE = 512 * 1024 * 1024
+
+# Magic number, format version, and size of the metadata of a song entry
+ENTRY_HEADER = Struct("<8sII")
+ENTRY_MAGIC = b"NBSCACHE"
+ENTRY_VERSION = 1
+# Columns are aligned to this many bytes in song entries
+ALIGNMENT = 64
+
+SONG_SUFFIX = ".song"
+PATH_SUFFIX = ".path"
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class SongCache:
+    """
+    A directory of parsed songs, of up to `max_size` bytes.
+
+    `load()` returns the cached song for a file if there is one, and parses and
+    caches it otherwise. Entries that can't be read (e.g. written by another
+    version) are ignored, and replaced.
+    """
+
+    def __init__(self, directory: PathLike, max_size: int = DEFAULT_CACHE_SIZE):
+        self.directory = os.fsdecode(directory)
+        self.max_size = max_size
+        os.makedirs(self.directory, exist_ok=True)
+
+    def load(self, path: PathLike) -> Song:
+        path = os.path.abspath(os.fsdecode(path))
+        stat = os.stat(path)
+        key = self._lookup(path, stat)
+        if key is not None:
+            song = self._read(key)
+            if song is not None:
+                return song
+
+        # Keyed by the decompressed contents of compressed files
+        with _open_song(path) as data:
+            song = parse_song(data)
+            key = _hash(data)
+        try:
+            self._write(key, song)
+            self._record(path, stat, key)
+            self.trim()
+        except OSError:
+            pass  # The cache is only an optimization
+        return song
+
+    def clear(self) -> None:
+        for name in os.listdir(self.directory):
+            if name.endswith((SONG_SUFFIX, PATH_SUFFIX)):
+                os.remove(os.path.join(self.directory, name))
+
+    def trim(self) -> None:
+        """Remove the least recently used entries until the cache fits its size."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith((SONG_SUFFIX, PATH_SUFFIX)):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, entry_path in sorted(entries):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(entry_path)
+            except OSError:
+                continue  # e.g. still mapped, on Windows
+            size -= entry_size
+
+    ########## Paths ##########
+
+    def _entry_path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, key + suffix)
+
+    def _path_entry(self, path: str) -> str:
+        return self._entry_path(_hash(os.fsencode(path)), PATH_SUFFIX)
+
+    def _lookup(self, path: str, stat: os.stat_result) -> Optional[str]:
+        """Return the key cached for the file at `path`, if it hasn't changed."""
+        entry = self._path_entry(path)
+        try:
+            with open(entry, encoding="utf-8") as f:
+                size, mtime, key = f.read().split()
+        except (OSError, ValueError):
+            return None
+        if (int(size), int(mtime)) != (stat.st_size, stat.st_mtime_ns):
+            return None
+        _touch(entry)
+        return key
+
+    def _record(self, path: str, stat: os.stat_result, key: str) -> None:
+        with atomic_write(self._path_entry(path)) as f:
+            f.write(f"{stat.st_size} {stat.st_mtime_ns} {key}".encode())
+
+    ########## Song entries ##########
+
+    def _read(self, key: str) -> Optional[Song]:
+        entry = self._entry_path(key, SONG_SUFFIX)
+        try:
+            song = _read_entry(entry)
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        _touch(entry)
+        return song
+
+    def _write(self, key: str, song: Song) -> None:
+        notes = song.notes
+        metadata = json.dumps({**_song_metadata(song), "size": len(notes)}).encode()
+        with atomic_write(self._entry_path(key, SONG_SUFFIX)) as f:
+            f.write(ENTRY_HEADER.pack(ENTRY_MAGIC, ENTRY_VERSION, len(metadata)))
+            f.write(metadata)
+            offset = ENTRY_HEADER.size + len(metadata)
+            for name in NoteStore.COLUMNS:
+                f.write(bytes(_align(offset) - offset))
+                column = np.ascontiguousarray(notes.column(name))
+                f.write(column)
+                offset = _align(offset) + column.nbytes
+
+
+def _read_entry(path: str) -> Song:
+    # Mapped copy-on-write, so the notes can be edited without changing the entry
+    with open(path, "rb") as f:
+        data = MemoryMap(f.fileno(), 0, access=ACCESS_COPY)
+    magic, version, length = ENTRY_HEADER.unpack_from(data)
+    if magic != ENTRY_MAGIC or version != ENTRY_VERSION:
+        raise ValueError("Not a song cache entry")
+    offset = ENTRY_HEADER.size + length
+    metadata = json.loads(data[ENTRY_HEADER.size : offset])
+    size = metadata["size"]
+
+    columns: Dict[str, np.ndarray] = {}
+    for name, dtype in NoteStore.COLUMNS.items():
+        offset = _align(offset)
+        if offset + size * dtype.itemsize > len(data):
+            raise ValueError("Truncated song cache entry")
+        columns[name] = np.frombuffer(data, dtype, size, offset)
+        offset += size * dtype.itemsize
+
+    return _song_from_metadata(metadata, NoteStore.from_columns(columns))
+
+
+def _touch(path: str) -> None:
+    """Mark an entry as used, for the LRU eviction."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
@@ -1,10 +1,14 @@
-from dataclasses import dataclass
-from typing import Optional, Tuple
+from __future__ import annotations
+
+from dataclasses import dataclass, fields, replace
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy as np
 
 NBS_VERSION = 5
 
 
-@dataclass
+@dataclass(slots=True)
 class Layer:
     name: str = ""
     lock: bool = False
@@ -23,7 +27,7 @@ class Instrument:
     icon_path: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Note:
     tick: int
     layer: int
@@ -34,6 +38,332 @@ class Note:
     pitch: int = 0
 
 
+NoteIndex = Union[int, slice, np.ndarray, List[int]]
+
+
+class NoteStore:
+    """
+    Columnar container for the notes in a song.
+
+    Each note attribute is kept in its own typed NumPy array, so a note costs a
+    fixed handful of bytes and passes over the notes run as vectorized array
+    operations instead of interpreted loops. The columns are exposed as
+    properties (`store.tick`, `store.key`, ...) returning read-only views of the
+    live data; `writeable_column()` returns a view that can be modified in place.
+
+    Indexing with an integer returns a `Note` holding a copy of that row, for
+    callers that work with individual notes. Indexing with a slice, a boolean
+    mask or an array of indices returns another `NoteStore` (slices share memory
+    with this store; masks and index arrays are copied, as in NumPy).
+
+    `snapshot()` returns a read-only store sharing the columns of this one. Shared
+    columns are copied the next time they're modified through this store, so the
+    snapshot never changes and can be read safely from another thread.
+    """
+
+    COLUMNS: Dict[str, np.dtype] = {
+        "tick": np.dtype(np.int32),
+        "layer": np.dtype(np.int16),
+        "instrument": np.dtype(np.int16),
+        "key": np.dtype(np.int16),
+        "velocity": np.dtype(np.int16),
+        "panning": np.dtype(np.int16),
+        "pitch": np.dtype(np.int16),
+    }
+
+    DEFAULTS: Dict[str, int] = {"velocity": 100, "panning": 0, "pitch": 0}
+
+    # Valid range of the columns that are bounded by the NBS format
+    LIMITS: Dict[str, Tuple[int, int]] = {
+        "key": (0, 87),
+        "velocity": (0, 100),
+        "panning": (-100, 100),
+    }
+
+    def __init__(self, capacity: int = 0) -> None:
+        self._size = 0
+        self._data: Dict[str, np.ndarray] = {
+            name: np.zeros(capacity, dtype) for name, dtype in self.COLUMNS.items()
+        }
+        # Columns that are shared with a snapshot, and must be copied before writing
+        self._shared: Set[str] = set()
+
+    @classmethod
+    def from_arrays(cls, **columns: Union[np.ndarray, Iterable[int], int]) -> NoteStore:
+        """
+        Create a store from one array per column. `tick`, `layer`, `instrument` and
+        `key` are required; the remaining columns may be omitted or given as a
+        scalar to use the same value for every note.
+        """
+        missing = {"tick", "layer", "instrument", "key"} - columns.keys()
+        if missing:
+            raise ValueError(f"Missing note columns: {', '.join(sorted(missing))}")
+        unknown = columns.keys() - cls.COLUMNS.keys()
+        if unknown:
+            raise ValueError(f"Unknown note columns: {', '.join(sorted(unknown))}")
+
+        size = len(np.atleast_1d(np.asarray(columns["tick"])))
+        store = cls(size)
+        for name, dtype in cls.COLUMNS.items():
+            value = columns.get(name, cls.DEFAULTS.get(name, 0))
+            store._data[name][:] = np.broadcast_to(np.asarray(value, dtype), size)
+        store._size = size
+        return store
+
+    @classmethod
+    def from_notes(cls, notes: Iterable[Note]) -> NoteStore:
+        """Create a store from a sequence of `Note` objects."""
+        notes = list(notes)
+        store = cls(len(notes))
+        for name, dtype in cls.COLUMNS.items():
+            store._data[name][:] = np.fromiter(
+                (getattr(note, name) for note in notes), dtype, len(notes)
+            )
+        store._size = len(notes)
+        return store
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, np.ndarray]) -> NoteStore:
+        """
+        Create a store holding the arrays in `columns`, without copying them (e.g.
+        to view columns mapped from a file). The arrays must have the types in
+        `COLUMNS`, and the same length.
+        """
+        store = cls()
+        for name, dtype in cls.COLUMNS.items():
+            array = columns[name]
+            if array.dtype != dtype or array.shape != columns["tick"].shape:
+                raise ValueError(f"Invalid array for note column {name}")
+            store._data[name] = array
+        store._size = len(columns["tick"])
+        return store
+
+    ########## Columns ##########
+
+    def column(self, name: str) -> np.ndarray:
+        """Return a read-only view of the column `name`, trimmed to the number of notes."""
+        view = self._data[name][: self._size]
+        view.flags.writeable = False
+        return view
+
+    def writeable_column(self, name: str) -> np.ndarray:
+        """
+        Return a view of the column `name` that can be modified in place, copying
+        the column first if it's shared with a snapshot.
+        """
+        if not self.writeable:
+            raise ValueError("Can't modify a read-only NoteStore")
+        if name in self._shared:
+            self._detach(name)
+        return self._data[name][: self._size]
+
+    @property
+    def tick(self) -> np.ndarray:
+        return self.column("tick")
+
+    @property
+    def layer(self) -> np.ndarray:
+        return self.column("layer")
+
+    @property
+    def instrument(self) -> np.ndarray:
+        return self.column("instrument")
+
+    @property
+    def key(self) -> np.ndarray:
+        return self.column("key")
+
+    @property
+    def velocity(self) -> np.ndarray:
+        return self.column("velocity")
+
+    @property
+    def panning(self) -> np.ndarray:
+        return self.column("panning")
+
+    @property
+    def pitch(self) -> np.ndarray:
+        return self.column("pitch")
+
+    @property
+    def capacity(self) -> int:
+        return len(self._data["tick"])
+
+    @property
+    def nbytes(self) -> int:
+        """Number of bytes held by the note columns."""
+        return sum(array.nbytes for array in self._data.values())
+
+    @property
+    def writeable(self) -> bool:
+        return self._data["tick"].flags.writeable
+
+    ########## Sequence protocol ##########
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[Note]:
+        columns = [self._data[name][: self._size].tolist() for name in self.COLUMNS]
+        for values in zip(*columns):
+            yield Note(*values)
+
+    def __getitem__(self, index: NoteIndex) -> Union[Note, NoteStore]:
+        if isinstance(index, (int, np.integer)):
+            row = self._check_row(index)
+            return Note(*(int(self._data[name][row]) for name in self.COLUMNS))
+        if isinstance(index, slice) and self.writeable:
+            # Slices share memory with this store, so they must not share it with
+            # snapshots too
+            self._prepare_write()
+        store = NoteStore()
+        for name in self.COLUMNS:
+            store._data[name] = self._data[name][: self._size][index]
+        store._size = len(store._data["tick"])
+        return store
+
+    def __setitem__(self, index: int, note: Note) -> None:
+        row = self._check_row(index)
+        self._prepare_write()
+        for name in self.COLUMNS:
+            self._data[name][row] = getattr(note, name)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, NoteStore):
+            return NotImplemented
+        return len(self) == len(other) and all(
+            np.array_equal(
+                self._data[name][: self._size], other._data[name][: len(other)]
+            )
+            for name in self.COLUMNS
+        )
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} ({len(self)} notes)>"
+
+    def __getstate__(self) -> Dict[str, np.ndarray]:
+        return {name: self._data[name][: self._size].copy() for name in self.COLUMNS}
+
+    def __setstate__(self, state: Dict[str, np.ndarray]) -> None:
+        self._data = {
+            name: np.ascontiguousarray(state[name], dtype)
+            for name, dtype in self.COLUMNS.items()
+        }
+        self._size = len(self._data["tick"])
+        self._shared = set()
+
+    def _check_row(self, index: int) -> int:
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError(f"Note index out of range: {index}")
+        return int(index)
+
+    ########## Snapshots ##########
+
+    def snapshot(self) -> NoteStore:
+        """
+        Return a read-only copy of this store in constant time. The columns are shared
+        between both stores until they're modified through this one (copy-on-write).
+        """
+        store = NoteStore()
+        for name in self.COLUMNS:
+            view = self._data[name][: self._size]
+            view.flags.writeable = False
+            store._data[name] = view
+        store._size = self._size
+        if self.writeable:
+            self._shared.update(self.COLUMNS)
+        return store
+
+    def _detach(self, name: str) -> None:
+        """Stop sharing the column `name` with snapshots, by copying it."""
+        self._data[name] = self._data[name].copy()
+        self._shared.discard(name)
+
+    def _prepare_write(self) -> None:
+        """Make all columns safe to modify in place."""
+        if not self.writeable:
+            raise ValueError("Can't modify a read-only NoteStore")
+        for name in tuple(self._shared):
+            self._detach(name)
+
+    ########## Editing ##########
+
+    def _reserve(self, capacity: int) -> None:
+        """Grow the columns so that they can hold at least `capacity` notes."""
+        if capacity <= self.capacity:
+            return
+        capacity = max(capacity, self.capacity * 2, 16)
+        for name, array in self._data.items():
+            grown = np.zeros(capacity, array.dtype)
+            grown[: self._size] = array[: self._size]
+            self._data[name] = grown
+        self._shared.clear()
+
+    def append(self, note: Note) -> int:
+        """Append a single note to the end of the store, and return its index."""
+        self._prepare_write()
+        self._reserve(self._size + 1)
+        row = self._size
+        self._size += 1
+        self[row] = note
+        return row
+
+    def extend(self, notes: NoteStore) -> range:
+        """Append all notes in `notes` to the end of the store, and return their indices."""
+        start = self._size
+        self._prepare_write()
+        self._reserve(start + len(notes))
+        for name in self.COLUMNS:
+            self._data[name][start : start + len(notes)] = notes.column(name)
+        self._size += len(notes)
+        return range(start, self._size)
+
+    def insert(self, index: int, notes: NoteStore) -> range:
+        """
+        Insert all notes in `notes` before position `index`, shifting the notes after
+        it, and return the indices of the inserted notes.
+        """
+        index = min(max(index if index >= 0 else index + self._size, 0), self._size)
+        count = len(notes)
+        self._prepare_write()
+        self._reserve(self._size + count)
+        for name in self.COLUMNS:
+            array = self._data[name]
+            array[index + count : self._size + count] = array[index : self._size]
+            array[index : index + count] = notes.column(name)
+        self._size += count
+        return range(index, index + count)
+
+    def delete(self, index: NoteIndex) -> None:
+        """Remove the notes at `index`, which may be an integer, slice, mask or index array."""
+        keep = np.ones(self._size, dtype=bool)
+        keep[index] = False
+        self._prepare_write()
+        remaining = int(np.count_nonzero(keep))
+        for name in self.COLUMNS:
+            array = self._data[name]
+            array[:remaining] = array[: self._size][keep]
+        self._size = remaining
+
+    def clear(self) -> None:
+        self._prepare_write()
+        self._size = 0
+
+    def copy(self) -> NoteStore:
+        """Return a copy of this store, trimmed to the number of notes it holds."""
+        store = NoteStore()
+        store._data = {
+            name: self._data[name][: self._size].copy() for name in self.COLUMNS
+        }
+        store._size = self._size
+        return store
+
+    def to_notes(self) -> List[Note]:
+        return list(self)
+
+
 @dataclass
 class SongHeader:
     version: int = NBS_VERSION
@@ -55,13 +385,74 @@ class SongHeader:
     loop_start_tick: int = 0
 
 
+@dataclass
+class SongInfo:
+    """The header of a song file, and a summary of its notes."""
+
+    header: SongHeader
+    note_count: int = 0
+    layer_count: int = 0
+    # Number of ticks up to the last note of the song
+    length: int = 0
+
+    @property
+    def duration(self) -> float:
+        """Length of the song in seconds."""
+        return self.length / self.header.tempo if self.header.tempo else 0
+
+
+@dataclass
+class EditorState:
+    """The state of the editor that's saved with a project, to reopen it as it was."""
+
+    # Top left cell visible in the workspace
+    scroll_tick: int = 0
+    scroll_layer: int = 0
+    zoom: float = 1.0
+    playback_position: float = 0.0
+    current_instrument: int = 0
+
+
 @dataclass
 class Song:
     header: SongHeader
-    notes: list[Note]
+    notes: NoteStore
     layers: list[Layer]
     instruments: list[Instrument]
 
+    def snapshot(self) -> SongSnapshot:
+        """
+        Return an immutable copy of the song. The notes are shared with the song
+        until it's modified, so this takes constant time regardless of song length.
+        """
+        return SongSnapshot(
+            header=replace(self.header),
+            notes=self.notes.snapshot(),
+            layers=tuple(replace(layer) for layer in self.layers),
+            instruments=tuple(_copy_instrument(ins) for ins in self.instruments),
+        )
+
+
+@dataclass(frozen=True)
+class SongSnapshot:
+    """
+    A frozen copy of a `Song` at some point in time. It's never modified after
+    being created, so it can be read (e.g. saved) from any thread.
+    """
+
+    header: SongHeader
+    notes: NoteStore
+    layers: Tuple[Layer, ...]
+    instruments: Tuple[Instrument, ...]
+
+
+def _copy_instrument(ins: Instrument) -> Instrument:
+    # Instruments may be wrapped by other objects that forward their attributes,
+    # so they're copied field by field instead of with `dataclasses.replace()`
+    return Instrument(
+        **{field.name: getattr(ins, field.name) for field in fields(Instrument)}
+    )
+
 
 default_instruments = [
     Instrument(
@@ -1,24 +1,302 @@
 """
 Deals with type conversions between the internal format and
-the actual data stored in the NBS file (parsed by `pynbs`).
+the actual data stored in the NBS file.
+
+Songs are read by a native parser that decodes the note section straight into
+a `NoteStore`, from the file contents in memory or memory-mapped. They're
+written by a native writer that encodes the note section from the note columns
+in the same way, and replaces the previous file atomically.
+
+NBS files may be compressed with gzip, xz or (if the `zstandard` package is
+installed) Zstandard, as .nbs.gz, .nbs.xz and .nbs.zst files. Compressed files
+are read and written through streaming codecs: they're decompressed to a
+temporary file, which is then memory-mapped, and compressed as they're written.
+
+Songs can also be saved as projects (.nbsx files), a native format that stores
+the note columns in chunks of notes sorted by tick, with the range of ticks of
+each chunk, so the notes in any part of a song can be read without decoding the
+rest. Projects also hold the state of the editor.
 """
 
-import os
-from typing import Sequence, Union
+from __future__ import annotations
 
+import gzip
+import json
+import lzma
+import os
+import shutil
+import tempfile
+import zlib
+from contextlib import contextmanager
+from dataclasses import asdict
+from mmap import ACCESS_READ
+from mmap import mmap as MemoryMap
+from struct import Struct
+from struct import error as struct_error
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy as np
 import pynbs
 
-from nbs.core.data import NBS_VERSION, Instrument, Layer, Note, Song, SongHeader
-from nbs.utils.file import PathLike
-
-
-def load_song(path: PathLike) -> Song:
-    return convert_file_to_song(pynbs.read(path))
+from nbs.core.data import (
+    NBS_VERSION,
+    EditorState,
+    Instrument,
+    Layer,
+    NoteStore,
+    Song,
+    SongHeader,
+    SongInfo,
+    SongSnapshot,
+)
+from nbs.utils.file import PathLike, atomic_write
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+if TYPE_CHECKING:
+    from nbs.core.cache import SongCache
+
+
+BYTE = Struct("<B")
+SHORT = Struct("<H")
+SSHORT = Struct("<h")
+INT = Struct("<I")
+
+# Number of word pairs of the note section decoded at a time (see `_read_notes`)
+NOTE_CHUNK_SIZE = 1 << 16
+
+# Compression formats of compressed NBS files, by extension
+COMPRESSION_EXTENSIONS = {".gz": "gzip", ".xz": "xz", ".zst": "zstd"}
+# Compression formats, by the magic number their files start with
+COMPRESSION_MAGIC = {
+    b"\x1f\x8b\x08": "gzip",
+    b"\xfd7zXZ\x00": "xz",
+    b"\x28\xb5\x2f\xfd": "zstd",
+}
+# Number of bytes decompressed at a time
+STREAM_CHUNK_SIZE = 1 << 20
+
+PROJECT_EXTENSION = ".nbsx"
+# Magic number, format version, and offset of the index of a project file
+PROJECT_HEADER = Struct("<4sHxxQ")
+PROJECT_MAGIC = b"NBSX"
+PROJECT_VERSION = 1
+# Number of notes in each chunk of a project file
+PROJECT_CHUNK_SIZE = 4096
+
+
+def load_song(
+    path: PathLike, mmap: bool = False, cache: Optional[SongCache] = None
+) -> Song:
+    """
+    Load a song from an NBS file, which may be compressed. If `mmap` is set, the
+    file is memory-mapped rather than read into memory, and decoded straight from
+    the mapped pages, so the song is loaded without holding a copy of the whole
+    file (compressed files are always decompressed to a mapped temporary file).
+    If a `cache` is given, the song is loaded from it if it was cached, and
+    cached otherwise.
+    """
+    if cache is not None:
+        return cache.load(path)
+    with _open_song(path, mmap) as data:
+        return parse_song(data)
+
+
+def read_song_header(path: PathLike) -> SongInfo:
+    """
+    Read the header of an NBS file, and count its notes without decoding them.
+    This is much faster than loading the song, e.g. to list a song library.
+    """
+    with _open_song(path, mmap=True) as data:
+        return parse_song_header(data)
+
+
+def read_song_headers(paths: Iterable[PathLike]) -> List[Optional[SongInfo]]:
+    """
+    Read the headers of many NBS files with `read_song_header()`. Files that can't
+    be read (e.g. missing or invalid files) give `None` instead.
+    """
+    headers: List[Optional[SongInfo]] = []
+    for path in paths:
+        try:
+            headers.append(read_song_header(path))
+        except (OSError, ValueError):
+            headers.append(None)
+    return headers
+
+
+def parse_song_header(data: Union[bytes, memoryview]) -> SongInfo:
+    """Parse the header of a song from the contents of an NBS file."""
+    data = memoryview(data)
+    reader = _Reader(data)
+    header, layer_count = _read_header(reader)
+    note_count, length, _ = _count_notes(data, reader.offset, header.version)
+    return SongInfo(header, note_count, layer_count, length)
+
+
+def parse_song(data: Union[bytes, memoryview]) -> Song:
+    """Parse a song from the contents of an NBS file (any version from 0 to 5)."""
+    data = memoryview(data)
+    reader = _Reader(data)
+    header, layer_count = _read_header(reader)
+    notes, reader.offset = _read_notes(data, reader.offset, header.version)
+    layers = _read_layers(reader, layer_count, header.version)
+    instruments = _read_instruments(reader)
+    return Song(header, notes, layers, instruments)
 
 
-def save_song(song: Song, path: PathLike, version: int = NBS_VERSION):
-    """Save a song to a file."""
-    convert_song_to_file(song).save(path, version=version)
+def save_song(
+    song: Union[Song, SongSnapshot], path: PathLike, version: int = NBS_VERSION
+):
+    """
+    Save a song to a file, compressed if its extension is one of
+    `COMPRESSION_EXTENSIONS`. The file is written to a temporary file first, and
+    only replaces the previous one once it's safely on disk.
+    """
+    words = _encode_notes(song.notes, version)
+    with atomic_write(path) as f, _compress(f, get_compression(path)) as stream:
+        writer = _Writer(stream)
+        _write_header(writer, song, version)
+        stream.write(memoryview(words).cast("B"))
+        _write_layers(writer, song.layers, version)
+        _write_instruments(writer, song.instruments)
+
+
+def get_compression(path: PathLike) -> Optional[str]:
+    """Return the compression format of a song file, according to its extension."""
+    _, extension = os.path.splitext(os.fsdecode(path).lower())
+    return COMPRESSION_EXTENSIONS.get(extension)
+
+
+def _check_compression(compression: str) -> None:
+    if compression == "zstd" and zstandard is None:
+        raise ValueError("Zstandard compression requires the zstandard package")
+
+
+@contextmanager
+def _compress(file: BinaryIO, compression: Optional[str]) -> Iterator[BinaryIO]:
+    """Return a stream that writes to `file`, compressed in the given format."""
+    if compression is None:
+        yield file
+        return
+    _check_compression(compression)
+    if compression == "gzip":
+        # No name or time in the header, so that the output is reproducible
+        stream = gzip.GzipFile("", "wb", compresslevel=6, fileobj=file, mtime=0)
+    elif compression == "xz":
+        stream = lzma.LZMAFile(file, "wb")
+    else:
+        stream = zstandard.ZstdCompressor().stream_writer(file, closefd=False)
+    with stream:
+        yield stream
+
+
+def _decompress(file: BinaryIO, compression: str) -> BinaryIO:
+    """Return a stream that reads the decompressed contents of `file`."""
+    _check_compression(compression)
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=file, mode="rb")
+    if compression == "xz":
+        return lzma.LZMAFile(file, "rb")
+    return zstandard.ZstdDecompressor().stream_reader(file, closefd=False)
+
+
+def is_project(path: PathLike) -> bool:
+    return os.fsdecode(path).lower().endswith(PROJECT_EXTENSION)
+
+
+def open_project(path: PathLike) -> ProjectFile:
+    """
+    Open a project file, reading everything but its notes, which can then be read
+    from any range of ticks with `ProjectFile.read_notes()`.
+    """
+    return ProjectFile(path)
+
+
+def load_project(path: PathLike) -> Tuple[Song, EditorState]:
+    """Load a whole song, and the state of the editor, from a project file."""
+    with open_project(path) as project:
+        return project.song(project.read_notes()), project.editor
+
+
+def save_project(
+    song: Union[Song, SongSnapshot],
+    path: PathLike,
+    editor: Optional[EditorState] = None,
+    compress: bool = True,
+) -> None:
+    """
+    Save a song, and the state of the editor, to a project file. The note columns
+    are compressed with zlib, unless `compress` is unset. Like `save_song()`, the
+    previous file is only replaced once the new one is safely on disk.
+    """
+    notes = song.notes[np.lexsort((song.notes.layer, song.notes.tick))]
+    chunks = []
+    with atomic_write(path) as f:
+        f.write(PROJECT_HEADER.pack(PROJECT_MAGIC, PROJECT_VERSION, 0))
+        offset = PROJECT_HEADER.size
+        for start in range(0, len(notes), PROJECT_CHUNK_SIZE):
+            chunk = notes[start : start + PROJECT_CHUNK_SIZE]
+            lengths = []
+            for name in NoteStore.COLUMNS:
+                data = _encode_column(name, chunk.column(name), compress)
+                f.write(data)
+                lengths.append(len(data))
+            chunks.append(
+                {
+                    "offset": offset,
+                    "lengths": lengths,
+                    "size": len(chunk),
+                    "first_tick": int(chunk.tick[0]),
+                    "last_tick": int(chunk.tick[-1]),
+                }
+            )
+            offset += sum(lengths)
+
+        index = {
+            **_song_metadata(song),
+            "editor": asdict(editor if editor is not None else EditorState()),
+            "note_count": len(notes),
+            "columns": list(NoteStore.COLUMNS),
+            "compression": "zlib" if compress else None,
+            "chunks": chunks,
+        }
+        f.write(json.dumps(index).encode())
+        f.seek(0)
+        f.write(PROJECT_HEADER.pack(PROJECT_MAGIC, PROJECT_VERSION, offset))
+
+
+def convert_song_file(source: PathLike, destination: PathLike) -> None:
+    """
+    Convert a song between the NBS and project formats (or to the same format),
+    according to the extensions of `source` and `destination`. Nothing is lost:
+    NBS files are saved in the version they were read in, and the editor state
+    of a project is kept if it's saved to another project.
+    """
+    editor = None
+    if is_project(source):
+        song, editor = load_project(source)
+    else:
+        song = load_song(source)
+    if is_project(destination):
+        save_project(song, destination, editor)
+    else:
+        save_song(song, destination, version=song.header.version)
 
 
 def convert_file_to_song(file: pynbs.File) -> Song:
@@ -29,7 +307,7 @@ def convert_file_to_song(file: pynbs.File) -> Song:
     return Song(header, notes, layers, instruments)
 
 
-def convert_song_to_file(song: Song) -> pynbs.File:
+def convert_song_to_file(song: Union[Song, SongSnapshot]) -> pynbs.File:
     header = _save_header(song.header)
     notes = _save_notes(song.notes)
     layers = _save_layers(song.layers)
@@ -37,6 +315,562 @@ def convert_song_to_file(song: Song) -> pynbs.File:
     return pynbs.File(header, notes, layers, instruments)
 
 
+@contextmanager
+def _open_song(path: PathLike, mmap: bool = False) -> Iterator[memoryview]:
+    """
+    Return the contents of the file at `path`, memory-mapped if `mmap` is set.
+    Compressed files are decompressed in chunks to a temporary file, which is
+    memory-mapped, so the decompressed contents are never all held in memory.
+    """
+    with open(path, "rb") as f:
+        magic = f.read(max(map(len, COMPRESSION_MAGIC)))
+        f.seek(0)
+        compression = next(
+            (c for m, c in COMPRESSION_MAGIC.items() if magic.startswith(m)), None
+        )
+        if compression is not None:
+            with tempfile.TemporaryFile() as temp:
+                with _decompress(f, compression) as stream:
+                    shutil.copyfileobj(stream, temp, STREAM_CHUNK_SIZE)
+                temp.flush()
+                with _map_file(temp) as data:
+                    yield data
+        elif mmap:
+            with _map_file(f) as data:
+                yield data
+        else:
+            yield memoryview(f.read())
+
+
+@contextmanager
+def _map_file(file: BinaryIO) -> Iterator[memoryview]:
+    if os.fstat(file.fileno()).st_size == 0:
+        yield memoryview(b"")  # Empty files can't be mapped
+        return
+    mapped = MemoryMap(file.fileno(), 0, access=ACCESS_READ)
+    data = memoryview(mapped)
+    try:
+        yield data
+    finally:
+        try:
+            data.release()
+            mapped.close()
+        except BufferError:
+            # Arrays viewing the file are still alive (e.g. in the traceback of
+            # an error), so the map is closed when they're garbage collected
+            pass
+
+
+class _Reader:
+    """Reads the values in the contents of an NBS file, one after the other."""
+
+    def __init__(self, data: memoryview, offset: int = 0) -> None:
+        self.data = data
+        self.offset = offset
+
+    def read(self, fmt: Struct) -> int:
+        self._check_size(fmt.size)
+        (value,) = fmt.unpack_from(self.data, self.offset)
+        self.offset += fmt.size
+        return value
+
+    def read_string(self) -> str:
+        length = self.read(INT)
+        self._check_size(length)
+        value = str(self.data[self.offset : self.offset + length], "cp1252")
+        self.offset += length
+        return value
+
+    def _check_size(self, size: int) -> None:
+        if self.offset + size > len(self.data):
+            raise ValueError("Unexpected end of file")
+
+
+def _read_header(reader: _Reader) -> Tuple[SongHeader, int]:
+    """Read the header of an NBS file, and return it with the number of layers."""
+
+    # A song length of 0 indicates the Open Note Block Studio format
+    song_length = reader.read(SHORT)
+    version = reader.read(BYTE) if song_length == 0 else 0
+    default_instruments = reader.read(BYTE) if version > 0 else 10
+    if version >= 3:
+        reader.read(SHORT)  # Song length
+    layer_count = reader.read(SHORT)
+
+    header = SongHeader(
+        version=version,
+        default_instruments=default_instruments,
+        title=reader.read_string(),
+        author=reader.read_string(),
+        original_author=reader.read_string(),
+        description=reader.read_string(),
+        tempo=reader.read(SHORT) / 100,
+    )
+    reader.read(BYTE)  # Auto-save
+    reader.read(BYTE)  # Auto-save duration
+    header.time_signature = reader.read(BYTE)
+    header.minutes_spent = reader.read(INT)
+    header.left_clicks = reader.read(INT)
+    header.right_clicks = reader.read(INT)
+    header.blocks_added = reader.read(INT)
+    header.blocks_removed = reader.read(INT)
+    header.song_origin = reader.read_string()
+    if version >= 4:
+        header.loop = reader.read(BYTE) == 1
+        header.max_loop_count = reader.read(BYTE)
+        header.loop_start_tick = reader.read(SHORT)
+    return header, layer_count
+
+
+class _NoteSection:
+    """
+    The note section of an NBS file, starting at byte `offset` of `data`.
+
+    The section is made of 16-bit words: the jump to the next tick, then, for
+    each note in that tick, the jump to its layer and the note itself, and a
+    zero jump to end the tick. A zero tick jump ends the section. Notes take a
+    single word (instrument and key) before version 4, and three afterwards
+    (plus velocity, panning, and pitch).
+
+    After the first tick jump, every layer jump is at an even distance from it,
+    so the section is viewed as an array of word pairs: a layer jump and a note,
+    a zero and a tick jump, or the last two words of a note. Telling them apart
+    is vectorized, which makes it possible to go through the whole section in a
+    few passes over large chunks of it, without a loop over the notes.
+    """
+
+    def __init__(self, data: memoryview, offset: int, version: int) -> None:
+        first_jump = _Reader(data, offset).read(SHORT)
+        offset += SHORT.size
+        self.first_tick = first_jump - 1
+        self.long_notes = version >= 4
+        # Offset of the first byte after the section, once it's been reached
+        self.end = offset if first_jump == 0 else None
+        words = np.frombuffer(data, "<u2", (len(data) - offset) // 4 * 2, offset)
+        self.pairs = words.reshape(-1, 2)
+        # Each pair as a single value, to find the pairs of zeros
+        self._pair_values = words.view("<u4")
+        self._offset = offset
+
+    @property
+    def max_size(self) -> int:
+        """Upper bound of the number of notes in the section."""
+        if self.end is not None:
+            return 0
+        # Notes take two pairs from version 4
+        return len(self.pairs) // 2 if self.long_notes else len(self.pairs)
+
+    def chunks(self) -> Iterator[Tuple[np.ndarray, Optional[np.ndarray], int]]:
+        """
+        Yield the pairs of the section, in order, in chunks of up to
+        `NOTE_CHUNK_SIZE` pairs, with a mask of the pairs that start with a layer
+        or tick jump (or `None` if all of them do), and the index of the first
+        pair of the chunk in `pairs`.
+        """
+        # Whether the next pair starts with a jump, i.e. isn't the end of a note
+        is_record = True
+        start = 0
+        while self.end is None:
+            chunk = self.pairs[start : start + NOTE_CHUNK_SIZE]
+            if len(chunk) == 0:
+                raise ValueError("Unexpected end of file")
+
+            records = None
+            if self.long_notes:
+                # A pair after a note is the end of that note, so in a run of pairs
+                # with non-zero first words, records and note ends alternate. A pair
+                # with a zero first word (which ends a tick or a note) is always
+                # followed by a record, so the alternation restarts after it: a
+                # pair is a record if it's at an odd distance from the last zero
+                # before it.
+                index = np.arange(len(chunk), dtype=np.int32)
+                previous = np.empty_like(index)
+                previous[0] = -1 if is_record else -2
+                marks = np.where(chunk[:-1, 0] == 0, index[:-1], previous[0])
+                np.maximum.accumulate(marks, out=previous[1:])
+                records = ((index ^ previous) & 1).astype(bool)
+                is_record = not (records[-1] and chunk[-1, 0] != 0)
+
+            # The section ends with a record of two zero words
+            zeros = np.flatnonzero(self._pair_values[start : start + len(chunk)] == 0)
+            if records is not None:
+                zeros = zeros[records[zeros]]
+            if len(zeros) > 0:
+                size = int(zeros[0])
+                self.end = self._offset + (start + size + 1) * 4
+                chunk = chunk[:size]
+                records = records[:size] if records is not None else None
+            yield chunk, records, start
+            start += NOTE_CHUNK_SIZE
+
+
+def _read_notes(data: memoryview, offset: int, version: int) -> Tuple[NoteStore, int]:
+    """
+    Read the note section of an NBS file, starting at byte `offset` of `data`.
+    Return the notes, and the offset of the first byte after the section.
+    """
+    section = _NoteSection(data, offset, version)
+    pairs = section.pairs
+    notes = NoteStore(section.max_size)
+    tick = section.first_tick
+    layer = -1
+
+    for chunk, records, start in section.chunks():
+        if records is not None:
+            records = start + np.flatnonzero(records)
+            chunk = pairs[records]
+        jumps = chunk[:, 0]
+        values = chunk[:, 1]
+        is_tick = jumps == 0
+
+        # Layer jumps are zero in the pairs with tick jumps, and the layer of a note
+        # is relative to the last tick jump before it, if any
+        ticks = tick + np.where(is_tick, values, 0).cumsum(dtype=np.int64)
+        layers = jumps.cumsum(dtype=np.int64)
+        index = np.arange(len(chunk), dtype=np.int32)
+        last_tick = np.maximum.accumulate(np.where(is_tick, index, -1))
+        base = np.where(last_tick >= 0, layers[last_tick] + 1, -layer)
+        layers -= base
+
+        rows = np.flatnonzero(~is_tick)
+        key = values[rows]
+        columns = {
+            "tick": ticks[rows],
+            "layer": layers[rows],
+            "instrument": key & 0xFF,
+            "key": key >> 8,
+        }
+        if section.long_notes:
+            rows = records[rows] + 1
+            if len(rows) > 0 and rows[-1] >= len(pairs):
+                raise ValueError("Unexpected end of file")
+            extra = pairs[rows]
+            columns["velocity"] = extra[:, 0] & 0xFF
+            columns["panning"] = (extra[:, 0] >> 8).astype(np.int16) - 100
+            columns["pitch"] = extra[:, 1].view(np.int16)
+        notes.extend(NoteStore.from_arrays(**columns))
+
+        if len(chunk) > 0:
+            tick = int(ticks[-1])
+            layer = int(layers[-1])
+
+    return notes, section.end
+
+
+def _count_notes(data: memoryview, offset: int, version: int) -> Tuple[int, int, int]:
+    """
+    Go through the note section of an NBS file, starting at byte `offset` of
+    `data`, without decoding the notes. Return the number of notes, the length of
+    the song in ticks, and the offset of the first byte after the section.
+    """
+    section = _NoteSection(data, offset, version)
+    size = 0  # Number of pairs that aren't tick jumps
+    tick = section.first_tick
+    for chunk, records, _ in section.chunks():
+        is_tick = chunk[:, 0] == 0
+        if records is not None:
+            is_tick &= records
+        size += len(chunk) - int(np.count_nonzero(is_tick))
+        tick += int(chunk[is_tick, 1].sum(dtype=np.int64))
+    count = size // 2 if section.long_notes else size
+    return count, tick + 1 if count > 0 else 0, section.end
+
+
+def _read_layers(reader: _Reader, count: int, version: int) -> list[Layer]:
+    layers = []
+    for _ in range(count):
+        name = reader.read_string()
+        lock = reader.read(BYTE) if version >= 4 else 0
+        volume = reader.read(BYTE)
+        panning = reader.read(BYTE) - 100 if version >= 2 else 0
+        layers.append(
+            Layer(
+                name=name,
+                lock=lock == 1,
+                solo=lock == 2,  # Not specified in the NBS format
+                volume=volume,
+                panning=panning,
+            )
+        )
+    return layers
+
+
+def _read_instruments(reader: _Reader) -> list[Instrument]:
+    instruments = []
+    for _ in range(reader.read(BYTE)):
+        name = reader.read_string()
+        sound_path = reader.read_string()
+        pitch = reader.read(BYTE)
+        press = reader.read(BYTE) == 1
+        instruments.append(
+            Instrument(name=name, sound_path=sound_path, pitch=pitch, press=press)
+        )
+    return instruments
+
+
+class _Writer:
+    """Writes values to an NBS file, one after the other."""
+
+    def __init__(self, file: BinaryIO) -> None:
+        self.file = file
+
+    def write(self, fmt: Struct, value: int) -> None:
+        self.file.write(fmt.pack(value))
+
+    def write_string(self, value: str) -> None:
+        encoded = value.encode("cp1252")
+        self.write(INT, len(encoded))
+        self.file.write(encoded)
+
+
+def _write_header(
+    writer: _Writer, song: Union[Song, SongSnapshot], version: int
+) -> None:
+    header = song.header
+    # Tick of the last note, as written by Note Block Studio
+    song_length = int(song.notes.tick.max()) if len(song.notes) > 0 else 0
+    if version > 0:
+        writer.write(SHORT, 0)
+        writer.write(BYTE, version)
+        writer.write(BYTE, header.default_instruments)
+    else:
+        writer.write(SHORT, song_length)
+    if version >= 3:
+        writer.write(SHORT, song_length)
+    writer.write(SHORT, len(song.layers))
+    writer.write_string(header.title)
+    writer.write_string(header.author)
+    writer.write_string(header.original_author)
+    writer.write_string(header.description)
+    writer.write(SHORT, round(header.tempo * 100))
+    writer.write(BYTE, 0)  # Auto-save
+    writer.write(BYTE, 10)  # Auto-save duration
+    writer.write(BYTE, header.time_signature)
+    writer.write(INT, header.minutes_spent)
+    writer.write(INT, header.left_clicks)
+    writer.write(INT, header.right_clicks)
+    writer.write(INT, header.blocks_added)
+    writer.write(INT, header.blocks_removed)
+    writer.write_string(header.song_origin)
+    if version >= 4:
+        writer.write(BYTE, int(header.loop))
+        writer.write(BYTE, header.max_loop_count)
+        writer.write(SHORT, header.loop_start_tick)
+
+
+def _check_range(name: str, values: np.ndarray, low: int, high: int) -> None:
+    if len(values) > 0 and (values.min() < low or values.max() > high):
+        raise ValueError(f"Note {name} out of range for the NBS format")
+
+
+def _pack_bytes(low: np.ndarray, high: np.ndarray) -> np.ndarray:
+    """Pack pairs of bytes into little-endian words."""
+    return low.astype(np.uint16) | high.astype(np.uint16) << 8
+
+
+def _encode_notes(notes: NoteStore, version: int) -> np.ndarray:
+    """
+    Encode `notes` as the note section of an NBS file (see `_NoteSection`), and
+    return its words. Only the last of the notes that share a cell is saved.
+
+    Every word has a fixed position given by the index of its note in the sorted
+    notes and the index of its tick, so the section is filled in with a few array
+    assignments: the zeros that end each tick and the section are already there.
+    """
+    order = np.lexsort((notes.layer, notes.tick))
+    ticks = notes.tick[order]
+    layers = notes.layer[order]
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = (ticks[1:] != ticks[:-1]) | (layers[1:] != layers[:-1])
+    order, ticks, layers = order[last], ticks[last], layers[last]
+    notes = notes[order]
+
+    # Indices of the first note of each tick
+    starts = np.flatnonzero(np.diff(ticks, prepend=-1))
+    tick_jumps = np.diff(ticks[starts], prepend=-1)
+    layer_jumps = np.diff(layers.astype(np.int32), prepend=-1)
+    layer_jumps[starts] = layers[starts] + 1
+    _check_range("tick", ticks, 0, 0xFFFE)
+    _check_range("layer", layers, 0, 0xFFFE)
+    _check_range("instrument", notes.instrument, 0, 0xFF)
+    _check_range("key", notes.key, 0, 0xFF)
+
+    # Words taken by each note, after its layer jump
+    size = 3 if version >= 4 else 1
+    words = np.zeros(len(notes) * (size + 1) + len(starts) * 2 + 1, "<u2")
+    is_start = np.zeros(len(notes), dtype=bool)
+    is_start[starts] = True
+    tick_index = np.cumsum(is_start) - 1
+    positions = np.arange(len(notes)) * (size + 1) + tick_index * 2 + 1
+    words[starts * (size + 1) + np.arange(len(starts)) * 2] = tick_jumps
+    words[positions] = layer_jumps
+    words[positions + 1] = _pack_bytes(notes.instrument, notes.key)
+    if version >= 4:
+        _check_range("velocity", notes.velocity, 0, 0xFF)
+        _check_range("panning", notes.panning, -100, 0xFF - 100)
+        words[positions + 2] = _pack_bytes(notes.velocity, notes.panning + 100)
+        words[positions + 3] = notes.pitch.view(np.uint16)
+    return words
+
+
+def _write_layers(writer: _Writer, layers: Sequence[Layer], version: int) -> None:
+    for layer in layers:
+        writer.write_string(layer.name)
+        if version >= 4:
+            writer.write(BYTE, 1 if layer.lock else 2 if layer.solo else 0)
+        writer.write(BYTE, layer.volume)
+        if version >= 2:
+            writer.write(BYTE, layer.panning + 100)
+
+
+def _write_instruments(writer: _Writer, instruments: Sequence[Instrument]) -> None:
+    writer.write(BYTE, len(instruments))
+    for instrument in instruments:
+        writer.write_string(instrument.name)
+        writer.write_string(instrument.sound_path or "")
+        writer.write(BYTE, instrument.pitch)
+        writer.write(BYTE, int(instrument.press))
+
+
+class ProjectFile:
+    """
+    An open project file.
+
+    The file is made of the chunks of notes, followed by an index that holds the
+    header, layers, instruments and editor state of the song, and the position
+    and range of ticks of every chunk. Only the index is read when the file is
+    opened: chunks are decoded when their notes are read.
+    """
+
+    def __init__(self, path: PathLike) -> None:
+        with open(path, "rb") as f:
+            self._data = MemoryMap(f.fileno(), 0, access=ACCESS_READ)
+        try:
+            self._read_index()
+        except (ValueError, KeyError, TypeError, struct_error) as e:
+            self.close()
+            raise ValueError(f"Invalid project file: {e}") from e
+
+    def _read_index(self) -> None:
+        magic, version, offset = PROJECT_HEADER.unpack_from(self._data)
+        if magic != PROJECT_MAGIC:
+            raise ValueError("not a project file")
+        if version > PROJECT_VERSION:
+            raise ValueError(f"unsupported version {version}")
+        index = json.loads(self._data[offset:])
+        if index["columns"] != list(NoteStore.COLUMNS):
+            raise ValueError("unknown note columns")
+        song = _song_from_metadata(index, NoteStore())
+        self.header = song.header
+        self.layers = song.layers
+        self.instruments = song.instruments
+        self.editor = EditorState(**index["editor"])
+        self.note_count: int = index["note_count"]
+        self.compressed = index["compression"] == "zlib"
+        chunks = index["chunks"]
+        self._chunks = [(c["offset"], c["lengths"], c["size"]) for c in chunks]
+        # First and last tick of each chunk
+        self.chunk_ticks = np.array(
+            [(c["first_tick"], c["last_tick"]) for c in chunks], np.int64
+        ).reshape(-1, 2)
+
+    def __enter__(self) -> ProjectFile:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._data.close()
+
+    @property
+    def chunk_count(self) -> int:
+        return len(self._chunks)
+
+    @property
+    def length(self) -> int:
+        """Number of ticks up to the last note of the song."""
+        return int(self.chunk_ticks[-1, 1]) + 1 if self.chunk_count > 0 else 0
+
+    @property
+    def info(self) -> SongInfo:
+        return SongInfo(self.header, self.note_count, len(self.layers), self.length)
+
+    def song(self, notes: NoteStore) -> Song:
+        """Return the song in the project, with `notes` as its notes."""
+        return Song(self.header, notes, self.layers, self.instruments)
+
+    def chunk_size(self, index: int) -> int:
+        return self._chunks[index][2]
+
+    def find_chunks(self, start: int, stop: int) -> np.ndarray:
+        """Return the indices of the chunks with notes from tick `start` to `stop`."""
+        first, last = self.chunk_ticks.T
+        return np.flatnonzero((first < stop) & (last >= start))
+
+    def read_chunk(self, index: int) -> NoteStore:
+        offset, lengths, size = self._chunks[index]
+        columns = {}
+        for (name, dtype), length in zip(NoteStore.COLUMNS.items(), lengths):
+            data = self._data[offset : offset + length]
+            if self.compressed:
+                data = zlib.decompress(data)
+            column = np.frombuffer(data, dtype.newbyteorder("<"), size)
+            columns[name] = column.astype(dtype)
+            offset += length
+        columns["tick"] = columns["tick"].cumsum(dtype=np.int32)
+        return NoteStore.from_columns(columns)
+
+    def read_notes(self, start: int = 0, stop: Optional[int] = None) -> NoteStore:
+        """
+        Read the notes from tick `start` (inclusive) to `stop` (exclusive, or the
+        end of the song), sorted by tick and layer. Only the chunks with notes in
+        that range are decoded.
+        """
+        stop = self.length if stop is None else stop
+        chunks = self.find_chunks(start, stop).tolist()
+        notes = NoteStore(sum(self.chunk_size(index) for index in chunks))
+        for index in chunks:
+            chunk = self.read_chunk(index)
+            first, last = np.searchsorted(chunk.tick, [start, stop])
+            notes.extend(chunk[first:last])
+        return notes
+
+
+def _encode_column(name: str, column: np.ndarray, compress: bool) -> bytes:
+    if name == "tick":
+        # Ticks are sorted, so they're stored as the differences between them
+        column = column.copy()
+        column[1:] -= column[:-1].copy()
+    data = column.astype(column.dtype.newbyteorder("<")).tobytes()
+    return zlib.compress(data, 1) if compress else data
+
+
+def _song_metadata(song: Union[Song, SongSnapshot]) -> Dict[str, Any]:
+    """Return everything in `song` but its notes, as JSON-serializable values."""
+    return {
+        "header": asdict(song.header),
+        "layers": [asdict(layer) for layer in song.layers],
+        "instruments": [asdict(ins) for ins in song.instruments],
+    }
+
+
+def _song_from_metadata(metadata: Dict[str, Any], notes: NoteStore) -> Song:
+    """Return the song with the metadata returned by `_song_metadata()`."""
+    instruments = []
+    for values in metadata["instruments"]:
+        color = values.pop("color")
+        instruments.append(
+            Instrument(**values, color=tuple(color) if color is not None else None)
+        )
+    return Song(
+        header=SongHeader(**metadata["header"]),
+        notes=notes,
+        layers=[Layer(**values) for values in metadata["layers"]],
+        instruments=instruments,
+    )
+
+
 def _parse_header(header: pynbs.Header) -> SongHeader:
     """Parse header from `pynbs.Header` to `nbs.SongHeader`."""
 
@@ -54,27 +888,24 @@ def _parse_header(header: pynbs.Header) -> SongHeader:
         right_clicks=header.right_clicks,
         blocks_added=header.blocks_added,
         blocks_removed=header.blocks_removed,
+        song_origin=header.song_origin,
         loop=header.loop,
         max_loop_count=header.max_loop_count,
         loop_start_tick=header.loop_start,
     )
 
 
-def _parse_notes(notes: Sequence[pynbs.Note]) -> list[Note]:
-    """Parse notes from `pynbs.Note` to `nbs.Note`."""
+def _parse_notes(notes: Sequence[pynbs.Note]) -> NoteStore:
+    """Parse notes from `pynbs.Note` to a `nbs.NoteStore`."""
 
-    return [
-        Note(
-            tick=note.tick,
-            layer=note.layer,
-            instrument=note.instrument,
-            key=note.key,
-            velocity=note.velocity,
-            panning=note.panning,
-            pitch=note.pitch,
-        )
-        for note in notes
-    ]
+    return NoteStore.from_arrays(
+        **{
+            name: np.fromiter(
+                (getattr(note, name) for note in notes), dtype, len(notes)
+            )
+            for name, dtype in NoteStore.COLUMNS.items()
+        }
+    )
 
 
 def _parse_layers(layers: Sequence[pynbs.Layer]) -> list[Layer]:
@@ -123,25 +954,18 @@ def _save_header(header: SongHeader) -> pynbs.Header:
         right_clicks=header.right_clicks,
         blocks_added=header.blocks_added,
         blocks_removed=header.blocks_removed,
+        song_origin=header.song_origin,
         loop=header.loop,
         max_loop_count=header.max_loop_count,
         loop_start=header.loop_start_tick,
     )
 
 
-def _save_notes(notes: Sequence[Note]) -> list[pynbs.Note]:
-    """Convert notes from `nbs.Note` to `pynbs.Note`."""
+def _save_notes(notes: NoteStore) -> list[pynbs.Note]:
+    """Convert notes from a `nbs.NoteStore` to `pynbs.Note`."""
 
-    return [
-        pynbs.Note(
-            tick=note.tick,
-            layer=note.layer,
-            instrument=note.instrument,
-            key=note.key,
-            velocity=note.velocity,
-        )
-        for note in notes
-    ]
+    columns = (notes.column(name).tolist() for name in NoteStore.COLUMNS)
+    return [pynbs.Note(*values) for values in zip(*columns)]
 
 
 def _save_layers(layers: Sequence[Layer]) -> list[pynbs.Layer]:
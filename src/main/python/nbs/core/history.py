@@ -0,0 +1,377 @@
+"""
+Undo/redo history built on compact command deltas.
+
+Edits are applied by the objects that own the data, and then recorded in a
+`History` as a `Command` describing *what changed* (the affected note ids and
+their old/new values), never as a copy of the song. Undoing or redoing a
+command replays that delta on the object that applied it.
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Iterator, List, Optional, Protocol, Union
+
+import numpy as np
+
+from nbs.core.data import Layer, NoteStore
+
+DEFAULT_MEMORY_LIMIT = 64 * 1024 * 1024  # 64 MiB
+
+# Rough size of a command object itself, not counting the arrays it holds
+COMMAND_OVERHEAD = 256
+
+Values = Union[int, np.ndarray]
+
+
+class NoteEditor(Protocol):
+    """An object holding notes that can be edited by their ids."""
+
+    def addNotes(self, notes: NoteStore, ids: np.ndarray) -> None:
+        ...
+
+    def removeNotes(self, ids: np.ndarray) -> None:
+        ...
+
+    def moveNotes(self, ids: np.ndarray, ticks: Values, layers: Values) -> None:
+        ...
+
+    def setNoteValues(self, ids: np.ndarray, name: str, values: Values) -> None:
+        ...
+
+
+class LayerEditor(Protocol):
+    """An object holding layers that can be edited by their index."""
+
+    def addLayer(self, index: int, layer: Layer) -> None:
+        ...
+
+    def removeLayer(self, index: int) -> None:
+        ...
+
+    def swapLayers(self, id1: int, id2: int) -> None:
+        ...
+
+
+def _nbytes(values: Values) -> int:
+    return values.nbytes if isinstance(values, np.ndarray) else 0
+
+
+class Command:
+    """An edit that has already been applied, and can be reverted and re-applied."""
+
+    description = ""
+
+    def undo(self) -> None:
+        raise NotImplementedError
+
+    def redo(self) -> None:
+        raise NotImplementedError
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate number of bytes held by this command."""
+        return COMMAND_OVERHEAD
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} ({self.nbytes} bytes)>"
+
+
+class CommandGroup(Command):
+    """A sequence of commands that are undone and redone as a single step."""
+
+    def __init__(self, description: str = "", commands: Optional[List[Command]] = None):
+        self.description = description
+        self.commands: List[Command] = commands or []
+
+    def append(self, command: Command) -> None:
+        self.commands.append(command)
+
+    def undo(self) -> None:
+        for command in reversed(self.commands):
+            command.undo()
+
+    def redo(self) -> None:
+        for command in self.commands:
+            command.redo()
+
+    @property
+    def nbytes(self) -> int:
+        return COMMAND_OVERHEAD + sum(command.nbytes for command in self.commands)
+
+
+########## Note commands ##########
+
+
+class AddNotesCommand(Command):
+    description = "Add notes"
+
+    def __init__(self, editor: NoteEditor, ids: np.ndarray, notes: NoteStore):
+        self.editor = editor
+        self.ids = ids
+        self.notes = notes
+
+    def undo(self) -> None:
+        self.editor.removeNotes(self.ids)
+
+    def redo(self) -> None:
+        self.editor.addNotes(self.notes, self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        return COMMAND_OVERHEAD + self.ids.nbytes + self.notes.nbytes
+
+
+class RemoveNotesCommand(AddNotesCommand):
+    description = "Remove notes"
+
+    def undo(self) -> None:
+        super().redo()
+
+    def redo(self) -> None:
+        super().undo()
+
+
+class MoveNotesCommand(Command):
+    """
+    Move notes by an offset, in ticks and layers. Offsets may be given as a single
+    value for all notes or as one value per note.
+    """
+
+    description = "Move notes"
+
+    def __init__(
+        self, editor: NoteEditor, ids: np.ndarray, ticks: Values, layers: Values
+    ):
+        self.editor = editor
+        self.ids = ids
+        self.ticks = ticks
+        self.layers = layers
+
+    def undo(self) -> None:
+        self.editor.moveNotes(self.ids, -self.ticks, -self.layers)
+
+    def redo(self) -> None:
+        self.editor.moveNotes(self.ids, self.ticks, self.layers)
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            COMMAND_OVERHEAD
+            + self.ids.nbytes
+            + _nbytes(self.ticks)
+            + _nbytes(self.layers)
+        )
+
+
+class ChangeNotesCommand(Command):
+    """
+    Change the attribute `name` of some notes (e.g. their key, when transposing, or
+    their instrument). `new` may be a single value for all notes.
+    """
+
+    description = "Change notes"
+
+    def __init__(
+        self,
+        editor: NoteEditor,
+        ids: np.ndarray,
+        name: str,
+        old: np.ndarray,
+        new: Values,
+    ):
+        self.editor = editor
+        self.ids = ids
+        self.name = name
+        self.old = old
+        self.new = new
+
+    def undo(self) -> None:
+        self.editor.setNoteValues(self.ids, self.name, self.old)
+
+    def redo(self) -> None:
+        self.editor.setNoteValues(self.ids, self.name, self.new)
+
+    @property
+    def nbytes(self) -> int:
+        return COMMAND_OVERHEAD + self.ids.nbytes + self.old.nbytes + _nbytes(self.new)
+
+
+########## Layer commands ##########
+
+
+class InsertLayerCommand(Command):
+    description = "Insert layer"
+
+    def __init__(self, editor: LayerEditor, index: int, layer: Layer):
+        self.editor = editor
+        self.index = index
+        self.layer = layer
+
+    def undo(self) -> None:
+        self.editor.removeLayer(self.index)
+
+    def redo(self) -> None:
+        self.editor.addLayer(self.index, self.layer)
+
+    @property
+    def nbytes(self) -> int:
+        return COMMAND_OVERHEAD + len(self.layer.name)
+
+
+class RemoveLayerCommand(InsertLayerCommand):
+    description = "Remove layer"
+
+    def undo(self) -> None:
+        super().redo()
+
+    def redo(self) -> None:
+        super().undo()
+
+
+class SwapLayersCommand(Command):
+    description = "Swap layers"
+
+    def __init__(self, editor: LayerEditor, id1: int, id2: int):
+        self.editor = editor
+        self.id1 = id1
+        self.id2 = id2
+
+    def undo(self) -> None:
+        self.editor.swapLayers(self.id1, self.id2)
+
+    def redo(self) -> None:
+        self.editor.swapLayers(self.id1, self.id2)
+
+
+########## History ##########
+
+
+class History:
+    """
+    A bounded log of commands that can be undone and redone.
+
+    Commands are recorded with `push()` after they've been applied. Pushes made while
+    a command is being undone or redone are ignored, so editors can record their
+    changes unconditionally. The commands held by the history are evicted, oldest
+    first, to keep its size under `memory_limit` bytes.
+    """
+
+    def __init__(
+        self,
+        memory_limit: int = DEFAULT_MEMORY_LIMIT,
+        on_change: Optional[Callable[[], None]] = None,
+    ) -> None:
+        self._undo_stack: Deque[Command] = deque()
+        self._redo_stack: Deque[Command] = deque()
+        self._memory_limit = memory_limit
+        self._memory_usage = 0
+        self._group: Optional[CommandGroup] = None
+        self.replaying = False
+        self.on_change = on_change
+
+    @property
+    def memory_limit(self) -> int:
+        return self._memory_limit
+
+    @memory_limit.setter
+    def memory_limit(self, limit: int) -> None:
+        self._memory_limit = limit
+        self._trim()
+        self._notify()
+
+    @property
+    def memory_usage(self) -> int:
+        """Approximate number of bytes held by the commands in the history."""
+        return self._memory_usage
+
+    @property
+    def can_undo(self) -> bool:
+        return len(self._undo_stack) > 0
+
+    @property
+    def can_redo(self) -> bool:
+        return len(self._redo_stack) > 0
+
+    @property
+    def undo_description(self) -> str:
+        return self._undo_stack[-1].description if self._undo_stack else ""
+
+    @property
+    def redo_description(self) -> str:
+        return self._redo_stack[-1].description if self._redo_stack else ""
+
+    def __len__(self) -> int:
+        return len(self._undo_stack) + len(self._redo_stack)
+
+    def push(self, command: Command) -> None:
+        """Record a command that has just been applied."""
+        if self.replaying:
+            return
+        if self._group is not None:
+            self._group.append(command)
+            return
+        while self._redo_stack:
+            self._memory_usage -= self._redo_stack.pop().nbytes
+        self._undo_stack.append(command)
+        self._memory_usage += command.nbytes
+        self._trim()
+        self._notify()
+
+    @contextmanager
+    def group(self, description: str = "") -> Iterator[None]:
+        """
+        Record all commands pushed inside this context as a single step. Nested
+        groups are merged into the outermost one.
+        """
+        if self._group is not None or self.replaying:
+            yield
+            return
+        self._group = CommandGroup(description)
+        try:
+            yield
+        finally:
+            group, self._group = self._group, None
+            if len(group.commands) == 1:
+                self.push(group.commands[0])
+            elif group.commands:
+                self.push(group)
+
+    def undo(self) -> None:
+        if not self._undo_stack:
+            return
+        command = self._undo_stack.pop()
+        self._replay(command.undo)
+        self._redo_stack.append(command)
+        self._notify()
+
+    def redo(self) -> None:
+        if not self._redo_stack:
+            return
+        command = self._redo_stack.pop()
+        self._replay(command.redo)
+        self._undo_stack.append(command)
+        self._notify()
+
+    def clear(self) -> None:
+        self._undo_stack.clear()
+        self._redo_stack.clear()
+        self._memory_usage = 0
+        self._notify()
+
+    def _replay(self, function: Callable[[], None]) -> None:
+        self.replaying = True
+        try:
+            function()
+        finally:
+            self.replaying = False
+
+    def _trim(self) -> None:
+        """Evict the oldest commands until the history fits in its memory limit."""
+        while self._memory_usage > self._memory_limit and self._undo_stack:
+            self._memory_usage -= self._undo_stack.popleft().nbytes
+        while self._memory_usage > self._memory_limit and self._redo_stack:
+            self._memory_usage -= self._redo_stack.popleft().nbytes
+
+    def _notify(self) -> None:
+        if self.on_change is not None:
+            self.on_change()
@@ -0,0 +1,180 @@
+"""
+Spatial indices used to look up the notes in a song by their position,
+without scanning every note.
+"""
+
+from bisect import bisect_left, bisect_right
+from typing import Dict, Generic, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+Cell = Tuple[int, int]
+
+
+class GridIndex(Generic[T]):
+    """
+    Maps (tick, layer) cells to the items that occupy them, answering
+    "what is at this cell" in constant time.
+
+    A cell normally holds a single item, but more than one is allowed so that a
+    floating selection can be moved over other notes before being placed.
+    """
+
+    def __init__(self) -> None:
+        self._cells: Dict[Cell, List[T]] = {}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, cell: Cell) -> bool:
+        return cell in self._cells
+
+    def __iter__(self) -> Iterator[Cell]:
+        return iter(self._cells)
+
+    def add(self, tick: int, layer: int, item: T) -> None:
+        """Add `item` to the cell at (`tick`, `layer`)."""
+        items = self._cells.get((tick, layer))
+        if items is None:
+            self._cells[(tick, layer)] = [item]
+        else:
+            items.append(item)
+        self._count += 1
+
+    def remove(self, tick: int, layer: int, item: T) -> None:
+        """
+        Remove `item` from the cell at (`tick`, `layer`). Raise `KeyError`
+        if the item isn't there.
+        """
+        items = self._cells.get((tick, layer))
+        if items is None or item not in items:
+            raise KeyError(f"Item not found at cell ({tick}, {layer})")
+        if len(items) == 1:
+            del self._cells[(tick, layer)]
+        else:
+            items.remove(item)
+        self._count -= 1
+
+    def move(
+        self, item: T, tick: int, layer: int, new_tick: int, new_layer: int
+    ) -> None:
+        """Move `item` from the cell at (`tick`, `layer`) to (`new_tick`, `new_layer`)."""
+        if (tick, layer) == (new_tick, new_layer):
+            return
+        self.remove(tick, layer, item)
+        self.add(new_tick, new_layer, item)
+
+    def at(self, tick: int, layer: int) -> Sequence[T]:
+        """Return the items in the cell at (`tick`, `layer`), if any."""
+        return self._cells.get((tick, layer), ())
+
+    def get(self, tick: int, layer: int) -> Optional[T]:
+        """Return the topmost (most recently added) item at (`tick`, `layer`), if any."""
+        items = self._cells.get((tick, layer))
+        return items[-1] if items else None
+
+    def is_occupied(self, tick: int, layer: int) -> bool:
+        return (tick, layer) in self._cells
+
+    def clear(self) -> None:
+        self._cells.clear()
+        self._count = 0
+
+
+class SortedIndex(Generic[T]):
+    """
+    Groups items by an integer key (e.g. their tick or layer), keeping the
+    occupied keys in a sorted array so that range, neighbor and min/max
+    queries take O(log n) time regardless of how many items are indexed.
+
+    The items at each key are kept in an insertion-ordered dict rather than a
+    list, so removing (or moving) an item takes constant time even when a key
+    holds many items, as a layer often does.
+    """
+
+    def __init__(self) -> None:
+        self._items: Dict[int, Dict[T, None]] = {}
+        self._keys: List[int] = []
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._items
+
+    def keys(self) -> Sequence[int]:
+        """Return the occupied keys, in ascending order."""
+        return self._keys
+
+    def add(self, key: int, item: T) -> None:
+        items = self._items.get(key)
+        if items is None:
+            self._items[key] = {item: None}
+            self._keys.insert(bisect_left(self._keys, key), key)
+        else:
+            items[item] = None
+        self._count += 1
+
+    def remove(self, key: int, item: T) -> None:
+        """Remove `item` from `key`. Raise `KeyError` if the item isn't there."""
+        items = self._items.get(key)
+        if items is None or item not in items:
+            raise KeyError(f"Item not found at key {key}")
+        if len(items) == 1:
+            del self._items[key]
+            del self._keys[bisect_left(self._keys, key)]
+        else:
+            del items[item]
+        self._count -= 1
+
+    def move(self, item: T, key: int, new_key: int) -> None:
+        if key == new_key:
+            return
+        self.remove(key, item)
+        self.add(new_key, item)
+
+    def at(self, key: int) -> Sequence[T]:
+        """Return the items at `key`, if any."""
+        items = self._items.get(key)
+        return list(items) if items else ()
+
+    def range(self, start: Optional[int] = None, stop: Optional[int] = None) -> List[T]:
+        """
+        Return the items whose key is in the interval [`start`, `stop`), in key
+        order. A bound of `None` leaves that side of the interval open.
+        """
+        items: List[T] = []
+        for key in self.keys_in(start, stop):
+            items.extend(self._items[key])
+        return items
+
+    def keys_in(
+        self, start: Optional[int] = None, stop: Optional[int] = None
+    ) -> Sequence[int]:
+        """Return the occupied keys in the interval [`start`, `stop`), in order."""
+        lo = 0 if start is None else bisect_left(self._keys, start)
+        hi = len(self._keys) if stop is None else bisect_left(self._keys, stop)
+        return self._keys[lo:hi]
+
+    def next_key(self, key: int) -> Optional[int]:
+        """Return the first occupied key greater than `key`, if any."""
+        i = bisect_right(self._keys, key)
+        return self._keys[i] if i < len(self._keys) else None
+
+    def previous_key(self, key: int) -> Optional[int]:
+        """Return the last occupied key smaller than `key`, if any."""
+        i = bisect_left(self._keys, key)
+        return self._keys[i - 1] if i > 0 else None
+
+    def first_key(self) -> Optional[int]:
+        return self._keys[0] if self._keys else None
+
+    def last_key(self) -> Optional[int]:
+        return self._keys[-1] if self._keys else None
+
+    def clear(self) -> None:
+        self._items.clear()
+        self._keys.clear()
+        self._count = 0
@@ -0,0 +1,301 @@
+"""
+A journal of the edits made to a song, to recover them if the application
+crashes before the song is saved.
+
+The journal is a file of records: a snapshot of the whole song, followed by the
+changes made to it since. Notes are identified by their IDs (see
+`NoteController`), and a change to the notes is recorded as the IDs of the
+notes that were removed and the current values of the notes that were added or
+modified, so recording an edit costs about as much as copying the notes it
+touched. Records are encoded and written to the file by a background thread.
+
+Once the changes recorded since the last snapshot grow past a threshold, a new
+snapshot is written to a new file, which then replaces the journal. Each record
+ends with a checksum, so a record that was only partly written when the
+application crashed is ignored, along with the ones after it, when the journal
+is replayed.
+"""
+
+import json
+import os
+import threading
+import zlib
+from collections import deque
+from struct import Struct
+from typing import Any, BinaryIO, Deque, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from nbs.core.data import NoteStore, Song, SongSnapshot
+from nbs.core.file import _song_from_metadata, _song_metadata
+from nbs.utils.file import PathLike, atomic_write
+
+# Size of the changes recorded after a snapshot before a new one is written
+DEFAULT_COMPACT_SIZE = 32 * 1024 * 1024
+# Seconds between writes of the recorded changes to the journal
+WRITE_INTERVAL = 0.5
+
+# Magic number and format version of a journal file
+JOURNAL_HEADER = Struct("<8sI")
+JOURNAL_MAGIC = b"NBSJRNL\0"
+JOURNAL_VERSION = 1
+# Kind of record, and sizes of its metadata and data; followed by its checksum
+RECORD_HEADER = Struct("<BII")
+RECORD_CHECKSUM = Struct("<I")
+
+# The whole song: its metadata, and the IDs and values of all notes
+SNAPSHOT = 0
+# The IDs of removed notes, and the IDs and values of added or modified notes
+NOTES = 1
+# Everything in the song but its notes
+SONG = 2
+# Not written: requests to the background thread
+FLUSH = -1
+CLOSE = -2
+
+ID_TYPE = np.dtype("<i8")
+
+Record = Tuple[Any, ...]
+
+
+def _pack_notes(ids: np.ndarray, notes: NoteStore) -> bytes:
+    columns = [np.asarray(ids, ID_TYPE)]
+    for name, dtype in NoteStore.COLUMNS.items():
+        columns.append(notes.column(name).astype(dtype.newbyteorder("<")))
+    return b"".join(column.tobytes() for column in columns)
+
+
+def _unpack_notes(
+    data: memoryview, offset: int, size: int
+) -> Tuple[np.ndarray, NoteStore, int]:
+    """Read `size` notes packed by `_pack_notes()` at `offset` in `data`."""
+    ids = np.frombuffer(data, ID_TYPE, size, offset).astype(np.int64)
+    offset += ids.nbytes
+    columns = {}
+    for name, dtype in NoteStore.COLUMNS.items():
+        column = np.frombuffer(data, dtype.newbyteorder("<"), size, offset)
+        columns[name] = column.astype(dtype)
+        offset += column.nbytes
+    return ids, NoteStore.from_columns(columns), offset
+
+
+def _encode_record(kind: int, metadata: Dict[str, Any], data: bytes = b"") -> bytes:
+    encoded = json.dumps(metadata).encode()
+    record = RECORD_HEADER.pack(kind, len(encoded), len(data)) + encoded + data
+    return record + RECORD_CHECKSUM.pack(zlib.crc32(record))
+
+
+def _read_records(data: memoryview) -> Iterator[Tuple[int, Any, memoryview]]:
+    """Yield the kind, metadata and data of each complete record in `data`."""
+    offset = JOURNAL_HEADER.size
+    while offset + RECORD_HEADER.size + RECORD_CHECKSUM.size <= len(data):
+        kind, length, size = RECORD_HEADER.unpack_from(data, offset)
+        end = offset + RECORD_HEADER.size + length + size
+        if end + RECORD_CHECKSUM.size > len(data):
+            return  # Truncated
+        (checksum,) = RECORD_CHECKSUM.unpack_from(data, end)
+        if zlib.crc32(data[offset:end]) != checksum:
+            return
+        start = offset + RECORD_HEADER.size
+        metadata = json.loads(bytes(data[start : start + length]))
+        yield kind, metadata, data[start + length : end]
+        offset = end + RECORD_CHECKSUM.size
+
+
+def read_journal(path: PathLike) -> Song:
+    """
+    Replay the journal at `path`, and return the song as it was when the last
+    complete record was written. Notes are sorted by the IDs they had.
+    """
+    with open(path, "rb") as f:
+        data = memoryview(f.read())
+    if len(data) < JOURNAL_HEADER.size:
+        raise ValueError("Invalid journal: file is too short")
+    magic, version = JOURNAL_HEADER.unpack_from(data)
+    if magic != JOURNAL_MAGIC or version != JOURNAL_VERSION:
+        raise ValueError("Invalid journal: unknown format")
+
+    song: Optional[Song] = None
+    # The IDs touched by each change, in order, and the values of the notes that
+    # were added or modified (removed notes have no values)
+    changedIds: List[np.ndarray] = []
+    changedRows: List[np.ndarray] = []
+    changed = NoteStore()
+    for kind, metadata, body in _read_records(data):
+        if kind == SNAPSHOT:
+            ids, notes, _ = _unpack_notes(body, 0, metadata["size"])
+            song = _song_from_metadata(metadata, notes)
+            changedIds, changedRows, changed = [], [], NoteStore()
+        elif song is None:
+            break  # Changes without a snapshot to apply them to
+        elif kind == NOTES:
+            removed = np.frombuffer(body, ID_TYPE, metadata["removed"])
+            noteIds, noteValues, _ = _unpack_notes(
+                body, removed.nbytes, metadata["changed"]
+            )
+            rows = changed.extend(noteValues)
+            changedIds += [removed.astype(np.int64), noteIds]
+            changedRows += [np.full(len(removed), -1), np.arange(rows.start, rows.stop)]
+        elif kind == SONG:
+            song = _song_from_metadata(metadata, song.notes)
+    if song is None:
+        raise ValueError("Invalid journal: no snapshot")
+
+    # Apply all changes at once: each touched note takes the values of the last
+    # change made to it, or is removed
+    touched = np.concatenate([np.zeros(0, np.int64), *changedIds])
+    rows = np.concatenate([np.zeros(0, np.int64), *changedRows])
+    unique, last = np.unique(touched[::-1], return_index=True)
+    rows = rows[::-1][last]
+    kept = np.flatnonzero(~np.isin(ids, unique))
+    notes = song.notes[kept]
+    notes.extend(changed[rows[rows >= 0]])
+    ids = np.concatenate((ids[kept], unique[rows >= 0]))
+    song.notes = notes[np.argsort(ids, kind="stable")]
+    return song
+
+
+class Journal:
+    """
+    A journal of the edits made to a song, written to `path` by a background
+    thread.
+
+    `snapshot()` starts a new journal with the whole song, and the `record_*()`
+    methods append changes to it. They only queue the record to be written, so
+    they return immediately; queued records are written every `WRITE_INTERVAL`
+    seconds. Once `needs_snapshot` is set, the changes since the
+    last snapshot have grown past `compact_size` bytes, and a new snapshot should
+    be taken to replace them.
+    """
+
+    def __init__(self, path: PathLike, compact_size: int = DEFAULT_COMPACT_SIZE):
+        self.path = os.fsdecode(path)
+        self.compact_size = compact_size
+        # Approximate size of the changes recorded since the last snapshot
+        self.size = 0
+        # The error raised by the last failed write, until a snapshot is written
+        # again. Changes recorded in between are dropped, as the journal would
+        # miss the ones that failed
+        self.error: Optional[Exception] = None
+        # Records waiting to be written. The background thread takes them in
+        # batches, so recording a change doesn't have to wake it up
+        self._pending: Deque[Record] = deque()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def needs_snapshot(self) -> bool:
+        return self.size >= self.compact_size
+
+    def snapshot(self, song: Union[Song, SongSnapshot], ids: np.ndarray) -> None:
+        """
+        Replace the journal with the whole `song`, whose notes have IDs `ids`. The
+        song must not be modified afterwards, so it should be a snapshot.
+        """
+        self.size = 0
+        self._put((SNAPSHOT, song, ids))
+
+    def record_notes(
+        self, removed: np.ndarray, ids: np.ndarray, notes: NoteStore
+    ) -> None:
+        """
+        Record that the notes with IDs `removed` were removed, and that the notes
+        with IDs `ids` were added, or modified, and are now `notes`.
+        """
+        self.size += removed.nbytes + ids.nbytes + notes.nbytes
+        self._put((NOTES, removed, ids, notes))
+
+    def record_song(self, song: Union[Song, SongSnapshot]) -> None:
+        """Record the header, layers and instruments of `song`, but not its notes."""
+        self._put((SONG, song))
+
+    def flush(self) -> None:
+        """Block until all the records recorded so far are written."""
+        if self._thread is not None:
+            written = threading.Event()
+            self._pending.append((FLUSH, written))
+            self._wake.set()
+            written.wait()
+
+    def close(self, discard: bool = False) -> None:
+        """
+        Write the pending records, and stop the background thread. If `discard` is
+        set, the journal is deleted, as there's nothing left to recover.
+        """
+        if self._thread is not None:
+            self._pending.append((CLOSE,))
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        if discard:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def _put(self, record: Record) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="Journal", daemon=True
+            )
+            self._thread.start()
+        self._pending.append(record)
+
+    ########## Background thread ##########
+
+    def _run(self) -> None:
+        file: Optional[BinaryIO] = None
+        running = True
+        while running:
+            self._wake.wait(WRITE_INTERVAL)
+            self._wake.clear()
+            # Write all pending records before syncing the file once
+            records = []
+            while self._pending:
+                records.append(self._pending.popleft())
+            try:
+                for record in records:
+                    if record[0] == SNAPSHOT:
+                        if file is not None:
+                            file.close()
+                        file = self._write_snapshot(record[1], record[2])
+                        self.error = None
+                    elif record[0] in (NOTES, SONG) and file is not None:
+                        file.write(self._encode(record))
+                if file is not None:
+                    file.flush()
+                    os.fsync(file.fileno())
+            except Exception as e:
+                self.error = e
+                if file is not None:
+                    try:
+                        file.close()
+                    except OSError:
+                        pass
+                    file = None
+            for record in records:
+                if record[0] == FLUSH:
+                    record[1].set()
+                elif record[0] == CLOSE:
+                    running = False
+        if file is not None:
+            file.close()
+
+    def _write_snapshot(
+        self, song: Union[Song, SongSnapshot], ids: np.ndarray
+    ) -> BinaryIO:
+        """Replace the journal with `song`, and open it to append records."""
+        metadata = {**_song_metadata(song), "size": len(ids)}
+        with atomic_write(self.path) as f:
+            f.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION))
+            f.write(_encode_record(SNAPSHOT, metadata, _pack_notes(ids, song.notes)))
+        return open(self.path, "ab")
+
+    @staticmethod
+    def _encode(record: Record) -> bytes:
+        if record[0] == NOTES:
+            _, removed, ids, notes = record
+            metadata = {"removed": len(removed), "changed": len(ids)}
+            data = np.asarray(removed, ID_TYPE).tobytes() + _pack_notes(ids, notes)
+            return _encode_record(NOTES, metadata, data)
+        return _encode_record(SONG, _song_metadata(record[1]))
@@ -0,0 +1,360 @@
+"""
+A software mixer, which plays any number of sounds at once, each with its own
+pitch, gain and panning, and sums them into a single stream of audio.
+
+Voices are kept in arrays, one element per voice, rather than as objects, and
+are mixed in blocks of frames. Each voice plays an entry of a `ResampleCache`:
+its sound, resampled once to the pitch it's played at. For each block, the
+samples of all voices are gathered at once from the cache's bank, and panned
+and summed with a single matrix product, without a loop over the voices. Sounds
+are mixed down to mono when they're added, as every voice is panned anyway.
+The mixed blocks are written to a `RingBuffer`, from which the audio output
+reads them.
+
+This module doesn't depend on Qt or OpenAL, so it can be tested without an
+audio device.
+"""
+
+import heapq
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from nbs.core.resample import (
+    DEFAULT_CACHE_SIZE,
+    PitchKey,
+    ResampleCache,
+    key_to_pitch,
+    pitch_key,
+    resample,
+)
+
+DEFAULT_SAMPLE_RATE = 44100
+CHANNELS = 2
+# Number of frames mixed at a time
+BLOCK_SIZE = 512
+# Number of voices played at most. Past it, the voice that would end first is
+# stopped to play a new one
+MAX_VOICES = 8192
+# Voices are mixed in groups of this many, to bound the size of the arrays used
+# while mixing a block
+VOICE_BATCH_SIZE = 128
+
+
+class RingBuffer:
+    """A fixed-size queue of audio frames."""
+
+    def __init__(self, capacity: int, channels: int = CHANNELS) -> None:
+        self.data = np.zeros((capacity, channels), np.int16)
+        self.start = 0
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def capacity(self) -> int:
+        return len(self.data)
+
+    @property
+    def free(self) -> int:
+        return self.capacity - self.size
+
+    def write(self, frames: np.ndarray) -> int:
+        """Append as many of `frames` as fit, and return how many were written."""
+        count = min(len(frames), self.free)
+        end = (self.start + self.size) % self.capacity
+        first = min(count, self.capacity - end)
+        self.data[end : end + first] = frames[:first]
+        self.data[: count - first] = frames[first:count]
+        self.size += count
+        return count
+
+    def read(self, count: int) -> np.ndarray:
+        """Remove and return up to `count` frames from the start of the buffer."""
+        count = min(count, self.size)
+        indices = (self.start + np.arange(count)) % self.capacity
+        frames = self.data[indices]
+        self.start = (self.start + count) % self.capacity
+        self.size -= count
+        return frames
+
+    def clear(self) -> None:
+        self.start = 0
+        self.size = 0
+
+
+def to_mono(samples: np.ndarray) -> np.ndarray:
+    """Mix (frames, channels) samples down to mono floats."""
+    samples = np.asarray(samples, np.float32)
+    if samples.ndim == 2:
+        samples = samples.mean(axis=1, dtype=np.float32)
+    return samples
+
+
+@dataclass
+class VoiceStats:
+    # Voices stopped early to play new ones, voices that reached their end, and
+    # the most voices played at once
+    steals: int = 0
+    expiries: int = 0
+    peak_voices: int = 0
+
+
+class Mixer:
+    """
+    Mixes voices playing the sounds in `sounds` into a stream of stereo 16-bit
+    frames at `sample_rate`.
+
+    `play()` starts a voice; `fill()` mixes blocks of frames into `buffer` until
+    it holds enough frames, which are then taken with `buffer.read()`. Voices are
+    removed once they reach the end of their sound: the clock at which each one
+    ends is kept in a heap, so only the voices that ended are looked at.
+
+    A voice whose pitch isn't in the cache yet has its sound resampled when it
+    starts. `warm_up()` resamples the pitches a song will play in a background
+    thread beforehand. Replacing a sound only discards what was resampled from
+    it, while removing one discards the whole warm-up, as later sounds move.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = DEFAULT_SAMPLE_RATE,
+        max_voices: int = MAX_VOICES,
+        buffer_size: int = DEFAULT_SAMPLE_RATE // 2,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+    ) -> None:
+        self.sample_rate = sample_rate
+        self.max_voices = max_voices
+        self.buffer = RingBuffer(buffer_size)
+        self.cache = ResampleCache(cache_size)
+
+        # Samples of each sound, mixed down to mono, and their sample rates
+        self.sounds: List[Optional[np.ndarray]] = []
+        self.sound_rates: List[int] = []
+        # Incremented when a sound is replaced, to discard what the warm-up
+        # thread resampled from the old one
+        self._versions: List[int] = []
+        # Incremented when sounds are removed or a new warm-up starts, to stop
+        # the warm-up thread and discard what it resampled
+        self._generation = 0
+        self._warmed: Deque[Tuple[int, int, PitchKey, np.ndarray]] = deque()
+
+        # Frames mixed so far
+        self.clock = 0
+        self.stats = VoiceStats()
+        # Each voice has a slot in the voice arrays, which it keeps while it
+        # plays. The slots of the playing voices are the first `voice_count`
+        # items of `_slots`, in no particular order; `_where` is the inverse
+        self.voice_count = 0
+        self._slots = np.arange(max_voices)
+        self._where = np.arange(max_voices)
+        self._sound = np.zeros(max_voices, np.int64)
+        self._entry = np.zeros(max_voices, np.int64)
+        self._start = np.zeros(max_voices, np.int64)
+        self._gains = np.zeros((max_voices, CHANNELS), np.float32)
+        # Incremented when a voice stops, to tell which items of `_ends` are
+        # still valid
+        self._serial = [0] * max_voices
+        # Heap of the clock at which each voice ends, with its slot and serial
+        self._ends: List[Tuple[int, int, int]] = []
+
+    ########## Sounds ##########
+
+    def add_sound(self, samples: Optional[np.ndarray], sample_rate: int) -> int:
+        """
+        Add a sound, given as an array of (frames, channels) samples, and return
+        its index. A sound of `None` (e.g. one that failed to load) plays nothing.
+        """
+        self.set_sound(len(self.sounds), samples, sample_rate)
+        return len(self.sounds) - 1
+
+    def set_sound(
+        self, index: int, samples: Optional[np.ndarray], sample_rate: int
+    ) -> None:
+        """
+        Replace the sound at `index`, adding empty sounds before it if needed.
+        Voices already playing the old sound play it to the end.
+        """
+        while len(self.sounds) <= index:
+            self.sounds.append(None)
+            self.sound_rates.append(self.sample_rate)
+            self._versions.append(0)
+        self.sounds[index] = None if samples is None else to_mono(samples)
+        self.sound_rates[index] = sample_rate
+        self._versions[index] += 1
+        self.cache.remove_sound(index, shift=False)
+
+    def remove_sound(self, index: int) -> None:
+        """Remove a sound, and stop its voices. Later sounds move down one index."""
+        del self.sounds[index]
+        del self.sound_rates[index]
+        del self._versions[index]
+        self._generation += 1
+        self.cache.remove_sound(index)
+        slots = self._slots[: self.voice_count]
+        for slot in slots[self._sound[slots] == index].tolist():
+            self._remove_voice(slot)
+        self._sound -= self._sound > index
+
+    def resample(self, sound: int, key: float) -> np.ndarray:
+        """Return `sound` resampled to be played `key` semitones above its pitch."""
+        samples = self.sounds[sound]
+        step = key_to_pitch(key) * self.sound_rates[sound] / self.sample_rate
+        return resample(samples, step)
+
+    def warm_up(self, pitches: Sequence[Tuple[int, float]]) -> threading.Thread:
+        """
+        Resample the sounds for the given (sound, key) pairs in a background
+        thread, in order, until the cache is full. The resampled sounds are
+        added to the cache on the next call to `play()` or `mix()`. Return the
+        thread.
+        """
+        # Stops the previous warm-up, if it's still running
+        self._generation += 1
+        # Read the sounds here, as they may change while the thread runs
+        sounds = list(self.sounds)
+        rates = list(self.sound_rates)
+        versions = list(self._versions)
+        generation = self._generation
+        pitches = [
+            (sound, key)
+            for sound, key in pitches
+            if 0 <= sound < len(sounds)
+            and sounds[sound] is not None
+            and pitch_key(sound, key) not in self.cache
+        ]
+
+        def run() -> None:
+            size = self.cache.stats.size
+            for sound, key in pitches:
+                if generation != self._generation:
+                    return
+                step = key_to_pitch(key) * rates[sound] / self.sample_rate
+                samples = resample(sounds[sound], step)
+                size += samples.nbytes
+                if size > self.cache.max_size:
+                    break
+                self._warmed.append(
+                    (generation, versions[sound], pitch_key(sound, key), samples)
+                )
+
+        thread = threading.Thread(target=run, name="Warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def _add_warmed(self) -> None:
+        while self._warmed:
+            generation, version, key, samples = self._warmed.popleft()
+            if (
+                generation == self._generation
+                and version == self._versions[key[0]]
+                and key not in self.cache
+            ):
+                self.cache.add(key, samples, self._entries_in_use())
+
+    def _entries_in_use(self) -> np.ndarray:
+        return self._entry[self._slots[: self.voice_count]]
+
+    ########## Voices ##########
+
+    def play(self, sound: int, volume: float, key: float, pan: float) -> None:
+        """
+        Start playing a sound, at a `volume` from 0 to 1, `key` semitones above
+        its pitch, and panned from -1 (left) to 1 (right).
+        """
+        if not 0 <= sound < len(self.sounds) or self.sounds[sound] is None:
+            return
+        self._add_warmed()
+        cache_key = pitch_key(sound, key)
+        entry = self.cache.get(cache_key)
+        if entry < 0:
+            samples = self.resample(sound, key)
+            entry = self.cache.add(cache_key, samples, self._entries_in_use())
+        if self.voice_count == self.max_voices:
+            self._steal_voice()
+        # Constant power panning
+        angle = (min(max(pan, -1.0), 1.0) + 1) * np.pi / 4
+        slot = int(self._slots[self.voice_count])
+        self._sound[slot] = sound
+        self._entry[slot] = entry
+        self._start[slot] = self.clock
+        self._gains[slot] = (volume * np.cos(angle), volume * np.sin(angle))
+        end = self.clock + int(self.cache.lengths[entry])
+        heapq.heappush(self._ends, (end, slot, self._serial[slot]))
+        self.voice_count += 1
+        self.stats.peak_voices = max(self.stats.peak_voices, self.voice_count)
+
+    def stop_all(self) -> None:
+        for slot in self._slots[: self.voice_count].tolist():
+            self._serial[slot] += 1
+        self.voice_count = 0
+        self._ends.clear()
+
+    def _steal_voice(self) -> None:
+        """Stop the voice that would end first to make room for a new one."""
+        while not self._pop_voice():
+            pass
+        self.stats.steals += 1
+
+    def _expire_voices(self) -> None:
+        """Remove the voices that reached the end of their sound."""
+        while self._ends and self._ends[0][0] <= self.clock:
+            if self._pop_voice():
+                self.stats.expiries += 1
+
+    def _pop_voice(self) -> bool:
+        """
+        Remove the voice at the top of the `_ends` heap. Return False if it had
+        already been removed.
+        """
+        _, slot, serial = heapq.heappop(self._ends)
+        if serial != self._serial[slot]:
+            return False
+        self._remove_voice(slot)
+        return True
+
+    def _remove_voice(self, slot: int) -> None:
+        # Move the last playing voice to the place of the removed one
+        index = self._where[slot]
+        last = self._slots[self.voice_count - 1]
+        self._slots[index] = last
+        self._where[last] = index
+        self._slots[self.voice_count - 1] = slot
+        self._where[slot] = self.voice_count - 1
+        self._serial[slot] += 1
+        self.voice_count -= 1
+
+    ########## Mixing ##########
+
+    def mix(self, frames: int = BLOCK_SIZE) -> np.ndarray:
+        """Mix the next `frames` frames of all voices, as floats."""
+        self._add_warmed()
+        cache = self.cache
+        output = np.zeros((CHANNELS, frames), np.float32)
+        offsets = np.arange(frames)
+        for start in range(0, self.voice_count, VOICE_BATCH_SIZE):
+            slots = self._slots[start : min(start + VOICE_BATCH_SIZE, self.voice_count)]
+            entry = self._entry[slots]
+            # Past the end of an entry, its padding is read, which is silent
+            position = self.clock - self._start[slots]
+            index = np.minimum(
+                position[:, None] + offsets, cache.lengths[entry][:, None]
+            )
+            index += cache.offsets[entry][:, None]
+            # Sum the voices, with their gain in each channel
+            output += self._gains[slots].T @ cache.bank[index]
+
+        self.clock += frames
+        self._expire_voices()
+        return output.T
+
+    def fill(self, frames: int) -> None:
+        """Mix blocks into `buffer` until it holds at least `frames` frames."""
+        frames = min(frames, self.buffer.capacity)
+        while len(self.buffer) < frames and self.buffer.free >= BLOCK_SIZE:
+            block = self.mix(BLOCK_SIZE)
+            self.buffer.write(np.clip(block, -32768, 32767).astype(np.int16))
@@ -0,0 +1,76 @@
+"""
+A queue of notes to play, from the thread that triggers them (usually the GUI
+thread) to the audio thread.
+
+The queue is a fixed-size ring of compact records, and is lock-free: only the
+producer moves its tail, and only the consumer moves its head, so neither ever
+waits for the other. A record is written before the tail is moved past it, so
+the consumer never sees a record that's only partly written (Python's global
+interpreter lock orders the writes). If the consumer falls behind and the ring
+fills up, new notes are dropped rather than blocking the producer.
+"""
+
+import numpy as np
+
+# A note to play: the sound, its key relative to the pitch of the sound, its
+# volume from 0 to 1, and its panning from -1 (left) to 1 (right)
+NOTE_RECORD = np.dtype(
+    [
+        ("sound", np.int32),
+        ("key", np.float32),
+        ("volume", np.float32),
+        ("panning", np.float32),
+    ]
+)
+
+DEFAULT_CAPACITY = 16384
+
+
+class NoteQueue:
+    """
+    A ring of up to `capacity` notes. It must have a single producer, which calls
+    `push()`, and a single consumer, which calls `pop()`.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY) -> None:
+        self.records = np.zeros(capacity, NOTE_RECORD)
+        # Number of notes dropped because the queue was full
+        self.dropped = 0
+        # Number of records ever read and written
+        self._head = 0
+        self._tail = 0
+
+    def __len__(self) -> int:
+        return self._tail - self._head
+
+    @property
+    def capacity(self) -> int:
+        return len(self.records)
+
+    def push(self, records: np.ndarray) -> int:
+        """Append as many of `records` as fit, and return how many were added."""
+        count = min(len(records), self.capacity - (self._tail - self._head))
+        start = self._tail % self.capacity
+        first = min(count, self.capacity - start)
+        self.records[start : start + first] = records[:first]
+        self.records[: count - first] = records[first:count]
+        self.dropped += len(records) - count
+        self._tail += count
+        return count
+
+    def push_note(self, sound: int, key: float, volume: float, panning: float) -> bool:
+        """Append a single note, and return whether it fit."""
+        if self._tail - self._head == self.capacity:
+            self.dropped += 1
+            return False
+        self.records[self._tail % self.capacity] = (sound, key, volume, panning)
+        self._tail += 1
+        return True
+
+    def pop(self) -> np.ndarray:
+        """Remove and return all the records in the queue."""
+        count = self._tail - self._head
+        indices = (self._head + np.arange(count)) % self.capacity
+        records = self.records[indices]
+        self._head += count
+        return records
@@ -0,0 +1,200 @@
+"""
+A cache of sounds resampled to the pitches they're played at.
+
+Songs play a small set of (instrument, key) pairs over and over, so each sound
+is resampled once per pitch it's played at, and the mixer then plays the
+resampled samples as they are. Entries are keyed by sound, key and fine pitch
+(in cents), and stored one after the other in a single array, so that the mixer
+can read the samples of all its voices at once.
+
+The least recently used entries are evicted when the cache grows past its size
+limit, except those still being played, which are kept until they end.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Collection, List, Tuple
+
+import numpy as np
+
+from nbs.core.data import NoteStore
+
+DEFAULT_CACHE_SIZE = 64 * 1024 * 1024
+# Zero frames after each entry, so that voices that reached the end of their
+# entry read silence
+ENTRY_PADDING = 1
+# Key of the notes played at the pitch of the sound itself
+BASE_KEY = 45
+
+# Sound, key and fine pitch in cents
+PitchKey = Tuple[int, int, int]
+
+
+def key_to_pitch(key: float) -> float:
+    return 2 ** (key / 12)
+
+
+def pitch_key(sound: int, key: float) -> PitchKey:
+    """Return the cache key of `sound` played `key` semitones above its pitch."""
+    cents = round(key * 100)
+    return sound, cents // 100, cents % 100
+
+
+def resample(samples: np.ndarray, step: float) -> np.ndarray:
+    """Resample `samples` by linear interpolation, reading them `step` at a time."""
+    length = int(np.ceil(len(samples) / step))
+    positions = np.arange(length) * step
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def note_pitches(notes: NoteStore) -> List[Tuple[int, float]]:
+    """
+    Return the (instrument, key) pairs played by `notes`, with keys relative to
+    `BASE_KEY`, from the most to the least played.
+    """
+    cents = (notes.key.astype(np.int64) - BASE_KEY) * 100 + notes.pitch
+    pairs = notes.instrument.astype(np.int64) << 32 | (cents + (1 << 31))
+    unique, counts = np.unique(pairs, return_counts=True)
+    unique = unique[np.argsort(-counts, kind="stable")]
+    return [
+        (int(pair >> 32), int((pair & 0xFFFFFFFF) - (1 << 31)) / 100) for pair in unique
+    ]
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    size: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ResampleCache:
+    """
+    Resampled sounds, of up to `max_size` bytes.
+
+    Each entry has an ID, which stays the same for as long as it's in the cache;
+    its samples are at `bank[offsets[id] : offsets[id] + lengths[id]]`, and are
+    followed by silence. Entries are only moved by `add()`, which may need to
+    make room for the new entry, so the offsets must be looked up again after it.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE) -> None:
+        self.max_size = max_size
+        self.bank = np.zeros(1 << 16, np.float32)
+        self.offsets = np.zeros(16, np.int64)
+        self.lengths = np.zeros(16, np.int64)
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[PitchKey, int]" = OrderedDict()
+        # IDs that aren't used by any entry, and the end of the used part of the bank
+        self._free_ids = list(range(15, -1, -1))
+        self._end = 0
+
+    def __contains__(self, key: PitchKey) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: PitchKey) -> int:
+        """Return the ID of the entry for `key`, or -1 if there's none."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return -1
+        self.stats.hits += 1
+        self._entries.move_to_end(key)
+        return entry
+
+    def add(self, key: PitchKey, samples: np.ndarray, in_use: Collection[int]) -> int:
+        """
+        Add the resampled `samples` for `key`, and return the ID of the entry.
+        Entries whose IDs are in `in_use` aren't evicted to make room for it.
+        """
+        size = len(samples) + ENTRY_PADDING
+        if self._end + size > len(self.bank):
+            self._evict(size * self.bank.itemsize, in_use)
+            self._compact(in_use)
+            if self._end + size > len(self.bank):
+                self._grow_bank(self._end + size)
+        if not self._free_ids:
+            self._grow_ids()
+
+        entry = self._free_ids.pop()
+        self.bank[self._end : self._end + len(samples)] = samples
+        self.bank[self._end + len(samples) : self._end + size] = 0
+        self.offsets[entry] = self._end
+        self.lengths[entry] = len(samples)
+        self._end += size
+        self._entries[key] = entry
+        self.stats.entries = len(self._entries)
+        self.stats.size += size * self.bank.itemsize
+        return entry
+
+    def remove_sound(self, sound: int, shift: bool = True) -> None:
+        """
+        Remove the entries of `sound`, and, if `shift` is set, move the entries
+        of later sounds down one index, as `Mixer.remove_sound()` does. The
+        removed entries stay in the bank until it's compacted, as they may still
+        be playing.
+        """
+        entries: "OrderedDict[PitchKey, int]" = OrderedDict()
+        for key, entry in self._entries.items():
+            if key[0] == sound:
+                self.stats.size -= self._entry_size(entry)
+            elif key[0] > sound and shift:
+                entries[(key[0] - 1, key[1], key[2])] = entry
+            else:
+                entries[key] = entry
+        self._entries = entries
+        self.stats.entries = len(entries)
+
+    def _entry_size(self, entry: int) -> int:
+        return int(self.lengths[entry] + ENTRY_PADDING) * self.bank.itemsize
+
+    def _evict(self, size: int, in_use: Collection[int]) -> None:
+        """Evict the least recently used entries until `size` more bytes fit."""
+        for key, entry in list(self._entries.items()):
+            if self.stats.size + size <= self.max_size:
+                break
+            if entry in in_use:
+                continue
+            del self._entries[key]
+            self.stats.size -= self._entry_size(entry)
+            self.stats.evictions += 1
+        self.stats.entries = len(self._entries)
+
+    def _compact(self, in_use: Collection[int]) -> None:
+        """Move the entries that are still needed to the start of the bank."""
+        kept = set(self._entries.values()) | set(in_use)
+        used = np.zeros(len(self.offsets), dtype=bool)
+        used[list(kept)] = True
+        self._free_ids = [entry for entry in range(len(used)) if not used[entry]][::-1]
+
+        end = 0
+        for entry in sorted(kept, key=lambda entry: self.offsets[entry]):
+            offset = self.offsets[entry]
+            size = self.lengths[entry] + ENTRY_PADDING
+            # Entries only move towards the start, so they can be moved in place
+            self.bank[end : end + size] = self.bank[offset : offset + size]
+            self.offsets[entry] = end
+            end += size
+        self._end = int(end)
+
+    def _grow_bank(self, size: int) -> None:
+        limit = self.max_size // self.bank.itemsize
+        bank = np.zeros(max(size, min(len(self.bank) * 2, limit)), np.float32)
+        bank[: self._end] = self.bank[: self._end]
+        self.bank = bank
+
+    def _grow_ids(self) -> None:
+        count = len(self.offsets)
+        self.offsets = np.concatenate((self.offsets, np.zeros(count, np.int64)))
+        self.lengths = np.concatenate((self.lengths, np.zeros(count, np.int64)))
+        self._free_ids = list(range(2 * count - 1, count - 1, -1))
@@ -0,0 +1,101 @@
+"""
+A set of selected notes, kept as a boolean mask indexed by note ID.
+"""
+
+import numpy as np
+
+from nbs.core.signal import Signal
+
+
+class Selection:
+    """
+    The notes that are selected, identified by their IDs.
+
+    The selection is a boolean mask indexed by note ID, so selecting, deselecting
+    or inverting any number of notes is a single vectorized operation, and the
+    number of selected notes is always known. `changed` is emitted once for every
+    operation that changes the selection.
+    """
+
+    def __init__(self) -> None:
+        self._mask = np.zeros(0, dtype=bool)
+        self._count = 0
+        self.changed = Signal()
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, id: int) -> bool:
+        return 0 <= id < len(self._mask) and bool(self._mask[id])
+
+    def contains(self, ids: np.ndarray) -> np.ndarray:
+        """Return a mask of which of `ids` are selected."""
+        ids = np.asarray(ids, np.int64)
+        result = np.zeros(len(ids), dtype=bool)
+        inside = ids < len(self._mask)
+        result[inside] = self._mask[ids[inside]]
+        return result
+
+    def ids(self) -> np.ndarray:
+        """Return the IDs of the selected notes, in ascending order."""
+        return np.flatnonzero(self._mask).astype(np.int64)
+
+    def select(self, ids: np.ndarray) -> None:
+        self._assign(ids, True)
+
+    def deselect(self, ids: np.ndarray) -> None:
+        self._assign(ids, False)
+
+    def set(self, ids: np.ndarray) -> None:
+        """Select exactly the notes with IDs `ids`."""
+        ids = np.unique(np.asarray(ids, np.int64))
+        if self._count == len(ids) and self.contains(ids).all():
+            return
+        self._mask[:] = False
+        self._grow(ids)
+        self._mask[ids] = True
+        self._count = len(ids)
+        self.changed.emit()
+
+    def clear(self) -> None:
+        if self._count == 0:
+            return
+        self._mask[:] = False
+        self._count = 0
+        self.changed.emit()
+
+    def invert(self, ids: np.ndarray) -> None:
+        """Toggle the selection of the notes with IDs `ids`."""
+        ids = np.unique(np.asarray(ids, np.int64))
+        if len(ids) == 0:
+            return
+        self._grow(ids)
+        selected = np.count_nonzero(self._mask[ids])
+        self._mask[ids] = ~self._mask[ids]
+        self._count += len(ids) - 2 * selected
+        self.changed.emit()
+
+    def _assign(self, ids: np.ndarray, value: bool) -> None:
+        ids = np.unique(np.asarray(ids, np.int64))
+        if value:
+            self._grow(ids)
+        else:
+            ids = ids[ids < len(self._mask)]
+        changed = ids[self._mask[ids] != value]
+        if len(changed) == 0:
+            return
+        self._mask[changed] = value
+        self._count += len(changed) if value else -len(changed)
+        self.changed.emit()
+
+    def _grow(self, ids: np.ndarray) -> None:
+        if len(ids) == 0 or ids[-1] < len(self._mask):
+            return
+        size = max(int(ids[-1]) + 1, len(self._mask) * 2)
+        mask = np.zeros(size, dtype=bool)
+        mask[: len(self._mask)] = self._mask
+        self._mask = mask
@@ -0,0 +1,30 @@
+"""
+A minimal signal/slot mechanism for objects that must not depend on Qt.
+"""
+
+from typing import Any, Callable, List
+
+
+class Signal:
+    """
+    A list of callbacks that are called, in the order they were connected,
+    every time the signal is emitted. Mirrors the API of Qt's bound signals,
+    so Qt slots can be connected to it and vice versa.
+    """
+
+    def __init__(self) -> None:
+        self._slots: List[Callable[..., Any]] = []
+
+    def connect(self, slot: Callable[..., Any]) -> None:
+        self._slots.append(slot)
+
+    def disconnect(self, slot: Callable[..., Any]) -> None:
+        """Disconnect `slot` from the signal. Raise `ValueError` if it isn't connected."""
+        self._slots.remove(slot)
+
+    def emit(self, *args: Any) -> None:
+        for slot in tuple(self._slots):
+            slot(*args)
+
+    def __len__(self) -> int:
+        return len(self._slots)
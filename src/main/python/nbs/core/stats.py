@@ -0,0 +1,186 @@
+"""
+Aggregates over the notes of a song, kept up to date incrementally.
+
+Every edit adds and removes a batch of notes from the statistics (a modified
+note is removed with its old values and added with its new ones), so the cost
+of an update is proportional to the number of notes edited, and reading any
+statistic takes constant time.
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+from nbs.core.data import NoteStore
+
+
+def _grow(counts: np.ndarray, size: int) -> np.ndarray:
+    """Return `counts`, zero-extended to at least `size` elements."""
+    if size <= len(counts):
+        return counts
+    grown = np.zeros(max(size, len(counts) * 2), dtype=counts.dtype)
+    grown[: len(counts)] = counts
+    return grown
+
+
+class _Histogram:
+    """How many notes there are for each value of a column, and its bounds."""
+
+    def __init__(self) -> None:
+        self.counts = np.zeros(16, dtype=np.int64)
+        self.first: Optional[int] = None
+        self.last: Optional[int] = None
+
+    def __getitem__(self, value: int) -> int:
+        if 0 <= value < len(self.counts):
+            return int(self.counts[value])
+        return 0
+
+    def update(self, values: np.ndarray, sign: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Add (`sign=1`) or remove (`sign=-1`) `values` from the histogram. Return the
+        distinct values that changed, and their counts before the change.
+        """
+        unique, amounts = np.unique(values, return_counts=True)
+        if unique[0] < 0:
+            raise ValueError(f"Negative values can't be counted: {unique[0]}")
+        self.counts = _grow(self.counts, int(unique[-1]) + 1)
+        old = self.counts[unique]
+        self.counts[unique] = old + sign * amounts
+        if sign > 0:
+            first, last = int(unique[0]), int(unique[-1])
+            self.first = first if self.first is None else min(self.first, first)
+            self.last = last if self.last is None else max(self.last, last)
+        else:
+            self._update_bounds()
+        return unique, old
+
+    def _update_bounds(self) -> None:
+        # Only scan for the new bounds if a bound itself was emptied
+        if self.first is not None and self.counts[self.first] == 0:
+            nonzero = np.flatnonzero(self.counts[self.first :])
+            self.first = self.first + int(nonzero[0]) if len(nonzero) else None
+        if self.last is not None and self.counts[self.last] == 0:
+            nonzero = np.flatnonzero(self.counts[: self.last])
+            self.last = int(nonzero[-1]) if len(nonzero) else None
+
+    def clear(self) -> None:
+        self.counts[:] = 0
+        self.first = None
+        self.last = None
+
+
+class NoteStatistics:
+    """
+    Note counts (in total, per instrument, per layer and per tick), the bounds of
+    the song and its maximum polyphony, i.e. the largest number of notes played
+    in a single tick.
+    """
+
+    def __init__(self, notes: Optional[NoteStore] = None) -> None:
+        self.count = 0
+        self._ticks = _Histogram()
+        self._layers = _Histogram()
+        self._instruments = _Histogram()
+        # Number of ticks with each number of notes (index 0 is unused)
+        self._polyphony = np.zeros(16, dtype=np.int64)
+        self._max_polyphony = 0
+        if notes is not None:
+            self.add(notes)
+
+    ########## Queries ##########
+
+    @property
+    def instrument_counts(self) -> np.ndarray:
+        """Number of notes of each instrument, indexed by instrument ID."""
+        last = self._instruments.last
+        return self._instruments.counts[: 0 if last is None else last + 1].copy()
+
+    @property
+    def layer_counts(self) -> np.ndarray:
+        """Number of notes in each layer, indexed by layer ID."""
+        last = self._layers.last
+        return self._layers.counts[: 0 if last is None else last + 1].copy()
+
+    def count_in_instrument(self, instrument: int) -> int:
+        return self._instruments[instrument]
+
+    def count_in_layer(self, layer: int) -> int:
+        return self._layers[layer]
+
+    def polyphony(self, tick: int) -> int:
+        """Return the number of notes in `tick`."""
+        return self._ticks[tick]
+
+    @property
+    def max_polyphony(self) -> int:
+        return self._max_polyphony
+
+    @property
+    def first_tick(self) -> Optional[int]:
+        return self._ticks.first
+
+    @property
+    def last_tick(self) -> Optional[int]:
+        return self._ticks.last
+
+    @property
+    def first_layer(self) -> Optional[int]:
+        return self._layers.first
+
+    @property
+    def last_layer(self) -> Optional[int]:
+        return self._layers.last
+
+    @property
+    def length(self) -> int:
+        """Number of ticks up to the last note of the song."""
+        return 0 if self._ticks.last is None else self._ticks.last + 1
+
+    @property
+    def height(self) -> int:
+        """Number of layers up to the last note of the song."""
+        return 0 if self._layers.last is None else self._layers.last + 1
+
+    ########## Updates ##########
+
+    def add(self, notes: NoteStore) -> None:
+        self._update(notes, 1)
+
+    def remove(self, notes: NoteStore) -> None:
+        self._update(notes, -1)
+
+    def replace(self, old: NoteStore, new: NoteStore) -> None:
+        """Update the statistics after the notes `old` were changed to `new`."""
+        self.remove(old)
+        self.add(new)
+
+    def reset(self, notes: Optional[NoteStore] = None) -> None:
+        """Recompute the statistics from `notes`."""
+        self.count = 0
+        self._ticks.clear()
+        self._layers.clear()
+        self._instruments.clear()
+        self._polyphony[:] = 0
+        self._max_polyphony = 0
+        if notes is not None:
+            self.add(notes)
+
+    def _update(self, notes: NoteStore, sign: int) -> None:
+        if len(notes) == 0:
+            return
+        self.count += sign * len(notes)
+        self._layers.update(notes.layer, sign)
+        self._instruments.update(notes.instrument, sign)
+        ticks, old = self._ticks.update(notes.tick, sign)
+        self._update_polyphony(old, self._ticks.counts[ticks])
+
+    def _update_polyphony(self, old: np.ndarray, new: np.ndarray) -> None:
+        """Move the ticks whose note count changed from `old` to `new` notes."""
+        self._polyphony = _grow(self._polyphony, max(old.max(), new.max()) + 1)
+        size = len(self._polyphony)
+        self._polyphony -= np.bincount(old, minlength=size)
+        self._polyphony += np.bincount(new, minlength=size)
+        self._max_polyphony = max(self._max_polyphony, int(new.max()))
+        while self._max_polyphony > 0 and self._polyphony[self._max_polyphony] == 0:
+            self._max_polyphony -= 1
@@ -2,15 +2,20 @@ from pathlib import Path
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 
+from nbs.controller.autosave import AutosaveController
 from nbs.controller.clipboard import ClipboardController
 from nbs.controller.instrument import InstrumentController
 from nbs.controller.layer import LayerController
+from nbs.controller.note import NoteController
 from nbs.controller.playback import PlaybackController
 from nbs.controller.song import SongController
 from nbs.core.audio import AudioEngine
+from nbs.core.cache import SongCache
 from nbs.core.context import appctxt
-from nbs.core.data import Song, default_instruments
-from nbs.core.file import load_song, save_song
+from nbs.core.data import EditorState, Note, Song, SongInfo, default_instruments
+from nbs.core.history import History
+from nbs.core.journal import read_journal
+from nbs.core.resample import note_pitches
 from nbs.ui.actions import (
     Actions,
     ChangeInstrumentActionManager,
@@ -30,7 +35,8 @@ from nbs.ui.workspace.workspace import Workspace
 
 
 class MainWindow(QtWidgets.QMainWindow):
-    soundLoadRequested = QtCore.pyqtSignal(str)
+    soundLoadRequested = QtCore.pyqtSignal(int, str)
+    soundWarmUpRequested = QtCore.pyqtSignal(list)
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -49,23 +55,37 @@ class MainWindow(QtWidgets.QMainWindow):
         self.initPiano()
         self.initInstruments()
         self.initFile()
+        self.initHistory()
+        self.initAutosave()
 
     def initAudio(self):
-        self.audioThread = QtCore.QThread()
+        # The engine plays sounds in its own thread
         self.audioEngine = AudioEngine()
-        self.audioEngine.moveToThread(self.audioThread)
-        self.audioThread.started.connect(self.audioEngine.run)
         QtCore.QCoreApplication.instance().aboutToQuit.connect(self.audioEngine.stop)
-        self.audioEngine.finished.connect(self.audioThread.quit)
         self.soundLoadRequested.connect(self.audioEngine.loadSound)
-        self.audioThread.start()
+        self.soundWarmUpRequested.connect(self.audioEngine.warmUp)
+        self.audioEngine.start()
+
+    def playAddedNote(self, note: Note):
+        self.audioEngine.playKey(note.instrument, note.key)
+
+    def playPianoKey(self, key: int):
+        self.audioEngine.playKey(self.instrumentController.currentInstrument, key)
+
+    def playInstrument(self, instrument: int):
+        self.audioEngine.playKey(instrument, self.piano.activeKey)
 
     def initControllers(self):
         self.playbackController = PlaybackController()
         self.instrumentController = InstrumentController(self.instruments)
-        self.layerManager = LayerController(self.layers)
+        self.history = History()
+        self.layerManager = LayerController(self.layers, self.history)
+        self.noteController = NoteController(history=self.history)
         self.songController = SongController(
-            self.layerManager, self.instrumentController, self.playbackController
+            self.noteController,
+            self.layerManager,
+            self.instrumentController,
+            self.playbackController,
         )
         self.clipboardManager = ClipboardController(self.clipboard)
 
@@ -90,10 +110,17 @@ class MainWindow(QtWidgets.QMainWindow):
         self.setStatusBar(self.statusBar)
 
         self.audioEngine.soundCountUpdated.connect(self.statusBar.setSoundCount)
+        self.audioEngine.statsUpdated.connect(self.statusBar.setAudioStats)
+        self.audioEngine.soundLoadFailed.connect(self.statusBar.showSoundLoadFailed)
+        self.audioEngine.soundLoadProgress.connect(self.statusBar.setSoundLoadProgress)
+        # Sounds that weren't loaded yet when the song was warmed up were skipped
+        self.audioEngine.soundsLoaded.connect(self.warmUpSounds)
 
         self.noteBlockAreaCtxMenu = EditMenu(isContextMenu=True)
         self.noteBlockArea = NoteBlockArea(
-            layers=self.layers, menu=self.noteBlockAreaCtxMenu
+            layers=self.layers,
+            menu=self.noteBlockAreaCtxMenu,
+            noteController=self.noteController,
         )
         self.layerArea = LayerArea()
         self.timeBar = TimeBar()
@@ -108,6 +135,10 @@ class MainWindow(QtWidgets.QMainWindow):
     def initNoteBlocks(self):
         # Selection
         self.noteBlockArea.blockCountChanged.connect(Actions.setBlockCount)
+        self.noteBlockArea.blockCountChanged.connect(self.statusBar.setTotalBlocks)
+        self.noteBlockArea.selectedCountChanged.connect(
+            self.statusBar.setSelectedBlocks
+        )
         self.noteBlockArea.selectionChanged_.connect(Actions.setSelectionStatus)
 
         Actions.cutAction.triggered.connect(self.noteBlockArea.cutSelection)
@@ -136,6 +167,20 @@ class MainWindow(QtWidgets.QMainWindow):
             self.noteBlockArea.compressSelection
         )
 
+        # Transposition
+        Actions.increaseKeyAction.triggered.connect(
+            lambda: self.noteBlockArea.transposeSelection(1)
+        )
+        Actions.decreaseKeyAction.triggered.connect(
+            lambda: self.noteBlockArea.transposeSelection(-1)
+        )
+        Actions.increaseOctaveAction.triggered.connect(
+            lambda: self.noteBlockArea.transposeSelection(12)
+        )
+        Actions.decreaseOctaveAction.triggered.connect(
+            lambda: self.noteBlockArea.transposeSelection(-12)
+        )
+
         # Clipboard
         self.noteBlockArea.selectionCopied.connect(self.clipboardManager.setContent)
         Actions.pasteAction.triggered.connect(
@@ -150,6 +195,10 @@ class MainWindow(QtWidgets.QMainWindow):
         # Playback
         Actions.playPauseAction.triggered.connect(self.playbackController.setPlaying)
         Actions.stopAction.triggered.connect(self.playbackController.stop)
+        Actions.previousNoteAction.triggered.connect(
+            self.noteBlockArea.jumpToPreviousNote
+        )
+        Actions.nextNoteAction.triggered.connect(self.noteBlockArea.jumpToNextNote)
 
         self.playbackController.callback = self.noteBlockArea.view.setPlaybackPosition
         self.noteBlockArea.view.playbackPositionChanged.connect(
@@ -157,14 +206,8 @@ class MainWindow(QtWidgets.QMainWindow):
         )
 
         # Sounds
-        self.noteBlockArea.blockAdded.connect(
-            lambda ins, key: self.audioEngine.playSound(ins, 1.0, key - 45, 0)
-        )
-        self.noteBlockArea.tickPlayed.connect(
-            lambda sounds: self.audioEngine.playSounds(
-                ((ins, vol, key - 45, pan) for ins, key, vol, pan in sounds)
-            )
-        )
+        self.noteBlockArea.blockAdded.connect(self.playAddedNote)
+        self.noteBlockArea.tickPlayed.connect(self.audioEngine.playNotes)
 
     def initLayers(self):
         lm = self.layerManager
@@ -202,10 +245,14 @@ class MainWindow(QtWidgets.QMainWindow):
         lm.layerPanningChanged.connect(la.changeLayerPanning)
         lm.layerSwapped.connect(la.swapLayers)
 
+        # Connect manager to note controller (to move the notes along with the layers)
+        nc = self.noteController
+        lm.layerAdded.connect(lambda id, _: nc.insertLayer(id))
+        lm.layerRemoved.connect(nc.removeLayer)
+        lm.layerSwapped.connect(nc.swapLayers)
+
         # Connect manager to note block area
-        lm.layerAdded.connect(nba.addLayer)
         lm.layerRemoved.connect(nba.removeLayer)
-        lm.layerSwapped.connect(nba.swapLayers)
         lm.layerLockChanged.connect(nba.setLayerLock)
         lm.layerSoloChanged.connect(nba.setLayerSolo)
 
@@ -227,14 +274,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.piano.activeKey = 39
 
         # Sounds
-        self.piano.activeKeyChanged.connect(
-            lambda key: self.audioEngine.playSound(
-                self.instrumentController.currentInstrument,
-                1.0,
-                key - 45,
-                0,
-            )
-        )
+        self.piano.activeKeyChanged.connect(self.playPianoKey)
 
         # Playback
         # TODO: NoteBlockArea sends key and pitch combined into a single float. Needs to be split
@@ -249,9 +289,9 @@ class MainWindow(QtWidgets.QMainWindow):
         changeInsManager = self.changeInstrumentActionManager
 
         # Audio engine
-        for ins in default_instruments:
+        for id_, ins in enumerate(default_instruments):
             sound_path = appctxt.get_resource(Path("sounds", ins.sound_path))
-            self.soundLoadRequested.emit(sound_path)
+            self.soundLoadRequested.emit(id_, sound_path)
 
         control.instrumentSoundLoadRequested.connect(self.soundLoadRequested)
 
@@ -272,11 +312,7 @@ class MainWindow(QtWidgets.QMainWindow):
         control.currentInstrumentChanged.connect(setInsManager.setCurrentInstrument)
 
         # Instrument bar
-        self.instrumentBar.instrumentButtonPressed.connect(
-            lambda id_: self.audioEngine.playSound(
-                id_, 1.0, self.piano.activeKey - 45, 0
-            )
-        )
+        self.instrumentBar.instrumentButtonPressed.connect(self.playInstrument)
         control.instrumentListUpdated.connect(
             lambda: self.instrumentBar.populateInstruments(setInsManager.actions)
         )
@@ -298,6 +334,7 @@ class MainWindow(QtWidgets.QMainWindow):
         dialog.instrumentShiftRequested.connect(control.swapInstruments)
         control.instrumentAdded.connect(dialog.addInstrument)
         control.instrumentRemoved.connect(dialog.removeInstrument)
+        control.instrumentRemoveRefused.connect(dialog.refuseRemoveInstrument)
         control.instrumentChanged.connect(dialog.editInstrument)
         control.instrumentSwapped.connect(dialog.shiftInstrument)
 
@@ -305,6 +342,86 @@ class MainWindow(QtWidgets.QMainWindow):
         Actions.openSongAction.triggered.connect(self.loadSong)
         Actions.saveSongAction.triggered.connect(self.saveSong)
         Actions.saveSongAsAction.triggered.connect(self.saveSong)
+        self.songController.songSaved.connect(
+            lambda path: self.statusBar.showMessage(f"Saved {path}", 5000)
+        )
+        self.songController.songSaveFailed.connect(self.onSaveSongFailed)
+
+        # Songs are loaded in the background
+        sc = self.songController
+        cacheDir = QtCore.QStandardPaths.writableLocation(
+            QtCore.QStandardPaths.StandardLocation.CacheLocation
+        )
+        if cacheDir:
+            sc.songCache = SongCache(Path(cacheDir, "songs"))
+        sc.visibleTicks = self.noteBlockArea.visibleTickRange
+        sc.editorState = self.getEditorState
+        sc.songRead.connect(self.onSongRead)
+        sc.songLoadProgress.connect(self.statusBar.setLoadProgress)
+        sc.songLoaded.connect(self.statusBar.hideLoadProgress)
+        sc.songLoaded.connect(self.warmUpSounds)
+        sc.songLoadCanceled.connect(self.statusBar.hideLoadProgress)
+        sc.songLoadFailed.connect(self.onLoadSongFailed)
+        self.statusBar.loadCancelRequested.connect(sc.cancelLoad)
+        # Don't quit before pending saves are written
+        QtCore.QCoreApplication.instance().aboutToQuit.connect(
+            self.songController.waitForSave
+        )
+
+    def initAutosave(self):
+        dataDir = QtCore.QStandardPaths.writableLocation(
+            QtCore.QStandardPaths.StandardLocation.AppDataLocation
+        )
+        if not dataDir:
+            return
+        Path(dataDir).mkdir(parents=True, exist_ok=True)
+        path = Path(dataDir, "autosave.journal")
+        if path.exists():
+            self.recoverSong(path)
+        self.autosaveController = AutosaveController(self.songController, path)
+        self.autosaveController.autosaveFailed.connect(
+            lambda error: self.statusBar.showMessage(
+                f"Couldn't autosave the song: {error}"
+            )
+        )
+        self.autosaveController.start()
+        # The journal is only kept if the application doesn't quit normally
+        QtCore.QCoreApplication.instance().aboutToQuit.connect(
+            self.autosaveController.stop
+        )
+
+    def recoverSong(self, path: Path):
+        try:
+            song = read_journal(path)
+        except (OSError, ValueError) as e:
+            QtWidgets.QMessageBox.warning(
+                self,
+                "Recover song",
+                "The application didn't close properly last time, and the song "
+                f"you were working on couldn't be recovered: {e}",
+            )
+            return
+        answer = QtWidgets.QMessageBox.question(
+            self,
+            "Recover song",
+            "The application didn't close properly last time. "
+            "Do you want to recover the song you were working on?",
+        )
+        if answer != QtWidgets.QMessageBox.StandardButton.Yes:
+            return
+        # Load the whole song before the journal is replaced with it
+        self.songController.loadSong(song)
+        self.songController.finishLoad()
+        self.history.clear()
+
+    def initHistory(self):
+        Actions.undoAction.triggered.connect(lambda: self.history.undo())
+        Actions.redoAction.triggered.connect(lambda: self.history.redo())
+        self.history.on_change = self.updateHistoryActions
+        self.updateHistoryActions()
+
+    def updateHistoryActions(self):
+        Actions.setHistoryStatus(self.history.can_undo, self.history.can_redo)
 
     def initDialogs(self):
         # Instrument settings
@@ -321,14 +438,60 @@ class MainWindow(QtWidgets.QMainWindow):
         if not filename:
             return
 
-        song = load_song(filename)
-        self.noteBlockArea.loadNoteData(song.notes)
-        self.songController.loadSong(song)
+        self.songController.openSong(filename)
+        self.statusBar.showLoadStarted()
+
+    @QtCore.pyqtSlot(str, object)
+    def onSongRead(self, path: str, info: SongInfo):
         self.instrumentController.setCurrentInstrument(0)
+        self.history.clear()
+        # Make room for the whole song before its notes are loaded
+        self.noteBlockArea.setMinimumSongLength(info.length)
+        if self.songController.editor is not None:
+            self.restoreEditorState(self.songController.editor)
+
+    def warmUpSounds(self):
+        # Resample the sounds at the pitches the song plays before it's played
+        notes = self.songController.song.notes
+        self.soundWarmUpRequested.emit(note_pitches(notes))
+
+    def getEditorState(self) -> EditorState:
+        tick, layer = self.noteBlockArea.scrollPosition()
+        return EditorState(
+            scroll_tick=tick,
+            scroll_layer=layer,
+            zoom=self.noteBlockArea.view.currentScale,
+            playback_position=self.playbackController.currentTick,
+            current_instrument=self.instrumentController.currentInstrument,
+        )
+
+    def restoreEditorState(self, editor: EditorState):
+        view = self.noteBlockArea.view
+        view.setScale(editor.zoom)
+        self.noteBlockArea.setScrollPosition(editor.scroll_tick, editor.scroll_layer)
+        # Move the marker without playing the notes under it
+        self.playbackController.currentTick = max(0, editor.playback_position)
+        self.playbackController.playbackPositionChanged.emit(editor.playback_position)
+        view.marker.setTick(editor.playback_position)
+        if 0 <= editor.current_instrument < len(self.instrumentController.instruments):
+            self.instrumentController.setCurrentInstrument(editor.current_instrument)
+
+    @QtCore.pyqtSlot(str, str)
+    def onLoadSongFailed(self, path: str, error: str):
+        self.statusBar.hideLoadProgress()
+        QtWidgets.QMessageBox.critical(
+            self, "Error", f"The song at {path} couldn't be loaded:\n{error}"
+        )
 
     @QtCore.pyqtSlot()
     def saveSong(self):
         filename = getSaveSongDialog()
         if not filename:
             return
-        save_song(self.songController.song, filename)
+        self.songController.saveSong(filename)
+
+    @QtCore.pyqtSlot(str, str)
+    def onSaveSongFailed(self, path: str, error: str):
+        QtWidgets.QMessageBox.critical(
+            self, "Error", f"The song couldn't be saved to {path}:\n{error}"
+        )
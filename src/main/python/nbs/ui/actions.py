@@ -28,6 +28,8 @@ class Actions(QtCore.QObject):
             "fast_forward": qta.icon("mdi.fast-forward"),
             "play_pause": qta.icon("mdi.play", selected="mdi.pause"),
             "stop": qta.icon("mdi.stop"),
+            "previous_note": qta.icon("mdi.skip-previous"),
+            "next_note": qta.icon("mdi.skip-next"),
             "record": qta.icon("mdi.record"),
             "loop": qta.icon("mdi.repeat"),
             "loop_off": qta.icon("mdi.repeat-off"),
@@ -90,6 +92,12 @@ class Actions(QtCore.QObject):
         cls.rewindAction = QAction(icons["rewind"], "Rewind song")
         cls.rewindAction.setAutoRepeat(True)
         cls.rewindAction.setShortcut("Left")
+        cls.previousNoteAction = QAction(
+            icons["previous_note"], "Jump to previous note"
+        )
+        cls.previousNoteAction.setShortcut("Ctrl+Left")
+        cls.nextNoteAction = QAction(icons["next_note"], "Jump to next note")
+        cls.nextNoteAction.setShortcut("Ctrl+Right")
         cls.loopAction = QAction(icons["loop"], "Toggle looping")
         cls.loopAction.setCheckable(True)
         cls.metronomeAction = QAction(icons["metronome"], "Toggle metronome")
@@ -232,6 +240,14 @@ class Actions(QtCore.QObject):
         cls.selectAllInstrumentAction.setEnabled(enabled)
         cls.selectAllButInstrumentAction.setEnabled(enabled)
 
+    @classmethod
+    def setHistoryStatus(cls, canUndo: bool, canRedo: bool) -> None:
+        """
+        Enable or disable the undo and redo actions according to the state of the history.
+        """
+        cls.undoAction.setEnabled(canUndo)
+        cls.redoAction.setEnabled(canRedo)
+
     @QtCore.pyqtSlot(int)
     @classmethod
     def setSelectionStatus(cls, selection: int) -> None:
@@ -257,7 +257,10 @@ class InstrumentSettingsDialog(QtWidgets.QDialog):
     @QtCore.pyqtSlot(int, int, int, int)
     def updateSelection(self, selectedRow, *_):
         if self.table.selectedItems():
-            self.removeInstrumentButton.setEnabled(True)
+            # Instruments can't be removed while there are note blocks using them
+            self.removeInstrumentButton.setEnabled(
+                self.instruments[selectedRow].blockCount == 0
+            )
             self.shiftInstrumentUpButton.setEnabled(
                 selectedRow > 16
             )  # TODO: replace with default instrument count
@@ -314,6 +317,18 @@ class InstrumentSettingsDialog(QtWidgets.QDialog):
     def removeInstrument(self, id: int):
         self.table.removeRow(id)
 
+    @QtCore.pyqtSlot(int)
+    def refuseRemoveInstrument(self, id: int):
+        # The block count may have changed since the instrument was selected
+        self.removeInstrumentButton.setEnabled(False)
+        instrument = self.instruments[id]
+        QtWidgets.QMessageBox.warning(
+            self,
+            "Remove instrument",
+            f"{instrument.name} can't be removed, as it's used by "
+            f"{instrument.blockCount} note blocks.",
+        )
+
     @QtCore.pyqtSlot(int, InstrumentInstance)
     def editInstrument(self, id: int, instrument: InstrumentInstance) -> None:
         self.table.editRow(id, instrument)
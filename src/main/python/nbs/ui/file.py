@@ -8,7 +8,7 @@ def getLoadSongDialog(parent: Optional[QtWidgets.QWidget] = None) -> Optional[st
         parent=parent,
         caption="Load song",
         directory="",
-        filter="Note Block Songs (*.nbs)",
+        filter="Note Block Songs (*.nbs *.nbsx *.nbs.gz *.nbs.xz *.nbs.zst)",
     )
     return filename
 
@@ -18,6 +18,7 @@ def getSaveSongDialog(parent: Optional[QtWidgets.QWidget] = None) -> Optional[st
         parent=parent,
         caption="Save song",
         directory="",
-        filter="Note Block Songs (*.nbs)",
+        filter="Note Block Projects (*.nbsx);;Note Block Songs (*.nbs);;"
+        "Compressed Note Block Songs (*.nbs.gz *.nbs.xz *.nbs.zst)",
     )
     return filename
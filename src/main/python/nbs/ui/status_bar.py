@@ -1,11 +1,17 @@
-from typing import List
+from typing import TYPE_CHECKING, List
 
 from PyQt5 import QtCore, QtWidgets
 
 from nbs.core.data import Instrument
+from nbs.core.mixer import MAX_VOICES
+
+if TYPE_CHECKING:
+    from nbs.core.audio import AudioStats
 
 
 class StatusBar(QtWidgets.QStatusBar):
+    loadCancelRequested = QtCore.pyqtSignal()
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.initUI()
@@ -27,18 +33,31 @@ class StatusBar(QtWidgets.QStatusBar):
         self.layerLabel.setText("Layer: None")
         self.addPermanentWidget(self.layerLabel, stretch=4)
 
+        self.totalBlocks = 0
+        self.selectedBlocks = 0
         self.selectedLabel = QtWidgets.QLabel()
-        self.selectedLabel.setText("Selected: 0 / 500")
+        self.updateSelectedLabel()
         self.addPermanentWidget(self.selectedLabel, stretch=5)
 
         self.soundsLabel = QtWidgets.QLabel()
-        self.soundsLabel.setText("Sounds: 0 / 1024")
+        self.soundsLabel.setText(f"Sounds: 0 / {MAX_VOICES}")
         self.addPermanentWidget(self.soundsLabel, stretch=5)
 
         self.midiDevicesLabel = QtWidgets.QLabel()
         self.midiDevicesLabel.setText("No connected MIDI devices")
         self.addWidget(self.midiDevicesLabel, stretch=10)
 
+        self.loadProgressBar = QtWidgets.QProgressBar()
+        self.loadProgressBar.setFormat("Loading song... %p%")
+        self.loadProgressBar.hide()
+        self.addWidget(self.loadProgressBar, stretch=5)
+
+        self.loadCancelButton = QtWidgets.QToolButton()
+        self.loadCancelButton.setText("Cancel")
+        self.loadCancelButton.clicked.connect(self.loadCancelRequested)
+        self.loadCancelButton.hide()
+        self.addWidget(self.loadCancelButton)
+
     @QtCore.pyqtSlot(object)
     def setInstrument(self, instrument: Instrument):
         self.instrumentLabel.setText(f"Instrument: {instrument.name}")
@@ -73,11 +92,34 @@ class StatusBar(QtWidgets.QStatusBar):
 
     @QtCore.pyqtSlot(int)
     def setSoundCount(self, sounds: int):
-        if sounds >= 1024:
+        if sounds >= MAX_VOICES:
             self.soundsLabel.setStyleSheet("color: red")
         else:
             self.soundsLabel.setStyleSheet("color: black")
-        self.soundsLabel.setText(f"Sounds: {sounds} / 1024")
+        self.soundsLabel.setText(f"Sounds: {sounds} / {MAX_VOICES}")
+
+    @QtCore.pyqtSlot(object)
+    def setAudioStats(self, stats: "AudioStats"):
+        cache = stats.cache
+        voices = stats.voices
+        self.soundsLabel.setToolTip(
+            f"Resampled sounds: {cache.entries} ({cache.size / 2**20:.1f} MB), "
+            f"{cache.hit_rate:.0%} reused\n"
+            f"Sounds: {voices.peak_voices} at most, {voices.steals} stopped early, "
+            f"{stats.dropped_notes} dropped"
+        )
+
+    @QtCore.pyqtSlot(str, str)
+    def showSoundLoadFailed(self, path: str, error: str):
+        self.showMessage(f"Failed to load sound {path}: {error}", 5000)
+
+    @QtCore.pyqtSlot(int, int)
+    def setSoundLoadProgress(self, loaded: int, total: int):
+        if loaded < total:
+            self.showMessage(f"Loading sounds... {loaded} / {total}")
+        elif self.currentMessage().startswith("Loading sounds"):
+            # Keep any message about a sound that failed to load
+            self.clearMessage()
 
     @QtCore.pyqtSlot(list)
     def setMidiDevices(self, devices: List[str]):
@@ -85,3 +127,22 @@ class StatusBar(QtWidgets.QStatusBar):
             self.midiDevicesLabel.setText("No connected MIDI devices")
         else:
             self.midiDevicesLabel.setText(f"MIDI devices: f{', '.join(devices)}")
+
+    @QtCore.pyqtSlot()
+    def showLoadStarted(self):
+        # No progress is known until the file has been read
+        self.loadProgressBar.setRange(0, 0)
+        self.loadProgressBar.show()
+        self.loadCancelButton.show()
+
+    @QtCore.pyqtSlot(int, int)
+    def setLoadProgress(self, loaded: int, total: int):
+        self.loadProgressBar.setRange(0, max(total, 1))
+        self.loadProgressBar.setValue(loaded)
+        self.loadProgressBar.show()
+        self.loadCancelButton.show()
+
+    @QtCore.pyqtSlot()
+    def hideLoadProgress(self):
+        self.loadProgressBar.hide()
+        self.loadCancelButton.hide()
@@ -24,6 +24,8 @@ class PlaybackToolBar(QtWidgets.QToolBar):
         self.stopAction = self.addAction(Actions.stopAction)
         self.rewindAction = self.addAction(Actions.rewindAction)
         self.fastForwardAction = self.addAction(Actions.fastForwardAction)
+        self.previousNoteAction = self.addAction(Actions.previousNoteAction)
+        self.nextNoteAction = self.addAction(Actions.nextNoteAction)
         self.recordAction = self.addAction(Actions.rewindAction)
         self.loopAction = self.addAction(Actions.loopAction)
         self.metronomeAction = self.addAction(Actions.metronomeAction)
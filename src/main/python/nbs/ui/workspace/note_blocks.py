@@ -4,15 +4,17 @@ import math
 import pickle
 import sys
 import time
-from copy import copy
 from dataclasses import dataclass
 from enum import Enum
-from typing import Callable, Dict, Generator, List, Optional, Sequence, Set, Union
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple, Union
 
+import numpy as np
 from PyQt5 import QtCore, QtGui, QtWidgets
 
+from nbs.controller.note import NoteChange, NoteController
 from nbs.core.context import appctxt
-from nbs.core.data import Instrument, Layer, Note, default_instruments
+from nbs.core.data import Instrument, Layer, Note, NoteStore, default_instruments
+from nbs.core.index import GridIndex, SortedIndex
 from nbs.core.utils import *
 from nbs.ui.utils.cache import ScrollingPaintCache
 
@@ -31,6 +33,10 @@ BLOCK_GLOW_MAX_OPACITY = 1.0
 BLOCK_GLOW_BASE_OPACITY = 0.6
 BLOCK_GLOW_HOVER_OPACITY = 1.0
 
+# Maximum number of ticks that are played at once to catch up when
+# playback skips over some ticks (e.g. when a frame takes too long)
+PLAYBACK_CATCH_UP_TICKS = 8
+
 
 instrument_data = default_instruments  # TODO: replace with actual data
 
@@ -345,18 +351,29 @@ class NoteBlockArea(QtWidgets.QGraphicsScene):
 
     ########## Public slots ##########
     selectionChanged_ = QtCore.pyqtSignal(int)
-    selectionCopied = QtCore.pyqtSignal(list)
+    selectionCopied = QtCore.pyqtSignal(object)
     selectAllLeftActionEnabled = QtCore.pyqtSignal(bool)
     selectAllRightActionEnabled = QtCore.pyqtSignal(bool)
     blockCountChanged = QtCore.pyqtSignal(int)
+    selectedCountChanged = QtCore.pyqtSignal(int)
     blockAdded = QtCore.pyqtSignal(object)
     tickPlayed = QtCore.pyqtSignal(list)
 
-    def __init__(self, layers: List[Layer], menu: QtWidgets.QMenu, parent=None):
+    def __init__(
+        self,
+        layers: List[Layer],
+        menu: QtWidgets.QMenu,
+        noteController: Optional[NoteController] = None,
+        parent=None,
+    ):
         super().__init__(parent, objectName=__class__.__name__)
         self.view = NoteBlockView(self)
         self.layers = layers  # read-only!
         self.menu = menu
+        self.noteController = (
+            noteController if noteController is not None else NoteController()
+        )
+        self.stats = self.noteController.stats
         self.selection = QtWidgets.QRubberBand(
             QtWidgets.QRubberBand.Shape.Rectangle, parent=self.view.viewport()
         )
@@ -377,8 +394,15 @@ class NoteBlockArea(QtWidgets.QGraphicsScene):
         self.previousPlaybackPosition = 0
         self.currentInstrument = 0
         self.minimumLayerCount = 0
+        self.minimumSongLength = 0
         self.soloLayerIds: Set[int] = set()
         self.runningAnimations = list[OpacityAnimation]()
+        self.tickIndex: SortedIndex[NoteBlock] = SortedIndex()
+        self.layerIndex: SortedIndex[NoteBlock] = SortedIndex()
+        self.gridIndex: GridIndex[NoteBlock] = GridIndex()
+        # Note blocks are identified by the ID of the note they show
+        self.blocksById: Dict[int, NoteBlock] = {}
+        self.moveOrigin = (0, 0)
         self.initUI()
 
         self.fps = QtWidgets.QLabel(parent=self.view)
@@ -393,11 +417,12 @@ class NoteBlockArea(QtWidgets.QGraphicsScene):
         self.timer.setInterval(250)
         self.timer.start()
 
-        self.tickIndex: Dict[int, List[NoteBlock]] = {}
+        # Note blocks aren't selected through Qt; the selection is kept by the
+        # note controller, and the scene is repainted when it changes
+        self.noteSelection = self.noteController.selection
+        self.noteSelection.changed.connect(self.onSelectionChanged)
 
-        # Connect Qt's selectionChanged signal to our own slot
-        # to do stuff when the selection changes
-        self.selectionChanged.connect(self.updateSelectionStatus)
+        self.noteController.notesChanged.connect(self.onNotesChanged)
 
     ########## UI ##########
 
@@ -487,9 +512,9 @@ class NoteBlockArea(QtWidgets.QGraphicsScene):
         self.isTriggeringMenu = True
 
     def toggleSelectLeftRightActions(self, pos: int):
-        if not self.items():
+        if not self.tickIndex:
             return
-        bbox = self.itemsBoundingRect()
+        bbox = self.songBoundingRect()
         self.selectAllLeftActionEnabled.emit(pos > bbox.left())
         self.selectAllRightActionEnabled.emit(pos < bbox.right())
 
@@ -505,14 +530,20 @@ class NoteBlockArea(QtWidgets.QGraphicsScene):
 
     ########## COORDINATE TRANSFORMATION ##########
 
+    def songBoundingRect(self) -> QtCore.QRectF:
+        """Return the area occupied by note blocks, in scene coordinates."""
+        if self.stats.count == 0:
+            return QtCore.QRectF(0, 0, 0, 0)
+        topLeft = self.getScenePos(self.stats.first_tick, self.stats.first_layer)
+        bottomRight = self.getScenePos(self.stats.length, self.stats.height)
+        return QtCore.QRectF(topLeft, bottomRight)
+
     def updateSceneSize(self):
-        if len(self.items()) >= 1:
-            bbox = self.itemsBoundingRect()
-        else:
-            bbox = QtCore.QRectF(0, 0, 0, 0)
+        bbox = self.songBoundingRect()
         viewSize = self.view.rect()
         width = math.ceil((bbox.right() + viewSize.width()) / BLOCK_SIZE)
         height = math.ceil((bbox.bottom() + viewSize.height()) / BLOCK_SIZE)
+        width = max(width, self.minimumSongLength + viewSize.width() // BLOCK_SIZE)
         height = max(height, self.minimumLayerCount)
         print("Calculated height:", height, "Min. count:", self.minimumLayerCount)
         self.setSceneRect(QtCore.QRectF(0, 0, width * BLOCK_SIZE, height * BLOCK_SIZE))
@@ -520,10 +551,10 @@ class NoteBlockArea(QtWidgets.QGraphicsScene):
         print(f"Scene size changed to {width}x{height}")
         self.update()
 
-        # left edge of the rightmost block
-        songHeight = int(max((bbox.bottom() // BLOCK_SIZE) - 1, 0))
         # top edge of the bottommost block
-        songLength = int(max((bbox.right() // BLOCK_SIZE) - 1, 0))
+        songHeight = max(self.stats.height - 1, 0)
+        # left edge of the rightmost block
+        songLength = max(self.stats.length - 1, 0)
         self.songHeightChanged.emit(songHeight)
         self.songLengthChanged.emit(songLength)
 
@@ -545,29 +576,51 @@ class NoteBlockArea(QtWidgets.QGraphicsScene):
         """Return the top left scene position of a set of grid coordinates."""
         return QtCore.QPoint(x * BLOCK_SIZE, y * BLOCK_SIZE)
 
+    def scrollPosition(self) -> Tuple[int, int]:
+        """Return the tick and layer at the top left corner of the view."""
+        topLeft = self.view.mapToScene(self.view.viewport().rect().topLeft())
+        tick, layer = self.getGridPos(topLeft)
+        return max(int(tick), 0), max(int(layer), 0)
+
+    def setScrollPosition(self, tick: int, layer: int) -> None:
+        """Scroll the view so that `tick` and `layer` are at its top left corner."""
+        scale = self.view.currentScale
+        self.view.horizontalScrollBar().setValue(round(tick * BLOCK_SIZE * scale))
+        self.view.verticalScrollBar().setValue(round(layer * BLOCK_SIZE * scale))
+
+    def visibleTickRange(self) -> Tuple[int, int]:
+        """Return the range of ticks visible in the view, as `(start, stop)`."""
+        rect = self.view.mapToScene(self.view.viewport().rect()).boundingRect()
+        start, _ = self.getGridPos(rect.topLeft())
+        stop, _ = self.getGridPos(rect.bottomRight())
+        return int(start), int(stop) + 1
+
+    def blockAt(self, x: int, y: int) -> Optional[NoteBlock]:
+        """Return the topmost note block at the specified grid position, if any."""
+        return self.gridIndex.get(x, y)
+
+    def blocksAt(self, x: int, y: int) -> Sequence[NoteBlock]:
+        """Return all note blocks at the specified grid position."""
+        return self.gridIndex.at(x, y)
+
     def blockAtPos(self, pos: Union[QtCore.QPoint, QtCore.QPointF]):
-        viewPos = self.view.mapFromScene(pos)
-        viewTransform = self.view.transform()
-        return self.itemAt(viewPos, viewTransform)
+        x, y = self.getGridPos(pos)
+        return self.blockAt(int(x), int(y))
 
     ########## SONG ##########
 
     def reset(self) -> None:
         self.clear()
+        self.minimumSongLength = 0
         self.updateSceneSize()
         self.updateBlockCount()
         self.view.ensureVisible(0, 0, 0, 0)
 
-    def loadNoteData(self, blocks: Sequence[Note]) -> None:
-        self.reset()
-        for block in blocks:
-            self.addBlock(block.tick, block.layer, block)
-        self.updateBlockCount()
-        self.updateSceneSize()
+    def loadNoteData(self, notes: NoteStore) -> None:
+        self.noteController.load(notes)
 
-    def getNoteData(self) -> List[NoteBlock]:
-        blocks = [block.note for block in self.items()]
-        return blocks
+    def getNoteData(self) -> NoteStore:
+        return self.noteController.notes.copy()
 
     ########## ATOMIC OPERATIONS ##########
 
@@ -578,30 +631,36 @@ class NoteBlockArea(QtWidgets.QGraphicsScene):
     def _doAddBlock(self, block: NoteBlock):
         """Add a note block at the specified position. This operation must always
         be called when adding a block."""
+        self.blocksById[block.id] = block
         self.addItem(block)
         tick = block.tick
-        if tick not in self.tickIndex:
-            self.tickIndex[tick] = []
-        self.tickIndex[tick].append(block)
+        layer = block.layer
+        self.tickIndex.add(tick, block)
+        self.layerIndex.add(layer, block)
+        self.gridIndex.add(tick, layer, block)
 
     def _doMoveBlock(self, block: NoteBlock, x: int, y: int):
         """Move a note block by the specified number of grid spaces. This operation must always
         be called when moving a block."""
         prevTick = block.tick
+        prevLayer = block.layer
         block.moveBy(x * BLOCK_SIZE, y * BLOCK_SIZE)
-        if x != 0:
-            self.tickIndex[prevTick].remove(block)
-            nextTick = block.tick
-            if nextTick not in self.tickIndex:
-                self.tickIndex[nextTick] = []
-            self.tickIndex[nextTick].append(block)
+        tick = block.tick
+        layer = block.layer
+        self.tickIndex.move(block, prevTick, tick)
+        self.layerIndex.move(block, prevLayer, layer)
+        self.gridIndex.move(block, prevTick, prevLayer, tick, layer)
 
     def _doRemoveBlock(self, block: NoteBlock):
         """Remove a note block from the scene. This operation must always
         be called when removing a block."""
+        del self.blocksById[block.id]
         self.removeItem(block)
         tick = block.tick
-        self.tickIndex[tick].remove(block)
+        layer = block.layer
+        self.tickIndex.remove(tick, block)
+        self.layerIndex.remove(layer, block)
+        self.gridIndex.remove(tick, layer, block)
 
     ########## NOTE BLOCKS ##########
 
@@ -613,128 +672,201 @@ class NoteBlockArea(QtWidgets.QGraphicsScene):
         """Clear all note blocks in the scene."""
         for item in self.items():
             self._doRemoveBlock(item)
+        self.tickIndex.clear()
+        self.layerIndex.clear()
+        self.gridIndex.clear()
+        self.blocksById.clear()
 
-    def addBlock(self, x: int, y: int, note: Note) -> NoteBlock:
-        """Add a note block at the specified position."""
+    def addBlock(self, x: int, y: int, note: Note, id: int) -> NoteBlock:
+        """Add a note block for the note with ID `id` at the specified position."""
         blockPos = self.getScenePos(x, y)
         block = NoteBlock(note)
+        block.id = id
         block.setPos(blockPos)
         self._doAddBlock(block)
         return block
 
     def addBlockManual(self, x: int, y: int, key: int, ins: int) -> None:
         note = Note(tick=x, layer=y, key=key, instrument=ins)
-        block = self.addBlock(x, y, note)
-        self.updateBlockCount()
-        self.updateSceneSize()
+        self.noteController.addNotes(NoteStore.from_notes([note]))
         self.blockAdded.emit(note)
 
     def removeBlock(self, block: NoteBlock) -> None:
-        self._doRemoveBlock(block)
-        self.updateBlockCount()
+        self.removeBlocks([block])
         # TODO: self.blockRemoved.emit()
 
     def removeBlockAt(self, x: int, y: int) -> None:
         """Remove the note block at the specified position."""
-        pos = self.getScenePos(x, y)
-        itemAtPos = self.itemAt(pos, self.view.transform())
-        if itemAtPos is not None:
-            self._doRemoveBlock(itemAtPos)
+        block = self.blockAt(x, y)
+        if block is not None:
+            self.removeBlocks([block])
 
     def removeBlockManual(self, x: int, y: int) -> None:
         self.removeBlockAt(x, y)
-        self.updateSceneSize()
+
+    def removeBlocks(self, blocks: Sequence[NoteBlock]) -> None:
+        self.noteController.removeNotes(self.getBlockIds(blocks))
 
     def updateBlockCount(self):
-        self.blockCountChanged.emit(len(self.items()))
+        self.blockCountChanged.emit(self.stats.count)
+
+    ########## NOTES ##########
+
+    # The note blocks in the scene are a view of the notes in the note controller.
+    # Changes to the notes are requested to the controller, which then notifies
+    # the scene of what changed so that the note blocks can be updated.
+
+    def getBlockIds(self, blocks: Sequence[NoteBlock]) -> np.ndarray:
+        return np.fromiter((block.id for block in blocks), np.int64, len(blocks))
+
+    def getBlocksById(self, ids: np.ndarray) -> List[NoteBlock]:
+        return [self.blocksById[id] for id in ids.tolist()]
+
+    def onNotesChanged(self, change: NoteChange) -> None:
+        if change.reset:
+            self.reset()
+        for block in self.getBlocksById(change.removed):
+            self._doRemoveBlock(block)
+        if len(change.modified) > 0:
+            notes = self.noteController.getNotes(change.modified)
+            blocks = self.getBlocksById(change.modified)
+            if change.fields & {"tick", "layer"}:
+                positions = zip(blocks, notes.tick.tolist(), notes.layer.tolist())
+                for block, tick, layer in positions:
+                    # Blocks being dragged may already be at their new position
+                    x = tick - block.tick
+                    y = layer - block.layer
+                    if x != 0 or y != 0:
+                        self._doMoveBlock(block, x, y)
+            if change.fields & {"instrument", "key"}:
+                for block, note in zip(blocks, notes):
+                    block.setNote(note)
+        if len(change.added) > 0:
+            notes = self.noteController.getNotes(change.added)
+            for id, note in zip(change.added.tolist(), notes):
+                self.addBlock(note.tick, note.layer, note, id)
+        self.updateBlockCount()
+        if change.reset or len(change.removed) > 0:
+            self.updateSelectionStatus()
+        self.updateSceneSize()
 
     ########## SELECTION ##########
 
-    def setBlocksSelected(self, blocks: Sequence[NoteBlock], selected: bool = True):
-        for block in blocks:
-            block.setSelected(selected)
+    # The selection is kept by the note controller as a set of note IDs, rather than
+    # in the selected flag of each note block, so that selection operations run on
+    # all notes at once instead of walking the items in the scene.
+
+    def onSelectionChanged(self) -> None:
         self.updateSelectionStatus()
+        self.update()
+
+    def isBlockSelected(self, block: NoteBlock) -> bool:
+        return block.id in self.noteSelection
+
+    def selectedIds(self) -> np.ndarray:
+        return self.noteSelection.ids()
+
+    def selectedBlocks(self) -> List[NoteBlock]:
+        return self.getBlocksById(self.selectedIds())
+
+    def setBlocksSelected(self, blocks: Sequence[NoteBlock], selected: bool = True):
+        ids = self.getBlockIds(blocks)
+        if selected:
+            self.noteSelection.select(ids)
+        else:
+            self.noteSelection.deselect(ids)
 
     def setAreaSelected(
-        self,
-        area: QtCore.QRectF | QtGui.QPolygonF | QtGui.QPainterPath,
-        selected: bool = True,
+        self, area: QtCore.QRectF, selected: bool = True, skipLocked: bool = False
     ):
-        # There's no native way of subtracting an area from the current selection, so we use
-        # Qt's native implementation to add items (faster), but remove items individually.
+        """
+        Select or deselect the notes in `area`, in scene coordinates. If `skipLocked`
+        is set, notes in locked layers are left as they are.
+        """
+        firstTick, firstLayer = (math.floor(i) for i in self.getGridPos(area.topLeft()))
+        lastTick, lastLayer = (
+            math.ceil(i) - 1 for i in self.getGridPos(area.bottomRight())
+        )
+        ids = self.getIdsInRange(firstTick, lastTick, firstLayer, lastLayer, skipLocked)
         if selected:
-            path = QtGui.QPainterPath()
-            if isinstance(area, QtCore.QRectF):
-                path.addRect(area)
-            elif isinstance(area, QtGui.QPolygonF):
-                path.addPolygon(area)
-            elif isinstance(area, QtGui.QPainterPath):
-                path = area
-            else:
-                raise TypeError("Invalid type for area:", type(area))
-            selectionType = QtCore.Qt.ItemSelectionMode.IntersectsItemShape
-            self.setSelectionArea(path, selectionType)
+            self.noteSelection.select(ids)
         else:
-            self.setBlocksSelected(self.items(area), False)
-        self.updateSelectionStatus()
+            self.noteSelection.deselect(ids)
+
+    def getIdsInRange(
+        self,
+        firstTick: Optional[int] = None,
+        lastTick: Optional[int] = None,
+        firstLayer: Optional[int] = None,
+        lastLayer: Optional[int] = None,
+        skipLocked: bool = False,
+    ) -> np.ndarray:
+        """
+        Return the IDs of the notes between the given ticks and layers (inclusive).
+        If `skipLocked` is set, notes in locked layers are excluded.
+        """
+        notes = self.noteController.notes
+        ticks = notes.tick
+        layers = notes.layer
+        mask = np.ones(len(notes), dtype=bool)
+        if firstTick is not None:
+            mask &= ticks >= firstTick
+        if lastTick is not None:
+            mask &= ticks <= lastTick
+        if firstLayer is not None:
+            mask &= layers >= firstLayer
+        if lastLayer is not None:
+            mask &= layers <= lastLayer
+
+        if not skipLocked:
+            return self.noteController.ids[mask]
+
+        lockedCheck = self._getLayerLockedCheck()
+        locked = np.fromiter(
+            (lockedCheck(layer) for layer in self.layers), bool, len(self.layers)
+        )
+        if locked.any():
+            inLockedLayer = np.zeros(len(notes), dtype=bool)
+            known = layers < len(locked)
+            inLockedLayer[known] = locked[layers[known]]
+            mask &= ~inLockedLayer
+        return self.noteController.ids[mask]
 
     def hasSelection(self):
-        return len(self.selectedItems()) > 0
+        return self.noteSelection.count > 0
 
     def updateSelectionStatus(self):
-        if len(self.items()) == 0:
+        selected = self.noteSelection.count
+        if self.stats.count == 0:
             self.selectionStatus = -2
-        elif self.hasSelection():
-            if len(self.selectedItems()) == len(self.items()):
+        elif selected > 0:
+            if selected == self.stats.count:
                 self.selectionStatus = 1
             else:
                 self.selectionStatus = 0
         else:
             self.selectionStatus = -1
         self.selectionChanged_.emit(self.selectionStatus)
+        self.selectedCountChanged.emit(selected)
 
     def selectionBoundingRect(self) -> QtCore.QRectF:
-        rect = QtCore.QRectF()
-        for selectedItem in self.selectedItems():
-            rect = rect.united(selectedItem.sceneBoundingRect())
-        return rect
-
-    def getSelectableArea(self, area: QtCore.QRectF) -> QtGui.QPainterPath:
-        """Return the selectable area in the scene, excluding the area of locked layers."""
-
-        selectableArea = QtGui.QPainterPath()
-        selectableArea.addRect(area)
-
-        firstLayerInArea = int(area.top() // BLOCK_SIZE)
-        startLayer = max(firstLayerInArea, 0)
-        lastLayerInArea = int(area.bottom() // BLOCK_SIZE)
-        endLayer = min(lastLayerInArea, len(self.layers))
-
-        lockedCheck = self._getLayerLockedCheck()
-
-        for id, layer in enumerate(self.layers[startLayer : endLayer + 1], startLayer):
-            if lockedCheck(layer):
-                layerRegion = self.getLayerRegion(id)
-                # Blocks touching an unlocked layer are still selected. We expand the
-                # region by 1px in each vertical direction to account for this.
-                layerRegion = layerRegion.adjusted(0, -1, 0, 1)
-                layerPath = QtGui.QPainterPath()
-                layerPath.addRect(layerRegion)
-                selectableArea = selectableArea.subtracted(layerPath)
-
-        return selectableArea
+        ids = self.selectedIds()
+        if len(ids) == 0:
+            return QtCore.QRectF()
+        notes = self.noteController.getNotes(ids)
+        topLeft = self.getScenePos(notes.tick.min(), notes.layer.min())
+        bottomRight = self.getScenePos(notes.tick.max() + 1, notes.layer.max() + 1)
+        return QtCore.QRectF(topLeft, bottomRight)
 
     @QtCore.pyqtSlot()
     def selectAll(self):
-        self.setAreaSelected(self.sceneRect())
+        self.noteSelection.select(self.noteController.ids)
 
     @QtCore.pyqtSlot()
     def deselectAll(self):  # clearSelection/placeSelection
         if self.hasSelection():
             self._clearBlocksUnderSelection()
-            # TODO: Collision check takes too long
-            self.clearSelection()
-            self.updateSceneSize()
+            self.noteSelection.clear()
 
     @QtCore.pyqtSlot()
     def deselectAllManual(self):
@@ -745,22 +877,28 @@ class NoteBlockArea(QtWidgets.QGraphicsScene):
             self.deselectAll()
 
     def _clearBlocksUnderSelection(self):
-        for item in self.selectedItems():
-            for i in item.collidingItems():
-                self.removeBlock(i)
+        """Remove the unselected notes that are in the same place as a selected note."""
+        ids = self.noteController.ids
+        notes = self.noteController.notes
+        selected = self.noteSelection.contains(ids)
+        if not selected.any() or selected.all():
+            return
+        # Encode each position as a single integer to compare them at once
+        cells = notes.tick.astype(np.int64) << 32 | notes.layer.astype(np.int64)
+        under = ~selected & np.isin(cells, cells[selected])
+        self.noteController.removeNotes(ids[under])
 
     @QtCore.pyqtSlot()
     def invertSelection(self):
-        unselected = []
-        for block in self.items():
-            if not block.isSelected():
-                unselected.append(block)
-        self.deselectAll()
-        self.setBlocksSelected(unselected, True)
+        ids = self.noteController.ids
+        unselected = ids[~self.noteSelection.contains(ids)]
+        self._clearBlocksUnderSelection()
+        # Some of the unselected notes may have been under the selection
+        unselected = unselected[np.isin(unselected, self.noteController.ids)]
+        self.noteSelection.set(unselected)
 
     def moveSelection(self, x: int, y: int):
-        for block in self.selectedItems():
-            self._doMoveBlock(block, x, y)
+        self.noteController.moveNotes(self.selectedIds(), x, y)
 
     def setSelectionTopLeft(self, point: Union[QtCore.QPoint, QtCore.QPointF]):
         tl = self.selectionBoundingRect().topLeft()
@@ -769,51 +907,39 @@ class NoteBlockArea(QtWidgets.QGraphicsScene):
         self.moveSelection(offsetX, offsetY)
 
     @QtCore.pyqtSlot()
-    def selectAllLeft(self, pos: Optional[Union[QtCore.QPoint, QtCore.QPointF]] = None):
-        self.deselectAll()
+    def selectAllLeft(self, pos: Optional[float] = None):
+        """Select all blocks up to and including the tick at `pos`, in scene coordinates."""
         if pos is None:
             pos = self.menuClickPos.x()
-        height = self.height()
-        area = QtCore.QRectF(0, 0, pos, height)
-        self.setAreaSelected(area)
+        lastTick = math.floor(pos / BLOCK_SIZE)
+        self._clearBlocksUnderSelection()
+        self.noteSelection.set(self.getIdsInRange(lastTick=lastTick))
 
     @QtCore.pyqtSlot()
-    def selectAllRight(
-        self, pos: Optional[Union[QtCore.QPoint, QtCore.QPointF]] = None
-    ):
-        self.deselectAll()
+    def selectAllRight(self, pos: Optional[float] = None):
+        """Select all blocks from the tick at `pos`, in scene coordinates, onwards."""
         if pos is None:
             pos = self.menuClickPos.x()
-        width = self.width()
-        height = self.height()
-        area = QtCore.QRectF(pos, 0, width, height)
-        self.setAreaSelected(area)
+        firstTick = math.floor(pos / BLOCK_SIZE)
+        self._clearBlocksUnderSelection()
+        self.noteSelection.set(self.getIdsInRange(firstTick=firstTick))
 
+    @QtCore.pyqtSlot()
     def expandSelection(self):
-        bbox = self.selectionBoundingRect()
-        origin = bbox.topLeft()
-
-        for block in self.selectedItems():
-            relativePosX = int(block.x() - origin.x() // BLOCK_SIZE)
-            self._doMoveBlock(block, relativePosX, 0)
+        """Double the distance of the selected notes to the start of the selection."""
+        self.noteController.stretchNotes(self.selectedIds(), 2)
 
+    @QtCore.pyqtSlot()
     def compressSelection(self):
-        bbox = self.selectionBoundingRect()
-        origin = bbox.topLeft()
-
-        for block in self.selectedItems():
-            relativePosX = block.x() - origin.x()
-            distance = int((-relativePosX / 2) // BLOCK_SIZE)
-            self._doMoveBlock(block, distance, 0)
-
-        for block in self.selectedItems():
-            while block.collidingItems():
-                self._doMoveBlock(block, 0, 1)
+        """
+        Halve the distance of the selected notes to the start of the selection.
+        Notes that would overlap another note are moved down to the next free layer.
+        """
+        self.noteController.stretchNotes(self.selectedIds(), 0.5)
 
     @QtCore.pyqtSlot()
     def deleteSelection(self):
-        for block in self.selectedItems():
-            self.removeBlock(block)
+        self.noteController.removeNotes(self.selectedIds())
         self.updateSelectionStatus()
         self.updateSceneSize()
 
@@ -825,47 +951,56 @@ class NoteBlockArea(QtWidgets.QGraphicsScene):
 
     @QtCore.pyqtSlot(int)
     def changeSelectionInstrument(self, id_: int):
-        for block in self.selectedItems():
-            block.setInstrument(id_)
+        self.noteController.setNoteValues(self.selectedIds(), "instrument", id_)
+
+    def transposeBlocks(self, blocks: Sequence[NoteBlock], steps: int) -> None:
+        self.noteController.transposeNotes(self.getBlockIds(blocks), steps)
+
+    @QtCore.pyqtSlot(int)
+    def transposeSelection(self, steps: int) -> None:
+        self.noteController.transposeNotes(self.selectedIds(), steps)
 
     ########## CLIPBOARD ##########
 
-    def getSelectionData(self) -> Generator[Note, None, None]:
-        origin = self.selectionBoundingRect().topLeft()
-        for block in self.selectedItems():
-            if isinstance(block, NoteBlock):
-                note = copy(block.note)
-                note.tick = int(block.x() - origin.x()) // BLOCK_SIZE
-                note.layer = int(block.y() - origin.y()) // BLOCK_SIZE
-                yield note
+    def getSelectionData(self) -> NoteStore:
+        """Return the selected notes, relative to the top left corner of the selection."""
+        notes = self.noteController.getNotes(self.selectedIds())
+        if len(notes) > 0:
+            notes.writeable_column("tick")[:] -= notes.tick.min()
+            notes.writeable_column("layer")[:] -= notes.layer.min()
+        return notes
 
     @QtCore.pyqtSlot()
-    def loadSelection(self, notes: List[Note]) -> None:
-        for note in notes:
-            block = self.addBlock(note.tick, note.layer, note)
-            block.setSelected(True)
-        self.updateBlockCount()
-        self.updateSelectionStatus()
-        self.selectionChanged_.emit(self.selectionStatus)
+    def loadSelection(self, notes: NoteStore) -> None:
+        """Add `notes` to the song, and select them."""
+        ids = self.noteController.addNotes(notes)
+        self.noteSelection.select(ids)
 
     @QtCore.pyqtSlot()
     def copySelection(self):
-        self.selectionCopied.emit(list(self.getSelectionData()))
+        self.selectionCopied.emit(self.getSelectionData())
 
     @QtCore.pyqtSlot()
     def cutSelection(self):
         self.copySelection()
         self.deleteSelection()
 
-    @QtCore.pyqtSlot(list)
-    def pasteSelection(self, notes: List[Note]):
-        self.deselectAll()
-        self.loadSelection(notes)
-        self.retrieveSelection()
+    @QtCore.pyqtSlot(object)
+    def pasteSelection(self, notes: NoteStore):
+        if len(notes) == 0:
+            return
+        x, y = self.getGridPos(self.getPastePosition())
+        notes = notes.copy()
+        notes.writeable_column("tick")[:] += int(x) - notes.tick.min()
+        notes.writeable_column("layer")[:] += int(y) - notes.layer.min()
+        with self.noteController.transaction("Paste"):
+            self._clearBlocksUnderSelection()
+            ids = self.noteController.addNotes(notes)
+        self.noteSelection.set(ids)
 
-    def retrieveSelection(self):
-        # If the mouse cursor is over the scene, move the selection to the cursor.
-        # Otherwise, move the selection to the top left corner of the view.
+    def getPastePosition(self) -> QtCore.QPointF:
+        # If the mouse cursor is over the scene, paste the selection at the cursor.
+        # Otherwise, paste the selection at the top left corner of the view.
 
         cursorPosition = self.view.mapFromGlobal(QtGui.QCursor.pos())
 
@@ -884,7 +1019,7 @@ class NoteBlockArea(QtWidgets.QGraphicsScene):
             viewTopLeftCorner = self.view.mapToScene(BLOCK_SIZE - 1, BLOCK_SIZE - 1)
             selectionPos = viewTopLeftCorner
 
-        self.setSelectionTopLeft(selectionPos)
+        return selectionPos
 
     ########## LAYERS ##########
 
@@ -907,6 +1042,15 @@ class NoteBlockArea(QtWidgets.QGraphicsScene):
             self.minimumLayerCount = count
             self.updateSceneSize()
 
+    def setMinimumSongLength(self, ticks: int) -> None:
+        """
+        Set the minimum number of ticks that can be scrolled to, e.g. to reach the
+        end of a song whose notes haven't all been loaded yet.
+        """
+        if ticks != self.minimumSongLength:
+            self.minimumSongLength = ticks
+            self.updateSceneSize()
+
     def _getLayerLockedCheck(self) -> Callable[[Layer], bool]:
         """Returns a function that checks if a layer is locked according to the scene's
         current solo state."""
@@ -932,14 +1076,10 @@ class NoteBlockArea(QtWidgets.QGraphicsScene):
         return region
 
     def getBlocksInLayer(self, id: int) -> List[NoteBlock]:
-        layerRegion = self.getLayerRegion(id)
-        blocks = self.items(layerRegion)
-        return blocks
+        return list(self.layerIndex.at(id))
 
     def getBlocksBelowLayer(self, id: int) -> List[NoteBlock]:
-        region = self.getRegionBelowLayer(id)
-        blocks = self.items(region)
-        return blocks
+        return self.layerIndex.range(id, None)
 
     @QtCore.pyqtSlot(int, bool)
     def setLayerLock(self, id: int, lock: bool) -> None:
@@ -956,69 +1096,76 @@ class NoteBlockArea(QtWidgets.QGraphicsScene):
                 pass
         self.update()
 
-    @QtCore.pyqtSlot(int)
-    def addLayer(self, id: int):
-        blocksToShift = self.getBlocksBelowLayer(id)
-        for block in blocksToShift:
-            self._doMoveBlock(block, 0, 1)
-        self.updateSceneSize()
+    # The notes in the affected layers are moved by the note controller when
+    # layers are added, removed or swapped.
 
     @QtCore.pyqtSlot(int)
     def removeLayer(self, id: int):
         # Update the solo status before removing the layer
         if id in self.soloLayerIds:
             self.soloLayerIds.remove(id)
-        for block in self.getBlocksInLayer(id):
-            self.removeBlock(block)
-        blocksToShift = self.getBlocksBelowLayer(id)
-        for block in blocksToShift:
-            self._doMoveBlock(block, 0, -1)
-        self.updateSceneSize()
+        self.update()
 
     @QtCore.pyqtSlot(int)
     def selectAllInLayer(self, id: int, clearPrevious: bool = True):
+        ids = self.getIdsInRange(firstLayer=id, lastLayer=id)
         if clearPrevious:
-            self.deselectAll()
-        self.setAreaSelected(self.getLayerRegion(id))
-
-    @QtCore.pyqtSlot(int, int)
-    def swapLayers(self, id1: int, id2: int):
-        id1, id2 = min(id1, id2), max(id1, id2)
-
-        blocks1 = self.getBlocksInLayer(id1)
-        blocks2 = self.getBlocksInLayer(id2)
-
-        origin1 = self.getLayerRegion(id1).topLeft().y()
-        origin2 = self.getLayerRegion(id2).topLeft().y()
-        distance = int(abs(origin2 - origin1) // BLOCK_SIZE)
-
-        for block in blocks1:
-            self._doMoveBlock(block, 0, distance)
-        for block in blocks2:
-            self._doMoveBlock(block, 0, distance)
+            self._clearBlocksUnderSelection()
+            self.noteSelection.set(ids)
+        else:
+            self.noteSelection.select(ids)
 
     ########## PLAYBACK ##########
 
     @QtCore.pyqtSlot(float)
     def doPlayback(self, currentPlaybackPosition: float):
-        if math.floor(self.previousPlaybackPosition) != math.floor(
-            currentPlaybackPosition
-        ):
-            self.playTick(math.floor(currentPlaybackPosition))
+        previousTick = math.floor(self.previousPlaybackPosition)
+        currentTick = math.floor(currentPlaybackPosition)
+        if 1 < currentTick - previousTick <= PLAYBACK_CATCH_UP_TICKS:
+            # Play the ticks that were skipped since the last update
+            blocks = self.getBlocksInTickRange(previousTick + 1, currentTick + 1)
+            if blocks:
+                self.playBlocks(blocks)
+        elif currentTick != previousTick:
+            self.playTick(currentTick)
         self.previousPlaybackPosition = currentPlaybackPosition
 
-    def getBlocksInTick(self, tick: int) -> List[NoteBlock]:
-        return self.tickIndex.get(tick) or []
+    def getBlocksInTick(self, tick: int) -> Sequence[NoteBlock]:
+        return self.tickIndex.at(tick)
+
+    def getBlocksInTickRange(self, start: int, stop: int) -> List[NoteBlock]:
+        """Return the blocks in the ticks from `start` (inclusive) to `stop` (exclusive)."""
+        return self.tickIndex.range(start, stop)
+
+    def nextNoteTick(self, tick: float) -> Optional[int]:
+        """Return the first tick after `tick` that contains a note, if any."""
+        return self.tickIndex.next_key(math.floor(tick))
+
+    def previousNoteTick(self, tick: float) -> Optional[int]:
+        """Return the last tick before `tick` that contains a note, if any."""
+        return self.tickIndex.previous_key(math.ceil(tick))
+
+    @QtCore.pyqtSlot()
+    def jumpToNextNote(self) -> None:
+        tick = self.nextNoteTick(self.previousPlaybackPosition)
+        if tick is not None:
+            self.view.playbackPositionChanged.emit(tick)
+
+    @QtCore.pyqtSlot()
+    def jumpToPreviousNote(self) -> None:
+        tick = self.previousNoteTick(self.previousPlaybackPosition)
+        if tick is not None:
+            self.view.playbackPositionChanged.emit(tick)
 
     def playBlocks(self, blocks: Sequence[NoteBlock]) -> None:
         # TODO: business logic should be in a controller
         payload = []
         lockedCheck = self._getLayerLockedCheck()
-        for block in blocks:
-            layer = self.layers[int(block.y() // BLOCK_SIZE)]
+        notes = self.noteController.getNotes(self.getBlockIds(blocks))
+        for block, note in zip(blocks, notes):
+            layer = self.layers[block.layer]
             if lockedCheck(layer):
                 continue
-            note = block.note
             instrument = note.instrument
             key = note.key + note.pitch / 100
             volume = (note.velocity / 100) * (layer.volume / 100)
@@ -1061,10 +1208,21 @@ class NoteBlockArea(QtWidgets.QGraphicsScene):
         if event.button() == QtCore.Qt.RightButton:
             self.selection.setStyleSheet("selection-background-color: rgb(255, 0, 0);")
         elif event.button() == QtCore.Qt.LeftButton:
-            clickedItem = self.itemAt(event.scenePos(), QtGui.QTransform())
-            if clickedItem is not None and clickedItem.isSelected():
+            x, y = self.getGridPos(event.scenePos())
+            clickedItem = next(
+                (b for b in self.blocksAt(int(x), int(y)) if self.isBlockSelected(b)),
+                None,
+            )
+            if clickedItem is not None:
                 self.isMovingBlocks = True
                 self.movedItem = clickedItem
+                self.movedBlocks = self.selectedBlocks()
+                self.moveOrigin = (clickedItem.tick, clickedItem.layer)
+                bbox = self.selectionBoundingRect()
+                self.moveBounds = (
+                    int(bbox.left() // BLOCK_SIZE),
+                    int(bbox.top() // BLOCK_SIZE),
+                )
             else:
                 if (
                     not QtGui.QGuiApplication.keyboardModifiers()
@@ -1083,11 +1241,10 @@ class NoteBlockArea(QtWidgets.QGraphicsScene):
                 self.selection.geometry()
             ).boundingRect()
             # TODO: Update selection as the selection box is dragged
-            unlockedArea = self.getSelectableArea(selectionArea)
             if event.button() == QtCore.Qt.LeftButton:
-                self.setAreaSelected(unlockedArea, True)
+                self.setAreaSelected(selectionArea, True, skipLocked=True)
             elif event.button() == QtCore.Qt.RightButton:
-                self.setAreaSelected(unlockedArea, False)
+                self.setAreaSelected(selectionArea, False, skipLocked=True)
             self.selection.hide()
             self.selection.setGeometry(0, 0, 0, 0)
             self.isDraggingSelection = False
@@ -1095,18 +1252,31 @@ class NoteBlockArea(QtWidgets.QGraphicsScene):
             self.isClearingSelection = False
         elif self.isMovingBlocks:
             self.isMovingBlocks = False
+            self.applySelectionMove()
         else:
             clickPos = event.scenePos()
             x, y = (round(i) for i in self.getGridPos(clickPos))
             if event.button() == QtCore.Qt.LeftButton:
-                self.removeBlockManual(x, y)
-                self.addBlockManual(x, y, self.activeKey, self.currentInstrument)
+                with self.noteController.transaction("Place note"):
+                    self.removeBlockManual(x, y)
+                    self.addBlockManual(x, y, self.activeKey, self.currentInstrument)
             elif event.button() == QtCore.Qt.RightButton:
                 if not self.hasSelection():  # Should open the menu otherwise
-                    if self.blockAtPos(event.pos()) is not None:
+                    if self.blockAt(x, y) is not None:
                         self.removeBlockManual(x, y)
                         self.isRemovingNote = True
 
+    def applySelectionMove(self) -> None:
+        """
+        Move the selected notes by the distance the selection was dragged by. While
+        dragging, only the note blocks are moved, so that the move is applied (and
+        recorded in the history) as a single step.
+        """
+        ticks = self.movedItem.tick - self.moveOrigin[0]
+        layers = self.movedItem.layer - self.moveOrigin[1]
+        if ticks != 0 or layers != 0:
+            self.noteController.moveNotes(self.selectedIds(), ticks, layers)
+
     def mouseMoveEvent(self, event):
         # Auto-scroll when dragging/moving near the edges
         # TODO: Scroll speed slows down as you move the mouse outside the scene.
@@ -1133,16 +1303,18 @@ class NoteBlockArea(QtWidgets.QGraphicsScene):
             origy = self.movedItem.y()
             dx = x - origx
             dy = y - origy
-            movex = dx
-            movey = dy
-            if any(item.x() + dx < 0 for item in self.selectedItems()):
+            movex = int(dx // BLOCK_SIZE)
+            movey = int(dy // BLOCK_SIZE)
+            # Don't move the selection past the top or left edges of the scene
+            firstTick = self.moveBounds[0] + self.movedItem.tick - self.moveOrigin[0]
+            firstLayer = self.moveBounds[1] + self.movedItem.layer - self.moveOrigin[1]
+            if firstTick + movex < 0:
                 movex = 0
-            if any(item.y() + dy < 0 for item in self.selectedItems()):
+            if firstLayer + movey < 0:
                 movey = 0
-            for item in self.selectedItems():
-                self._doMoveBlock(
-                    item, int(movex // BLOCK_SIZE), int(movey // BLOCK_SIZE)
-                )
+            if movex != 0 or movey != 0:
+                for item in self.movedBlocks:
+                    self._doMoveBlock(item, movex, movey)
         elif (
             event.buttons() == QtCore.Qt.LeftButton
             or event.buttons() == QtCore.Qt.RightButton
@@ -1205,7 +1377,53 @@ class OpacityAnimation(QtCore.QVariantAnimation):
                 nb.alpha = self.currentValue()
             self.scene.update(math.floor(x), math.floor(y), BLOCK_SIZE, math.ceil(maxY - y + BLOCK_SIZE))
         
+class NoteBlockStyle:
+    """
+    The rendering data of a note block, which only depends on its instrument and
+    key. Styles are shared by all note blocks with the same instrument and key
+    (see `get()`), so a note block doesn't hold any of this data itself.
+    """
+
+    __slots__ = ("instrument", "key", "label", "clicks", "overlayColor", "cacheKey")
+
+    # TODO: set from the instrument's valid range
+    isOutOfRange = False
+
+    _styles: Dict[Tuple[int, int], NoteBlockStyle] = {}
+
+    def __init__(self, instrument: int, key: int):
+        self.instrument = instrument
+        self.key = key
+        octave, keyIndex = divmod(key + 9, 12)
+        self.label = KEY_LABELS[keyIndex] + str(octave)
+        # TODO: replace hardcoded values with the note instrument's valid range
+        if key < 33:
+            self.clicks = "<"
+        elif key > 57:
+            self.clicks = ">"
+        else:
+            self.clicks = str(key - 33)
+        self.overlayColor = QtGui.QColor(
+            *instrument_data[min(instrument, 15)].color
+        )
+        self.cacheKey = f"note_{instrument}_{key}"
+
+    @classmethod
+    def get(cls, instrument: int, key: int) -> NoteBlockStyle:
+        """Return the shared style for an instrument and key."""
+        style = cls._styles.get((instrument, key))
+        if style is None:
+            style = cls._styles[(instrument, key)] = cls(instrument, key)
+        return style
+
+
 class NoteBlock(QtWidgets.QGraphicsItem):
+    """
+    The graphical representation of a note. Note blocks only hold the ID of the
+    note they show and a reference to a shared `NoteBlockStyle`; the note data
+    itself is kept by the `NoteController`.
+    """
+
     # Geometry
     RECT = QtCore.QRectF(0, 0, BLOCK_SIZE, BLOCK_SIZE)
     TOP_RECT = QtCore.QRect(0, 0, BLOCK_SIZE, BLOCK_SIZE // 2)
@@ -1214,6 +1432,7 @@ class NoteBlock(QtWidgets.QGraphicsItem):
     # Colors
     LABEL_COLOR = QtCore.Qt.yellow
     NUMBER_COLOR = QtCore.Qt.white
+    SELECTED_COLOR = QtGui.QColor(255, 255, 255, 180)
 
     # Font
     FONT = QtGui.QFont()
@@ -1221,17 +1440,10 @@ class NoteBlock(QtWidgets.QGraphicsItem):
 
     def __init__(self, note: Note, parent: Optional[QtWidgets.QGraphicsItem] = None):
         super().__init__(parent)
-        self.note = note
-        self.overlayColor = QtGui.QColor(
-            *instrument_data[min(note.instrument, 15)].color
-        )
-        self.label = self.getLabel()
-        self.clicks = self.getClicks()
-        self.isOutOfRange = False
-        self.selected = False
-        self.setAcceptHoverEvents(True)
-        self.setFlag(QtWidgets.QGraphicsItem.ItemIsSelectable, True)
+        self.id = -1
+        self.style = NoteBlockStyle.get(note.instrument, note.key)
         self.alpha = 1.0
+        self.setAcceptHoverEvents(True)
 
         # Update initial opacity based on hover status
         self.hoverCheck()
@@ -1244,14 +1456,13 @@ class NoteBlock(QtWidgets.QGraphicsItem):
     def layer(self) -> int:
         return int(self.y() // BLOCK_SIZE)
 
-    def moveBy(self, dx: float, dy: float) -> None:
-        """
-        Move the note block to the specified position. This method overrides
-        `QGraphicsItem.moveBy` so that the internal `Note` object is kept up-to-date.
-        """
-        super().moveBy(dx, dy)
-        self.note.tick = int(self.x() // BLOCK_SIZE)
-        self.note.layer = int(self.y() // BLOCK_SIZE)
+    @property
+    def instrument(self) -> int:
+        return self.style.instrument
+
+    @property
+    def key(self) -> int:
+        return self.style.key
 
     def boundingRect(self):
         return self.RECT
@@ -1264,33 +1475,33 @@ class NoteBlock(QtWidgets.QGraphicsItem):
         painter.setOpacity(self.alpha)
         painter.drawPixmap(0, 0, pixmap)
 
-        selectedColor = QtGui.QColor(255, 255, 255, 180)
-        if self.isSelected():
+        if self.id in self.scene().noteSelection:
             painter.setPen(QtCore.Qt.NoPen)
-            painter.setBrush(selectedColor)
+            painter.setBrush(self.SELECTED_COLOR)
             painter.drawRect(self.RECT)
 
     def getPixmap(self) -> QtGui.QPixmap:
+        style = self.style
         pixmap = QtGui.QPixmap(BLOCK_SIZE, BLOCK_SIZE)
         painter = QtGui.QPainter(pixmap)
 
         rect = self.RECT.toAlignedRect()
         painter.drawPixmap(rect, NOTE_BLOCK_PIXMAP)
         painter.setPen(QtCore.Qt.NoPen)
-        painter.setBrush(QtGui.QBrush(self.overlayColor, QtCore.Qt.SolidPattern))
+        painter.setBrush(QtGui.QBrush(style.overlayColor, QtCore.Qt.SolidPattern))
         painter.setCompositionMode(QtGui.QPainter.CompositionMode_Overlay)
         painter.drawRect(rect)
         painter.setCompositionMode(QtGui.QPainter.CompositionMode_SourceOver)
         painter.setFont(self.FONT)
         painter.setPen(self.LABEL_COLOR)
         painter.drawText(
-            self.TOP_RECT, QtCore.Qt.AlignHCenter + QtCore.Qt.AlignBottom, self.label
+            self.TOP_RECT, QtCore.Qt.AlignHCenter + QtCore.Qt.AlignBottom, style.label
         )
         painter.setPen(self.NUMBER_COLOR)
         painter.drawText(
-            self.BOTTOM_RECT, QtCore.Qt.AlignHCenter + QtCore.Qt.AlignTop, self.clicks
+            self.BOTTOM_RECT, QtCore.Qt.AlignHCenter + QtCore.Qt.AlignTop, style.clicks
         )
-        if self.isOutOfRange:
+        if style.isOutOfRange:
             painter.setPen(QtCore.Qt.red)
             painter.setBrush(QtCore.Qt.NoBrush)
             painter.drawRect(rect)
@@ -1303,7 +1514,7 @@ class NoteBlock(QtWidgets.QGraphicsItem):
 
     @property
     def cacheKey(self) -> str:
-        return f"note_{self.note.instrument}_{self.note.key}"
+        return self.style.cacheKey
 
     def setAlpha(self, value: float):
         self.alpha = value
@@ -1329,36 +1540,12 @@ class NoteBlock(QtWidgets.QGraphicsItem):
         self.setOpacity(BLOCK_GLOW_BASE_OPACITY)
 
     def wheelEvent(self, event):
-        if event.delta() > 0:
-            self.changeKey(1)
-        else:
-            self.changeKey(-1)
-
-    def changeKey(self, steps):
-        self.note.key += steps
-        self.refresh()
-
-    def refresh(self):
-        self.label = self.getLabel()
-        self.clicks = self.getClicks()
-        self.update()
-
-    def getLabel(self):
-        octave, key = divmod(self.note.key + 9, 12)
-        label = KEY_LABELS[key] + str(octave)
-        return label
-
-    def getClicks(self):
-        # TODO: replace hardcoded values with the note instrument's valid range
-        if self.note.key < 33:
-            return "<"
-        elif self.note.key > 57:
-            return ">"
-        else:
-            return str(self.note.key - 33)
-
-    def setInstrument(self, id_: int):
-        self.note.instrument = id_
-        instrument = instrument_data[id_]
-        self.overlayColor = QtGui.QColor(*instrument.color)
-        self.update()
+        steps = 1 if event.delta() > 0 else -1
+        self.scene().transposeBlocks([self], steps)
+
+    def setNote(self, note: Note) -> None:
+        """Show `note` in this note block. Its position isn't changed."""
+        style = NoteBlockStyle.get(note.instrument, note.key)
+        if style is not self.style:
+            self.style = style
+            self.update()
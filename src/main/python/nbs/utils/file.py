@@ -1,7 +1,10 @@
 import os
+import secrets
 import shutil
+import stat
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Union
+from typing import Any, BinaryIO, Iterator, Union
 
 # See: https://stackoverflow.com/a/59313490/9045426
 PathLike = Union[str, bytes, os.PathLike[Any]]
@@ -14,3 +17,44 @@ def copy_file(src: PathLike, dst: PathLike) -> Path:
     """
     os.makedirs(os.path.dirname(src), exist_ok=True)
     return shutil.copy(src, dst)
+
+
+@contextmanager
+def atomic_write(path: PathLike) -> Iterator[BinaryIO]:
+    """
+    Open a temporary file to write the new contents of the file at `path`. When the
+    context exits, the temporary file is flushed to disk and renamed over `path`,
+    so `path` always holds either its previous contents or the new ones, even if
+    the program crashes while writing. If an exception is raised, `path` is left
+    untouched.
+    """
+    path = os.path.abspath(os.fsdecode(path))
+    directory, name = os.path.split(path)
+    temp_path = os.path.join(directory, f".{name}.{secrets.token_hex(4)}.tmp")
+    try:
+        with open(temp_path, "xb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.chmod(temp_path, stat.S_IMODE(os.stat(path).st_mode))
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    _sync_directory(directory)
+
+
+def _sync_directory(path: str) -> None:
+    """Flush a rename in the directory at `path` to disk, where supported."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass  # Not supported for directories on some platforms (e.g. Windows)
+    finally:
+        os.close(fd)
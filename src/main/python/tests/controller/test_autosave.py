@@ -0,0 +1,82 @@
+from pathlib import Path
+
+import numpy as np
+from PyQt5 import QtCore
+from tests.controller.test_song import make_song_controller
+
+from nbs.controller.autosave import AutosaveController
+from nbs.core.data import Layer, NoteStore, Song, SongHeader
+from nbs.core.history import History
+from nbs.core.journal import read_journal
+
+
+def test_autosave_records_edits(tmp_path: Path) -> None:
+    path = tmp_path / "autosave.journal"
+    history = History()
+    songController = make_song_controller(history)
+    notes = NoteStore.from_arrays(tick=np.arange(10), layer=0, instrument=0, key=45)
+    songController.loadSong(Song(SongHeader(), notes, [Layer(), Layer()], []))
+    controller = AutosaveController(songController, path)
+    controller.start()
+    # Songs are recorded once they're fully loaded
+    songController.finishLoad()
+
+    noteController = songController.noteController
+    noteController.moveNotes(np.array([0, 1]), 20, 1)
+    noteController.removeNotes(np.array([5]))
+    noteController.addNotes(
+        NoteStore.from_arrays(tick=3, layer=1, instrument=0, key=60)
+    )
+    history.undo()
+    songController.layerController.setLayerName(1, "Bass")
+    QtCore.QCoreApplication.processEvents()
+    controller.journal.flush()
+
+    recovered = read_journal(path)
+    assert recovered.notes == noteController.notes
+    assert recovered.layers[1].name == "Bass"
+
+    controller.stop()
+    assert not path.exists()
+
+
+def test_autosave_compacts_journal(tmp_path: Path) -> None:
+    path = tmp_path / "autosave.journal"
+    songController = make_song_controller(History())
+    controller = AutosaveController(songController, path, compactSize=1000)
+    controller.start()
+    noteController = songController.noteController
+    for tick in range(100):
+        noteController.addNotes(
+            NoteStore.from_arrays(tick=tick, layer=0, instrument=0, key=45)
+        )
+    assert controller.journal.size < 1000
+    controller.journal.flush()
+    assert read_journal(path).notes == noteController.notes
+    controller.stop()
+
+
+def test_autosave_reports_errors(tmp_path: Path) -> None:
+    path = tmp_path / "missing" / "autosave.journal"
+    songController = make_song_controller(History())
+    controller = AutosaveController(songController, path)
+    errors = []
+    controller.autosaveFailed.connect(errors.append)
+    controller.start()
+    controller.journal.flush()
+    controller.checkJournal()
+    controller.checkJournal()
+    assert len(errors) == 1
+
+    # The journal is written again once a new snapshot can be
+    path.parent.mkdir()
+    noteController = songController.noteController
+    noteController.addNotes(
+        NoteStore.from_arrays(tick=0, layer=0, instrument=0, key=45)
+    )
+    controller.checkJournal()
+    controller.journal.flush()
+    controller.checkJournal()
+    assert not controller.failed
+    assert read_journal(path).notes == noteController.notes
+    controller.stop()
@@ -0,0 +1,23 @@
+from nbs.controller.instrument import InstrumentController
+from nbs.core.data import default_instruments
+
+
+def test_remove_instrument() -> None:
+    controller = InstrumentController([*default_instruments])
+    removed = []
+    refused = []
+    controller.instrumentRemoved.connect(removed.append)
+    controller.instrumentRemoveRefused.connect(refused.append)
+    controller.createInstrument()
+    custom = len(default_instruments)
+
+    # Instruments used by note blocks are kept
+    controller.setBlockCount(custom, 3)
+    controller.removeInstrument(custom)
+    assert (removed, refused) == ([], [custom])
+    assert len(controller.instruments) == custom + 1
+
+    controller.setBlockCount(custom, 0)
+    controller.removeInstrument(custom)
+    assert (removed, refused) == ([custom], [custom])
+    assert len(controller.instruments) == custom
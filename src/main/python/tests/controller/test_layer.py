@@ -102,3 +102,24 @@ def testSwapLayerToSamePosition(layerController: LayerController) -> None:
 def testReadNonExistingLayer(layerController: LayerController) -> None:
     with pytest.raises(IndexError):
         layerController.layers[3]
+
+
+def testUndoRemoveLayer(layerController: LayerController) -> None:
+    layerController.removeLayer(0)
+    layerController.history.undo()
+    assert [layer.name for layer in layerController.layers] == ["Layer 1", "Layer 2"]
+    layerController.history.redo()
+    assert [layer.name for layer in layerController.layers] == ["Layer 2"]
+
+
+def testUndoInsertLayer(layerController: LayerController) -> None:
+    layerController.addLayer(1)
+    layerController.history.undo()
+    assert [layer.name for layer in layerController.layers] == ["Layer 1", "Layer 2"]
+
+
+def testUndoSwapLayer(layerController: LayerController) -> None:
+    layerController.swapLayers(0, 1)
+    layerController.history.undo()
+    assert layerController.layers[0].name == "Layer 1"
+    assert layerController.layers[1].name == "Layer 2"
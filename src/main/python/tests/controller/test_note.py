@@ -0,0 +1,274 @@
+from typing import List
+
+import numpy as np
+import pytest
+
+from nbs.controller.note import NoteChange, NoteController, _cells, _stackNotes
+from nbs.core.data import NoteStore
+from nbs.core.history import History
+
+
+@pytest.fixture
+def history() -> History:
+    return History()
+
+
+@pytest.fixture
+def controller(history: History) -> NoteController:
+    notes = NoteStore.from_arrays(
+        tick=[0, 4, 8, 12], layer=[0, 1, 2, 1], key=[45, 46, 47, 48], instrument=0
+    )
+    return NoteController(notes, history)
+
+
+@pytest.fixture
+def changes(controller: NoteController) -> List[NoteChange]:
+    changes: List[NoteChange] = []
+    controller.notesChanged.connect(changes.append)
+    return changes
+
+
+def test_load(controller: NoteController, changes: List[NoteChange]) -> None:
+    controller.load(NoteStore.from_arrays(tick=[1, 2], layer=0, instrument=0, key=45))
+    assert len(controller) == 2
+    assert controller.ids.tolist() == [0, 1]
+    assert len(changes) == 1
+    assert changes[0].reset
+    assert changes[0].added.tolist() == [0, 1]
+
+
+def test_load_is_not_recorded(controller: NoteController, history: History) -> None:
+    assert not history.can_undo
+
+
+def test_add_notes(
+    controller: NoteController, changes: List[NoteChange], history: History
+) -> None:
+    ids = controller.addNotes(
+        NoteStore.from_arrays(tick=[16, 20], layer=3, instrument=0, key=45)
+    )
+    assert ids.tolist() == [4, 5]
+    assert controller.getNotes(ids).tick.tolist() == [16, 20]
+    assert changes[-1].added.tolist() == [4, 5]
+
+    history.undo()
+    assert len(controller) == 4
+    assert changes[-1].removed.tolist() == [4, 5]
+    history.redo()
+    assert controller.getNotes(ids).tick.tolist() == [16, 20]
+
+
+def test_remove_notes(
+    controller: NoteController, changes: List[NoteChange], history: History
+) -> None:
+    controller.removeNotes(np.array([1, 2]))
+    assert controller.ids.tolist() == [0, 3]
+    assert changes[-1].removed.tolist() == [1, 2]
+    assert changes[-1].removedNotes.tick.tolist() == [4, 8]
+    with pytest.raises(KeyError):
+        controller.getRows(np.array([1]))
+
+    # Removed notes are restored with the same IDs, in order
+    history.undo()
+    assert controller.ids.tolist() == [0, 1, 2, 3]
+    assert controller.notes.tick.tolist() == [0, 4, 8, 12]
+    assert changes[-1].added.tolist() == [1, 2]
+
+
+def test_move_notes(
+    controller: NoteController, changes: List[NoteChange], history: History
+) -> None:
+    controller.moveNotes(np.array([0, 3]), np.array([2, 4]), 1)
+    assert controller.getNotes(np.array([0, 3])).tick.tolist() == [2, 16]
+    assert controller.getNotes(np.array([0, 3])).layer.tolist() == [1, 2]
+    assert changes[-1].modified.tolist() == [0, 3]
+    assert changes[-1].fields == {"tick", "layer"}
+
+    history.undo()
+    assert controller.notes.tick.tolist() == [0, 4, 8, 12]
+    assert controller.notes.layer.tolist() == [0, 1, 2, 1]
+
+
+def test_move_notes_stop_at_start(controller: NoteController, history: History) -> None:
+    # The notes keep their spacing, and the first one stops at tick and layer 0
+    controller.moveNotes(np.array([0, 1]), -3, np.array([-1, -2]))
+    assert controller.getNotes(np.array([0, 1])).tick.tolist() == [0, 4]
+    assert controller.getNotes(np.array([0, 1])).layer.tolist() == [0, 0]
+    assert controller.stats.first_tick == 0
+    assert controller.stats.polyphony(13) == 0
+
+    history.undo()
+    assert controller.notes.tick.tolist() == [0, 4, 8, 12]
+    assert controller.notes.layer.tolist() == [0, 1, 2, 1]
+
+
+def test_set_note_values(
+    controller: NoteController, changes: List[NoteChange], history: History
+) -> None:
+    controller.setNoteValues(np.array([1, 2]), "instrument", 5)
+    controller.transposeNotes(np.array([0]), 12)
+    assert controller.notes.instrument.tolist() == [0, 5, 5, 0]
+    assert controller.notes.key[0] == 57
+    assert changes[-2].fields == {"instrument"}
+    assert changes[-1].fields == {"key"}
+
+    history.undo()
+    history.undo()
+    assert controller.notes.instrument.tolist() == [0, 0, 0, 0]
+    assert controller.notes.key[0] == 45
+
+
+def test_transaction(
+    controller: NoteController, changes: List[NoteChange], history: History
+) -> None:
+    with controller.transaction("Edit"):
+        ids = controller.addNotes(
+            NoteStore.from_arrays(tick=16, layer=0, instrument=0, key=45)
+        )
+        controller.moveNotes(ids, 4, 0)
+        controller.moveNotes(np.array([0]), 1, 0)
+        controller.removeNotes(np.array([1]))
+    # A single notification, and a single step in the history
+    assert len(changes) == 1
+    assert changes[0].added.tolist() == [4]
+    assert changes[0].removed.tolist() == [1]
+    assert changes[0].modified.tolist() == [0]
+    assert history.undo_description == "Edit"
+
+    history.undo()
+    assert controller.notes.tick.tolist() == [0, 4, 8, 12]
+    assert not history.can_undo
+
+
+def test_remove_and_add_in_transaction(
+    controller: NoteController, changes: List[NoteChange]
+) -> None:
+    with controller.transaction():
+        notes = controller.getNotes(np.array([2]))
+        controller.removeNotes(np.array([2]))
+        controller.addNotes(notes, np.array([2]))
+    assert changes[0].modified.tolist() == [2]
+    assert len(changes[0].added) == 0
+    assert len(changes[0].removed) == 0
+
+
+def test_remove_and_add_changed_note(
+    controller: NoteController, changes: List[NoteChange]
+) -> None:
+    with controller.transaction():
+        notes = controller.getNotes(np.array([2]))
+        notes.writeable_column("key")[:] = 60
+        controller.removeNotes(np.array([2]))
+        controller.addNotes(notes, np.array([2]))
+    assert changes[0].modified.tolist() == [2]
+    assert "key" in changes[0].fields
+
+
+def test_place_notes(controller: NoteController, history: History) -> None:
+    # Both notes land on the note at (4, 1), and are stacked below it
+    controller.placeNotes(np.array([0, 2]), 4, 1)
+    assert controller.getNotes(np.array([0, 2])).tick.tolist() == [4, 4]
+    assert controller.getNotes(np.array([0, 2])).layer.tolist() == [2, 3]
+    history.undo()
+    assert controller.notes.tick.tolist() == [0, 4, 8, 12]
+    assert controller.notes.layer.tolist() == [0, 1, 2, 1]
+
+
+def test_stretch_notes(controller: NoteController) -> None:
+    controller.stretchNotes(np.array([1, 2, 3]), 2)
+    assert controller.notes.tick.tolist() == [0, 4, 12, 20]
+    controller.stretchNotes(controller.ids, 0.25)
+    assert controller.notes.tick.tolist() == [0, 1, 3, 5]
+    assert controller.notes.layer.tolist() == [0, 1, 2, 1]
+
+
+def test_compress_notes_stacks_overlapping() -> None:
+    notes = NoteStore.from_arrays(
+        tick=[0, 1, 2, 3, 1], layer=[0, 0, 0, 0, 1], instrument=0, key=45
+    )
+    controller = NoteController(notes)
+    controller.stretchNotes(np.arange(4), 0.5)
+    assert controller.notes.tick.tolist() == [0, 0, 1, 1, 1]
+    # (1, 1) is taken by the note that wasn't compressed
+    assert controller.notes.layer.tolist() == [0, 1, 0, 2, 1]
+
+
+def test_stack_notes_matches_sequential() -> None:
+    rng = np.random.default_rng(0)
+    ticks = rng.integers(0, 20, 500)
+    layers = rng.integers(0, 10, 500)
+    occupied = _cells(rng.integers(0, 20, 100), rng.integers(0, 10, 100))
+    result = _stackNotes(ticks, layers, occupied)
+
+    # Place the notes one by one, from the top of each tick down
+    taken = set(occupied.tolist())
+    expected = np.zeros(len(ticks), np.int64)
+    for i in np.lexsort((layers, ticks)):
+        layer = layers[i]
+        while int(_cells(ticks[i], layer)) in taken:
+            layer += 1
+        taken.add(int(_cells(ticks[i], layer)))
+        expected[i] = layer
+    assert result.tolist() == expected.tolist()
+
+
+def test_change_note_values(controller: NoteController, history: History) -> None:
+    controller.changeNoteValues(np.array([0, 1]), "velocity", -150)
+    controller.changeNoteValues(np.array([1, 2]), "panning", np.array([50, 300]))
+    assert controller.notes.velocity.tolist() == [0, 0, 100, 100]
+    assert controller.notes.panning.tolist() == [0, 50, 100, 0]
+    history.undo()
+    history.undo()
+    assert controller.notes.velocity.tolist() == [100, 100, 100, 100]
+
+
+def test_transpose_notes_past_range(history: History) -> None:
+    notes = NoteStore.from_arrays(tick=[0, 1], layer=0, key=[3, 87], instrument=0)
+    controller = NoteController(notes, history)
+    controller.transposeNotes(np.array([0]), -12)
+    controller.transposeNotes(np.array([1]), 24)
+    assert controller.notes.key.tolist() == [0, 87]
+    history.undo()
+    history.undo()
+    assert controller.notes.key.tolist() == [3, 87]
+
+
+def test_insert_layer(controller: NoteController) -> None:
+    controller.insertLayer(1)
+    assert controller.notes.layer.tolist() == [0, 2, 3, 2]
+
+
+def test_remove_layer(controller: NoteController, history: History) -> None:
+    controller.removeLayer(1)
+    assert controller.ids.tolist() == [0, 2]
+    assert controller.notes.layer.tolist() == [0, 1]
+
+    # Only the removed notes are recorded; the shift is undone by the layer controller
+    history.undo()
+    assert controller.ids.tolist() == [0, 1, 2, 3]
+    assert controller.notes.layer.tolist() == [0, 1, 1, 1]
+
+
+def test_swap_layers(controller: NoteController, history: History) -> None:
+    controller.swapLayers(1, 2)
+    assert controller.notes.layer.tolist() == [0, 2, 1, 2]
+    assert not history.can_undo
+
+
+def test_snapshot(controller: NoteController) -> None:
+    snapshot = controller.snapshot()
+    controller.moveNotes(np.array([0]), 1, 0)
+    assert snapshot.tick.tolist() == [0, 4, 8, 12]
+    assert controller.notes.tick.tolist() == [1, 4, 8, 12]
+
+
+def test_stats(controller: NoteController, history: History) -> None:
+    controller.setNoteValues(np.array([0, 1]), "instrument", 3)
+    controller.removeLayer(2)
+    assert controller.stats.count == 3
+    assert controller.stats.count_in_instrument(3) == 2
+    assert controller.stats.layer_counts.tolist() == [1, 2]
+    history.undo()
+    history.undo()
+    assert controller.stats.count == 4
+    assert controller.stats.count_in_instrument(0) == 4
@@ -0,0 +1,216 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PyQt5 import QtCore
+
+from nbs.controller import song
+from nbs.controller.instrument import InstrumentController
+from nbs.controller.layer import LayerController
+from nbs.controller.note import NoteController
+from nbs.controller.playback import PlaybackController
+from nbs.controller.song import (
+    PendingChunks,
+    PendingNotes,
+    SaveSongWorker,
+    SongController,
+)
+from nbs.core import file
+from nbs.core.data import (
+    EditorState,
+    Layer,
+    NoteStore,
+    Song,
+    SongHeader,
+    default_instruments,
+)
+from nbs.core.file import load_project, load_song, open_project, save_project, save_song
+from nbs.core.history import History
+
+
+def test_save_song_worker(tmp_path: Path) -> None:
+    notes = NoteStore.from_arrays(tick=[0, 4], layer=[0, 1], instrument=0, key=45)
+    song = Song(SongHeader(title="Song"), notes, [Layer(), Layer()], [])
+    path = tmp_path / "song.nbs"
+    worker = SaveSongWorker(song.snapshot(), path)
+    saved = []
+    worker.signals.finished.connect(saved.append)
+    # Edits made after the snapshot don't affect the saved song
+    song.notes.writeable_column("key")[:] = 0
+    worker.run()
+    assert saved == [str(path)]
+    loaded = load_song(path)
+    assert loaded.header.title == "Song"
+    assert loaded.notes.key.tolist() == [45, 45]
+
+
+def test_save_song_worker_failed(tmp_path: Path) -> None:
+    song = Song(SongHeader(), NoteStore(), [], [])
+    path = tmp_path / "missing" / "song.nbs"
+    worker = SaveSongWorker(song.snapshot(), path)
+    errors = []
+    worker.signals.failed.connect(lambda path, error: errors.append(path))
+    worker.run()
+    assert errors == [str(path)]
+
+
+def test_save_song_worker_project(tmp_path: Path) -> None:
+    notes = NoteStore.from_arrays(tick=[0, 4], layer=[0, 1], instrument=0, key=45)
+    song = Song(SongHeader(), notes, [Layer(), Layer()], [])
+    path = tmp_path / "song.nbsx"
+    editor = EditorState(scroll_tick=4, zoom=2.0)
+    SaveSongWorker(song.snapshot(), path, editor).run()
+    loaded, loaded_editor = load_project(path)
+    assert loaded.notes.tick.tolist() == [0, 4]
+    assert loaded_editor == editor
+
+
+def make_song_controller(history: History) -> SongController:
+    return SongController(
+        NoteController(history=history),
+        LayerController([], history),
+        InstrumentController([*default_instruments]),
+        PlaybackController(),
+    )
+
+
+def test_pending_notes_take() -> None:
+    notes = NoteStore.from_arrays(
+        tick=[9, 0, 5, 1, 5, 2, 8], layer=[0, 0, 0, 0, 1, 0, 0], instrument=0, key=45
+    )
+    pending = PendingNotes(notes)
+    assert pending.take(2).tick.tolist() == [0, 1]
+    # Notes in the given range come first, in time order
+    assert pending.take(2, (5, 9)).tick.tolist() == [5, 5]
+    assert pending.take(2, (5, 9)).tick.tolist() == [8]
+    assert pending.take(2, (5, 9)).tick.tolist() == [2]
+    assert pending.take(2, (5, 9)).tick.tolist() == [9]
+    assert len(pending) == 0
+    assert len(pending.take(2)) == 0
+
+
+def test_pending_notes_take_ranges() -> None:
+    notes = NoteStore.from_arrays(tick=np.arange(10), layer=0, instrument=0, key=45)
+    pending = PendingNotes(notes)
+    # The ranges are tried in order, until one has pending notes
+    assert pending.take(3, (8, 9), (4, 7)).tick.tolist() == [8]
+    assert pending.take(3, (8, 9), (4, 7)).tick.tolist() == [4, 5, 6]
+    assert pending.take(3, (8, 9), (4, 7)).tick.tolist() == [0, 1, 2]
+
+
+def test_pending_chunks_take(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(file, "PROJECT_CHUNK_SIZE", 4)
+    path = tmp_path / "song.nbsx"
+    notes = NoteStore.from_arrays(tick=np.arange(12), layer=0, instrument=0, key=45)
+    save_project(Song(SongHeader(), notes, [Layer()], []), path)
+    pending = PendingChunks(open_project(path))
+    assert (len(pending), pending.total) == (12, 12)
+    # The chunk with the given range is decoded first
+    assert pending.take(3, (9, 10)).tick.tolist() == [9]
+    assert pending.take(3, (9, 10)).tick.tolist() == [8, 10]
+    assert pending.take(3).tick.tolist() == [11]
+    # Then the other chunks, in order
+    assert pending.take(3).tick.tolist() == [0, 1, 2]
+    assert pending.takeAll().tick.tolist() == [3, 4, 5, 6, 7]
+    assert len(pending) == 0
+    pending.close()
+
+
+def test_load_song_in_chunks(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(song, "LOAD_CHUNK_SIZE", 3)
+    history = History()
+    controller = make_song_controller(history)
+    controller.visibleTicks = lambda: (6, 8)
+    progress = []
+    loaded = []
+    controller.songLoadProgress.connect(lambda *args: progress.append(args))
+    controller.songLoaded.connect(lambda: loaded.append(True))
+
+    notes = NoteStore.from_arrays(tick=np.arange(10), layer=0, instrument=0, key=45)
+    controller.loadSong(Song(SongHeader(), notes, [Layer()], []))
+    assert controller.isLoading
+    assert len(controller.noteController) == 0
+    controller.loadNextChunk()
+    assert controller.noteController.notes.tick.tolist() == [6, 7]
+    # Notes loaded so far can be edited while the rest are loaded
+    controller.noteController.moveNotes(np.array([0]), 10, 0)
+    controller.loadNextChunk()
+    controller.finishLoad()
+    assert not controller.isLoading
+    ticks = sorted(controller.noteController.notes.tick.tolist())
+    assert ticks == [0, 1, 2, 3, 4, 5, 7, 8, 9, 16]
+    assert progress == [(0, 10), (2, 10), (5, 10), (10, 10)]
+    assert loaded == [True]
+    assert history.can_undo
+
+
+def test_load_song_from_playback_position(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(song, "LOAD_CHUNK_SIZE", 3)
+    monkeypatch.setattr(song, "LOAD_PLAYBACK_TICKS", 4)
+    controller = make_song_controller(History())
+    controller.visibleTicks = lambda: (0, 2)
+    notes = NoteStore.from_arrays(tick=np.arange(20), layer=0, instrument=0, key=45)
+    controller.loadSong(Song(SongHeader(), notes, [Layer()], []))
+    controller.playbackController.currentTick = 12
+    controller.loadNextChunk()
+    assert controller.noteController.notes.tick.tolist() == [0, 1]
+    # Then the notes about to be played, even if they're off screen
+    controller.loadNextChunk()
+    controller.loadNextChunk()
+    assert controller.noteController.notes.tick.tolist() == [0, 1, 12, 13, 14, 15]
+    # The playback position is followed as it moves
+    controller.playbackController.currentTick = 18
+    controller.loadNextChunk()
+    assert controller.noteController.notes.tick.tolist()[-2:] == [18, 19]
+    controller.finishLoad()
+    assert len(controller.noteController) == 20
+
+
+def test_cancel_load_song() -> None:
+    controller = make_song_controller(History())
+    canceled = []
+    controller.songLoadCanceled.connect(lambda: canceled.append(True))
+    notes = NoteStore.from_arrays(tick=np.arange(5000), layer=0, instrument=0, key=45)
+    controller.loadSong(Song(SongHeader(), notes, [Layer()], []))
+    controller.loadNextChunk()
+    controller.cancelLoad()
+    assert not controller.isLoading
+    assert len(controller.noteController) == 0
+    assert canceled == [True]
+
+
+def test_open_song(tmp_path: Path) -> None:
+    path = tmp_path / "song.nbs"
+    notes = NoteStore.from_arrays(tick=[4, 0], layer=[0, 1], instrument=0, key=45)
+    save_song(Song(SongHeader(tempo=5), notes, [Layer(), Layer()], []), path)
+
+    controller = make_song_controller(History())
+    read = []
+    controller.songRead.connect(lambda *args: read.append(args))
+    controller.openSong(path)
+    controller.waitForSave()
+    QtCore.QCoreApplication.processEvents()
+    assert [(path, info.length) for path, info in read] == [(str(path), 5)]
+    assert controller.editor is None
+    assert controller.playbackController.tempo == 5
+    controller.finishLoad()
+    assert controller.noteController.notes.tick.tolist() == [0, 4]
+
+
+def test_open_project(tmp_path: Path) -> None:
+    path = tmp_path / "song.nbsx"
+    notes = NoteStore.from_arrays(tick=[4, 0], layer=[0, 1], instrument=0, key=45)
+    editor = EditorState(scroll_tick=2, current_instrument=1)
+    save_project(Song(SongHeader(tempo=5), notes, [Layer(), Layer()], []), path, editor)
+
+    controller = make_song_controller(History())
+    read = []
+    controller.songRead.connect(lambda *args: read.append(args))
+    controller.openSong(path)
+    controller.waitForSave()
+    QtCore.QCoreApplication.processEvents()
+    assert [(path, info.note_count) for path, info in read] == [(str(path), 2)]
+    assert controller.editor == editor
+    assert controller.playbackController.tempo == 5
+    controller.finishLoad()
+    assert controller.noteController.notes.tick.tolist() == [0, 4]
@@ -0,0 +1,212 @@
+import ctypes
+import importlib
+import sys
+import types
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List
+
+import numpy as np
+import pytest
+
+from nbs.core.mixer import Mixer
+
+AL_SOURCE_STATE = 0x1010
+AL_PLAYING = 0x1012
+AL_STOPPED = 0x1014
+AL_BUFFERS_PROCESSED = 0x1016
+AL_FORMAT_STEREO16 = 0x1103
+
+
+ALuint = ctypes.c_uint
+ALint = ctypes.c_int
+ALsizei = ctypes.c_int
+ALenum = ctypes.c_int
+
+
+def c_function(*argtypes) -> Callable[[Callable], Callable]:
+    """
+    Check that the arguments of a fake function convert to its C types, as
+    ctypes would for the real one.
+    """
+
+    def decorator(function: Callable) -> Callable:
+        def wrapper(self, *args):
+            assert len(args) == len(argtypes)
+            for argtype, arg in zip(argtypes, args):
+                argtype.from_param(arg)
+            return function(self, *args)
+
+        return wrapper
+
+    return decorator
+
+
+def _value(arg) -> int:
+    # ALuint arguments may be given as Python ints or as ctypes values
+    return arg.value if isinstance(arg, ctypes.c_uint) else arg
+
+
+def _pointee(pointer):
+    # Pointers are given either as arrays or as ctypes.byref() objects
+    return getattr(pointer, "_obj", pointer)
+
+
+class FakeAL:
+    """
+    Stands in for the `openal.al` ctypes bindings, with the signatures of the C
+    API, and plays a single streaming source.
+    """
+
+    AL_SOURCE_STATE = AL_SOURCE_STATE
+    AL_PLAYING = AL_PLAYING
+    AL_BUFFERS_PROCESSED = AL_BUFFERS_PROCESSED
+    AL_FORMAT_STEREO16 = AL_FORMAT_STEREO16
+
+    def __init__(self) -> None:
+        self.state = AL_STOPPED
+        self.queued: List[int] = []
+        self.processed = 0
+        self.data: Dict[int, int] = {}
+        self.plays = 0
+        self.deleted: List[int] = []
+
+    def play(self, count: int) -> None:
+        """Play `count` queued buffers."""
+        self.processed += count
+        if self.processed == len(self.queued):
+            self.state = AL_STOPPED
+
+    @c_function(ALsizei, ctypes.POINTER(ALuint))
+    def alGenSources(self, n: int, sources) -> None:
+        _pointee(sources).value = 1
+
+    @c_function(ALsizei, ctypes.POINTER(ALuint))
+    def alGenBuffers(self, n: int, buffers) -> None:
+        for i in range(n):
+            buffers[i] = 10 + i
+
+    @c_function(ALuint, ALenum, ctypes.c_void_p, ALsizei, ALsizei)
+    def alBufferData(self, buffer, format: int, data, size: int, freq: int) -> None:
+        assert format == AL_FORMAT_STEREO16 and len(data) == size
+        assert _value(buffer) not in self.queued
+        self.data[_value(buffer)] = size
+
+    @c_function(ALuint, ALsizei, ctypes.POINTER(ALuint))
+    def alSourceQueueBuffers(self, source, n: int, buffers) -> None:
+        buffers = _pointee(buffers)
+        if isinstance(buffers, ctypes.c_uint):
+            buffers = [buffers.value]
+        self.queued.extend(buffers[:n])
+
+    @c_function(ALuint, ALsizei, ctypes.POINTER(ALuint))
+    def alSourceUnqueueBuffers(self, source, n: int, buffers) -> None:
+        assert n <= self.processed
+        for i in range(n):
+            buffers[i] = self.queued.pop(0)
+        self.processed -= n
+
+    @c_function(ALuint, ALenum, ctypes.POINTER(ALint))
+    def alGetSourcei(self, source, param: int, value) -> None:
+        values = {
+            AL_SOURCE_STATE: self.state,
+            AL_BUFFERS_PROCESSED: self.processed,
+        }
+        _pointee(value).value = values[param]
+
+    @c_function(ALuint)
+    def alSourcePlay(self, source) -> None:
+        assert _value(source) == 1
+        self.plays += 1
+        self.state = AL_PLAYING
+
+    @c_function(ALuint)
+    def alSourceStop(self, source) -> None:
+        self.state = AL_STOPPED
+
+    @c_function(ALsizei, ctypes.POINTER(ALuint))
+    def alDeleteSources(self, n: int, sources) -> None:
+        self.deleted.append(_pointee(sources).value)
+
+    @c_function(ALsizei, ctypes.POINTER(ALuint))
+    def alDeleteBuffers(self, n: int, buffers) -> None:
+        self.deleted.extend(buffers[:n])
+
+
+@pytest.fixture
+def al(monkeypatch: pytest.MonkeyPatch) -> FakeAL:
+    al = FakeAL()
+    openal = types.ModuleType("openal")
+    openal.al = al  # type: ignore
+    openal.audio = types.ModuleType("openal.audio")  # type: ignore
+    openal.audio.SoundSink = lambda: types.SimpleNamespace(activate=lambda: None)
+    monkeypatch.setitem(sys.modules, "openal", openal)
+    monkeypatch.setitem(sys.modules, "openal.al", openal.al)
+    monkeypatch.setitem(sys.modules, "openal.audio", openal.audio)
+    return al
+
+
+@pytest.fixture
+def audio(al: FakeAL, monkeypatch: pytest.MonkeyPatch) -> Iterator[types.ModuleType]:
+    monkeypatch.delitem(sys.modules, "nbs.core.audio", raising=False)
+    module = importlib.import_module("nbs.core.audio")
+    yield module
+    sys.modules.pop("nbs.core.audio", None)
+
+
+def test_output_handler(al: FakeAL, audio: types.ModuleType) -> None:
+    handler = audio.AudioOutputHandler(Mixer(), latency=0.03)
+    size = handler.buffer_frames * 4
+    assert al.queued == [10, 11, 12, 13]
+    assert al.data == {10: size, 11: size, 12: size, 13: size}
+    assert al.plays == 1
+
+    # Nothing to do until a buffer is played
+    handler.update()
+    assert al.queued == [10, 11, 12, 13]
+    assert al.plays == 1
+
+    # Played buffers are refilled and queued again, without restarting the source
+    al.play(2)
+    al.data.clear()
+    handler.update()
+    assert al.queued == [12, 13, 10, 11]
+    assert al.data == {10: size, 11: size}
+    assert al.plays == 1
+
+    # The source is restarted only once it ran out of audio
+    al.play(4)
+    handler.update()
+    assert al.queued == [12, 13, 10, 11]
+    assert al.plays == 2
+
+    handler.close()
+    assert al.state == AL_STOPPED
+    assert sorted(al.deleted) == [1, 10, 11, 12, 13]
+
+
+def test_engine_stats(audio: types.ModuleType) -> None:
+    engine = audio.AudioEngine()
+    engine.mixer.add_sound(np.full(100, 1000, np.int16), 44100)
+    engine.mixer.play(0, 1.0, 0.0, 0.0)
+    stats = engine.stats()
+    # The statistics are a copy, which later plays don't change
+    engine.mixer.play(0, 1.0, 0.0, 0.0)
+    assert (stats.cache.hits, stats.cache.misses) == (0, 1)
+    assert stats.voices.peak_voices == 1
+    assert engine.stats().cache.hits == 1
+    assert engine.stats().voices.peak_voices == 2
+
+
+def test_engine_load_failed(audio: types.ModuleType, tmp_path: Path) -> None:
+    engine = audio.AudioEngine()
+    failed = []
+    loaded = []
+    engine.soundLoadFailed.connect(lambda path, error: failed.append(path))
+    engine.soundLoaded.connect(lambda id, success: loaded.append((id, success)))
+    path = str(tmp_path / "missing.ogg")
+    engine.loadSound(0, path)
+    engine._loader.shutdown(wait=True)
+    while engine._commands:
+        engine._commands.popleft()()
+    assert failed == [path]
+    assert loaded == [(0, False)]
@@ -0,0 +1,79 @@
+import os
+from pathlib import Path
+
+import pytest
+from tests.core.test_file import make_file
+
+from nbs.core.cache import SongCache
+from nbs.core.data import Instrument
+from nbs.core.file import load_song, save_song
+
+
+@pytest.fixture
+def song_path(tmp_path: Path) -> Path:
+    path = tmp_path / "song.nbs"
+    make_file(500).save(path)
+    return path
+
+
+def test_load_cached_song(tmp_path: Path, song_path: Path) -> None:
+    cache = SongCache(tmp_path / "cache")
+    expected = load_song(song_path)
+    assert load_song(song_path, cache=cache) == expected
+    assert len(list((tmp_path / "cache").glob("*.song"))) == 1
+    song = load_song(song_path, cache=cache)
+    assert song == expected
+    # Cached notes can be edited without changing the cache
+    song.notes.writeable_column("key")[:] = 0
+    song.notes.extend(song.notes[:10])
+    assert load_song(song_path, cache=cache) == expected
+
+
+def test_cached_song_changed(tmp_path: Path, song_path: Path) -> None:
+    cache = SongCache(tmp_path / "cache")
+    load_song(song_path, cache=cache)
+    song = load_song(song_path)
+    song.notes.writeable_column("key")[:] = 50
+    song.instruments = [Instrument("Custom", sound_path="custom.ogg")]
+    save_song(song, song_path)
+    os.utime(song_path, ns=(0, 12345))  # The modification time must change
+    expected = load_song(song_path)
+    assert load_song(song_path, cache=cache) == expected
+    assert load_song(song_path, cache=cache) == expected
+    assert len(list((tmp_path / "cache").glob("*.song"))) == 2
+
+
+def test_invalid_cache_entry(tmp_path: Path, song_path: Path) -> None:
+    cache = SongCache(tmp_path / "cache")
+    load_song(song_path, cache=cache)
+    (entry,) = (tmp_path / "cache").glob("*.song")
+    entry.write_bytes(entry.read_bytes()[:100])
+    assert load_song(song_path, cache=cache) == load_song(song_path)
+    # The entry is replaced
+    assert load_song(song_path, cache=cache) == load_song(song_path)
+
+
+def test_cache_size_limit(tmp_path: Path) -> None:
+    cache = SongCache(tmp_path / "cache", max_size=25_000)
+    paths = []
+    for i in range(4):
+        path = tmp_path / f"song{i}.nbs"
+        make_file(500, seed=i).save(path)
+        os.utime(path, ns=(0, i))
+        paths.append(path)
+        load_song(path, cache=cache)
+    entries = list((tmp_path / "cache").iterdir())
+    assert sum(entry.stat().st_size for entry in entries) <= 25_000
+    assert len(entries) < 8
+
+
+def test_cached_compressed_song(tmp_path: Path, song_path: Path) -> None:
+    cache = SongCache(tmp_path / "cache")
+    path = tmp_path / "song.nbs.gz"
+    expected = load_song(song_path)
+    save_song(expected, path)
+    assert load_song(path, cache=cache) == expected
+    assert load_song(path, cache=cache) == expected
+    # Keyed by the decompressed contents, which are the same as the original's
+    assert load_song(song_path, cache=cache) == expected
+    assert len(list((tmp_path / "cache").glob("*.song"))) == 1
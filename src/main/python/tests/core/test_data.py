@@ -0,0 +1,219 @@
+import pickle
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from nbs.core.data import Instrument, Layer, Note, NoteStore, Song, SongHeader
+
+
+@pytest.fixture
+def notes() -> NoteStore:
+    return NoteStore.from_arrays(
+        tick=[0, 0, 4, 8],
+        layer=[0, 1, 0, 2],
+        instrument=[0, 5, 10, 15],
+        key=[39, 45, 51, 57],
+        velocity=[100, 75, 50, 25],
+    )
+
+
+def test_from_arrays_defaults(notes: NoteStore) -> None:
+    assert len(notes) == 4
+    assert notes.panning.tolist() == [0, 0, 0, 0]
+    assert notes.pitch.tolist() == [0, 0, 0, 0]
+
+
+def test_from_arrays_missing_column() -> None:
+    with pytest.raises(ValueError):
+        NoteStore.from_arrays(tick=[0], layer=[0], key=[45])
+
+
+def test_from_notes_round_trip(notes: NoteStore) -> None:
+    assert NoteStore.from_notes(notes.to_notes()) == notes
+
+
+def test_get_note(notes: NoteStore) -> None:
+    assert notes[1] == Note(tick=0, layer=1, instrument=5, key=45, velocity=75)
+    assert notes[-1].tick == 8
+    with pytest.raises(IndexError):
+        notes[4]
+
+
+def test_set_note(notes: NoteStore) -> None:
+    notes[0] = Note(tick=2, layer=3, instrument=1, key=40, panning=-50, pitch=25)
+    assert notes[0] == Note(
+        tick=2, layer=3, instrument=1, key=40, panning=-50, pitch=25
+    )
+
+
+def test_append(notes: NoteStore) -> None:
+    index = notes.append(Note(tick=12, layer=0, instrument=0, key=33))
+    assert index == 4
+    assert len(notes) == 5
+    assert notes[4].tick == 12
+
+
+def test_append_grows_capacity() -> None:
+    notes = NoteStore()
+    for i in range(100):
+        notes.append(Note(tick=i, layer=0, instrument=0, key=45))
+    assert len(notes) == 100
+    assert notes.capacity >= 100
+    assert notes.tick.tolist() == list(range(100))
+
+
+def test_extend(notes: NoteStore) -> None:
+    added = notes.extend(notes.copy())
+    assert added == range(4, 8)
+    assert notes.key.tolist() == [39, 45, 51, 57] * 2
+
+
+def test_insert(notes: NoteStore) -> None:
+    other = NoteStore.from_arrays(tick=[1, 2], layer=0, instrument=0, key=0)
+    inserted = notes.insert(1, other)
+    assert inserted == range(1, 3)
+    assert notes.tick.tolist() == [0, 1, 2, 0, 4, 8]
+
+
+def test_delete_by_mask(notes: NoteStore) -> None:
+    notes.delete(notes.tick == 0)
+    assert notes.tick.tolist() == [4, 8]
+    assert notes.instrument.tolist() == [10, 15]
+
+
+def test_delete_by_indices(notes: NoteStore) -> None:
+    notes.delete([0, 3])
+    assert notes.key.tolist() == [45, 51]
+
+
+def test_masked_view(notes: NoteStore) -> None:
+    subset = notes[notes.layer == 0]
+    assert isinstance(subset, NoteStore)
+    assert subset.tick.tolist() == [0, 4]
+    # Masks return copies, so the original store is unaffected
+    subset.writeable_column("key")[:] = 0
+    assert notes.key.tolist() == [39, 45, 51, 57]
+
+
+def test_slice_shares_memory(notes: NoteStore) -> None:
+    subset = notes[1:3]
+    subset.writeable_column("key")[:] += 1
+    assert notes.key.tolist() == [39, 46, 52, 57]
+
+
+def test_columns_are_live(notes: NoteStore) -> None:
+    notes.writeable_column("key")[notes.instrument > 5] += 12
+    assert notes.key.tolist() == [39, 45, 63, 69]
+
+
+def test_pickle(notes: NoteStore) -> None:
+    notes.append(Note(tick=16, layer=0, instrument=0, key=45))
+    restored = pickle.loads(pickle.dumps(notes))
+    assert restored == notes
+    assert restored.capacity == len(notes)
+
+
+def test_equality(notes: NoteStore) -> None:
+    other = notes.copy()
+    assert other == notes
+    other.writeable_column("velocity")[0] = 0
+    assert other != notes
+    assert not np.shares_memory(other.velocity, notes.velocity)
+
+
+def test_snapshot_shares_columns(notes: NoteStore) -> None:
+    snapshot = notes.snapshot()
+    assert snapshot == notes
+    assert not snapshot.writeable
+    assert np.shares_memory(snapshot.tick, notes._data["tick"])
+
+
+def test_snapshot_copy_on_write(notes: NoteStore) -> None:
+    snapshot = notes.snapshot()
+    notes.writeable_column("key")[0] = 0
+    assert snapshot.key.tolist() == [39, 45, 51, 57]
+    # Only the modified column is copied
+    assert np.shares_memory(snapshot.tick, notes._data["tick"])
+    assert not np.shares_memory(snapshot.key, notes.key)
+    notes.append(Note(tick=12, layer=0, instrument=0, key=33))
+    notes.delete(0)
+    assert len(snapshot) == 4
+    assert snapshot.tick.tolist() == [0, 0, 4, 8]
+
+
+def test_snapshot_read_does_not_copy(notes: NoteStore) -> None:
+    snapshot = notes.snapshot()
+    # Reading the columns doesn't copy them; only writing does
+    assert notes.key.tolist() == [39, 45, 51, 57]
+    assert notes.column("key").sum() == 192
+    assert np.shares_memory(snapshot.key, notes._data["key"])
+    with pytest.raises(ValueError):
+        notes.key[0] = 0
+    # Slices share memory with the store, so they're detached from the snapshot
+    notes[1:3].writeable_column("key")[:] = 0
+    assert notes.key.tolist() == [39, 0, 0, 57]
+    assert snapshot.key.tolist() == [39, 45, 51, 57]
+
+
+def test_snapshot_is_read_only(notes: NoteStore) -> None:
+    snapshot = notes.snapshot()
+    with pytest.raises(ValueError):
+        snapshot.key[0] = 0
+    with pytest.raises(ValueError):
+        snapshot.writeable_column("key")
+    with pytest.raises(ValueError):
+        snapshot.append(Note(tick=12, layer=0, instrument=0, key=33))
+    with pytest.raises(ValueError):
+        snapshot.delete(0)
+    copy = snapshot.copy()
+    copy.writeable_column("key")[0] = 0
+    assert copy.writeable
+
+
+def test_song_snapshot(notes: NoteStore) -> None:
+    song = Song(
+        header=SongHeader(title="Song"),
+        notes=notes,
+        layers=[Layer(name="Layer 1")],
+        instruments=[Instrument(name="Harp")],
+    )
+    snapshot = song.snapshot()
+    song.header.title = "Renamed"
+    song.layers[0].name = "Renamed"
+    song.layers.append(Layer())
+    song.instruments[0].pitch = 0
+    song.notes.writeable_column("tick")[:] += 1
+    assert snapshot.header.title == "Song"
+    assert snapshot.layers == (Layer(name="Layer 1"),)
+    assert snapshot.instruments == (Instrument(name="Harp"),)
+    assert snapshot.notes.tick.tolist() == [0, 0, 4, 8]
+    with pytest.raises(AttributeError):
+        snapshot.notes = NoteStore()  # type: ignore
+
+
+def test_compact_objects() -> None:
+    assert not hasattr(Note(0, 0, 0, 45), "__dict__")
+    assert not hasattr(Layer(), "__dict__")
+
+
+def test_note_memory() -> None:
+    size = 200_000
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        notes = NoteStore.from_arrays(
+            tick=np.arange(size),
+            layer=np.arange(size) % 20,
+            instrument=np.arange(size) % 16,
+            key=np.arange(size) % 88,
+        )
+        store_size = tracemalloc.get_traced_memory()[0] - start
+        objects = list(notes)
+        objects_size = tracemalloc.get_traced_memory()[0] - start - store_size
+    finally:
+        tracemalloc.stop()
+    assert len(objects) == size
+    # A stored note takes a few bytes per column; a `Note` object, several times more
+    assert store_size / size <= 20
+    assert objects_size / size <= 160
@@ -0,0 +1,276 @@
+from pathlib import Path
+
+import numpy as np
+import pynbs
+import pytest
+
+from nbs.core import file
+from nbs.core.data import EditorState, NoteStore
+from nbs.core.file import (
+    convert_file_to_song,
+    convert_song_file,
+    get_compression,
+    load_project,
+    load_song,
+    open_project,
+    parse_song,
+    read_song_header,
+    read_song_headers,
+    save_project,
+    save_song,
+)
+
+
+def make_file(size: int, seed: int = 0) -> pynbs.File:
+    rng = np.random.default_rng(seed)
+    # Notes can't share a cell, or the layer jump between them would be zero
+    cells = rng.choice(1000 * 20, size, replace=False)
+    ticks, layers = np.divmod(np.sort(cells), 20)
+    ticks[-1] = 1000  # Keep the song length non-zero for version 0
+    notes = [
+        pynbs.Note(
+            tick=int(tick),
+            layer=int(layer),
+            instrument=int(rng.integers(0, 20)),
+            key=int(rng.integers(0, 88)),
+            velocity=int(rng.integers(0, 101)),
+            panning=int(rng.integers(-100, 101)),
+            pitch=int(rng.integers(-1200, 1201)),
+        )
+        for tick, layer in zip(ticks, layers)
+    ]
+    file = pynbs.new_file(
+        song_name="Song",
+        song_author="Author",
+        description="Déjà vu",
+        song_origin="origin.mid",
+        tempo=12.5,
+        minutes_spent=3,
+        loop=True,
+        loop_start=4,
+    )
+    file.notes = notes
+    file.layers = [
+        pynbs.Layer(i, f"Layer {i}", i % 3 == 0, 50 + i, i - 10) for i in range(20)
+    ]
+    file.instruments = [pynbs.Instrument(0, "Custom", "custom.ogg", 50, False)]
+    return file
+
+
+@pytest.mark.parametrize("mmap", [False, True])
+@pytest.mark.parametrize("version", range(6))
+def test_load_song_matches_pynbs(tmp_path: Path, version: int, mmap: bool) -> None:
+    path = tmp_path / "song.nbs"
+    make_file(2000).save(path, version=version)
+    song = load_song(path, mmap=mmap)
+    assert song == convert_file_to_song(pynbs.read(path))
+    assert len(song.notes) == 2000
+    assert len(song.layers) == 20
+
+
+def test_load_song_in_chunks(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    path = tmp_path / "song.nbs"
+    make_file(300, seed=1).save(path)
+    expected = convert_file_to_song(pynbs.read(path))
+    # Make chunks end at every possible position of a note
+    for size in (1, 2, 3, 7, 64):
+        monkeypatch.setattr(file, "NOTE_CHUNK_SIZE", size)
+        assert load_song(path) == expected
+        assert read_song_header(path).note_count == 300
+
+
+def test_load_empty_song(tmp_path: Path) -> None:
+    path = tmp_path / "song.nbs"
+    pynbs.new_file().save(path)
+    song = load_song(path)
+    assert len(song.notes) == 0
+    assert len(song.layers) == 1
+
+
+def test_load_truncated_song(tmp_path: Path) -> None:
+    path = tmp_path / "song.nbs"
+    make_file(100).save(path)
+    data = path.read_bytes()
+    for size in (10, len(data) // 2, len(data) - 1):
+        with pytest.raises(ValueError):
+            parse_song(data[:size])
+
+
+def test_load_truncated_song_mmap(tmp_path: Path) -> None:
+    path = tmp_path / "song.nbs"
+    make_file(100).save(path)
+    data = path.read_bytes()
+    for size in (0, 10, len(data) // 2, len(data) - 1):
+        path.write_bytes(data[:size])
+        with pytest.raises(ValueError):
+            load_song(path, mmap=True)
+
+
+@pytest.mark.parametrize("version", range(6))
+def test_read_song_header(tmp_path: Path, version: int) -> None:
+    path = tmp_path / "song.nbs"
+    make_file(2000).save(path, version=version)
+    song = load_song(path)
+    info = read_song_header(path)
+    assert info.header == song.header
+    assert info.note_count == 2000
+    assert info.layer_count == 20
+    assert info.length == song.notes.tick.max() + 1 == 1001
+    assert info.duration == pytest.approx(1001 / 12.5)
+
+
+def test_read_song_headers(tmp_path: Path) -> None:
+    paths = [tmp_path / "empty.nbs", tmp_path / "song.nbs", tmp_path / "invalid.nbs"]
+    pynbs.new_file().save(paths[0])
+    make_file(10).save(paths[1])
+    paths[2].write_bytes(b"\x00\x00\x05")
+    headers = read_song_headers(paths + [tmp_path / "missing.nbs"])
+    assert (headers[0].note_count, headers[0].length) == (0, 0)
+    assert headers[1].note_count == 10
+    assert headers[2:] == [None, None]
+
+
+@pytest.mark.parametrize("version", range(6))
+def test_save_song_matches_pynbs(tmp_path: Path, version: int) -> None:
+    expected = tmp_path / "expected.nbs"
+    path = tmp_path / "song.nbs"
+    make_file(2000).save(expected, version=version)
+    song = load_song(expected)
+    # The order of the notes in the song doesn't matter
+    song.notes = song.notes[np.random.default_rng(0).permutation(2000)]
+    save_song(song, path, version=version)
+    assert path.read_bytes() == expected.read_bytes()
+
+
+def test_save_song_keeps_last_note_in_cell(tmp_path: Path) -> None:
+    path = tmp_path / "song.nbs"
+    song = convert_file_to_song(make_file(10))
+    song.notes = NoteStore.from_arrays(
+        tick=[3, 0, 3, 3], layer=[1, 0, 1, 0], instrument=0, key=[40, 41, 42, 43]
+    )
+    save_song(song, path)
+    notes = load_song(path).notes
+    assert notes.tick.tolist() == [0, 3, 3]
+    assert notes.layer.tolist() == [0, 0, 1]
+    assert notes.key.tolist() == [41, 43, 42]
+
+
+def test_save_song_failed_keeps_previous_file(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "song.nbs"
+    make_file(100).save(path)
+    data = path.read_bytes()
+    song = load_song(path)
+
+    song.notes.writeable_column("layer")[0] = -1
+    with pytest.raises(ValueError):
+        save_song(song, path)
+    song.notes.writeable_column("layer")[0] = 0
+
+    def fail(*args: object) -> None:
+        raise OSError("Disk full")
+
+    monkeypatch.setattr(file, "_write_instruments", fail)
+    with pytest.raises(OSError):
+        save_song(song, path)
+    assert path.read_bytes() == data
+    assert list(tmp_path.iterdir()) == [path]
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_project_round_trip(tmp_path: Path, compress: bool) -> None:
+    path = tmp_path / "song.nbsx"
+    song = convert_file_to_song(make_file(2000))
+    editor = EditorState(
+        scroll_tick=120, scroll_layer=3, zoom=1.5, current_instrument=4
+    )
+    save_project(song, path, editor, compress=compress)
+    loaded, loaded_editor = load_project(path)
+    assert loaded_editor == editor
+    assert loaded.header == song.header
+    assert loaded.layers == song.layers
+    assert loaded.instruments == song.instruments
+    for name in NoteStore.COLUMNS:
+        assert loaded.notes.column(name).tolist() == song.notes.column(name).tolist()
+
+
+def test_project_reads_only_needed_chunks(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "song.nbsx"
+    monkeypatch.setattr(file, "PROJECT_CHUNK_SIZE", 100)
+    song = convert_file_to_song(make_file(2000))
+    save_project(song, path)
+
+    with open_project(path) as project:
+        assert project.chunk_count == 20
+        assert project.info.note_count == 2000
+        assert project.length == 1001
+        read = []
+        read_chunk = project.read_chunk
+        monkeypatch.setattr(
+            project, "read_chunk", lambda i: read.append(i) or read_chunk(i)
+        )
+        notes = project.read_notes(900, 950)
+    tick = song.notes.tick
+    assert len(notes) == np.count_nonzero((tick >= 900) & (tick < 950))
+    assert notes.tick.min() >= 900 and notes.tick.max() < 950
+    assert 0 < len(read) <= 3
+    assert min(read) >= 17
+
+
+@pytest.mark.parametrize("version", range(6))
+def test_convert_song_file_is_lossless(tmp_path: Path, version: int) -> None:
+    source = tmp_path / "song.nbs"
+    project = tmp_path / "song.nbsx"
+    result = tmp_path / "result.nbs"
+    make_file(2000).save(source, version=version)
+    convert_song_file(source, project)
+    convert_song_file(project, result)
+    assert result.read_bytes() == source.read_bytes()
+
+
+def test_open_invalid_project(tmp_path: Path) -> None:
+    path = tmp_path / "song.nbsx"
+    make_file(10).save(path)
+    with pytest.raises(ValueError):
+        open_project(path)
+
+
+@pytest.mark.parametrize("extension", [".gz", ".xz", ".zst"])
+def test_compressed_song(tmp_path: Path, extension: str) -> None:
+    if extension == ".zst":
+        pytest.importorskip("zstandard")
+    path = tmp_path / f"song.nbs{extension}"
+    song = convert_file_to_song(make_file(2000))
+    save_song(song, path)
+    save_song(song, tmp_path / "song.nbs")
+    assert get_compression(path) is not None
+    assert path.stat().st_size < (tmp_path / "song.nbs").stat().st_size
+
+    assert load_song(path) == song
+    assert load_song(path, mmap=True) == song
+    info = read_song_header(path)
+    assert (info.note_count, info.length) == (2000, 1001)
+    # Compressed files are recognized by their contents, whatever their name
+    renamed = path.rename(tmp_path / "renamed.nbs")
+    assert load_song(renamed) == song
+
+
+def test_compressed_song_is_streamed(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "song.nbs.gz"
+    song = convert_file_to_song(make_file(2000))
+    save_song(song, path)
+    monkeypatch.setattr(file, "STREAM_CHUNK_SIZE", 1000)
+    assert load_song(path) == song
+
+
+def test_truncated_compressed_song(tmp_path: Path) -> None:
+    path = tmp_path / "song.nbs.gz"
+    save_song(convert_file_to_song(make_file(2000)), path)
+    path.write_bytes(path.read_bytes()[:-100])
+    with pytest.raises((EOFError, ValueError)):
+        load_song(path)
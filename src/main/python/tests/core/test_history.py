@@ -0,0 +1,168 @@
+from typing import Dict, Union
+
+import numpy as np
+import pytest
+
+from nbs.core.data import Note, NoteStore
+from nbs.core.history import (
+    COMMAND_OVERHEAD,
+    AddNotesCommand,
+    ChangeNotesCommand,
+    History,
+    MoveNotesCommand,
+    RemoveNotesCommand,
+)
+
+
+class NoteDict:
+    """A minimal note editor that keeps notes in a dict, keyed by their ID."""
+
+    def __init__(self) -> None:
+        self.notes: Dict[int, Note] = {}
+
+    def addNotes(self, notes: NoteStore, ids: np.ndarray) -> None:
+        self.notes.update(zip(ids.tolist(), notes))
+
+    def removeNotes(self, ids: np.ndarray) -> None:
+        for id in ids.tolist():
+            del self.notes[id]
+
+    def moveNotes(
+        self,
+        ids: np.ndarray,
+        ticks: Union[int, np.ndarray],
+        layers: Union[int, np.ndarray],
+    ) -> None:
+        ticks = np.broadcast_to(ticks, len(ids)).tolist()
+        layers = np.broadcast_to(layers, len(ids)).tolist()
+        for id, tick, layer in zip(ids.tolist(), ticks, layers):
+            self.notes[id].tick += tick
+            self.notes[id].layer += layer
+
+    def setNoteValues(
+        self, ids: np.ndarray, name: str, values: Union[int, np.ndarray]
+    ) -> None:
+        values = np.broadcast_to(values, len(ids)).tolist()
+        for id, value in zip(ids.tolist(), values):
+            setattr(self.notes[id], name, value)
+
+    def add(self, history: History, notes: NoteStore) -> np.ndarray:
+        ids = np.arange(len(self.notes), len(self.notes) + len(notes))
+        self.addNotes(notes, ids)
+        history.push(AddNotesCommand(self, ids, notes))
+        return ids
+
+
+@pytest.fixture
+def notes() -> NoteStore:
+    return NoteStore.from_arrays(
+        tick=[0, 4, 8], layer=[0, 1, 2], instrument=0, key=[33, 45, 57]
+    )
+
+
+@pytest.fixture
+def editor() -> NoteDict:
+    return NoteDict()
+
+
+def test_undo_redo_add(editor: NoteDict, notes: NoteStore) -> None:
+    history = History()
+    editor.add(history, notes)
+    assert history.can_undo
+    history.undo()
+    assert editor.notes == {}
+    assert history.can_redo
+    history.redo()
+    assert list(editor.notes.values()) == notes.to_notes()
+
+
+def test_undo_move_and_transpose(editor: NoteDict, notes: NoteStore) -> None:
+    history = History()
+    ids = editor.add(history, notes)
+    editor.moveNotes(ids[:2], 2, 1)
+    history.push(MoveNotesCommand(editor, ids[:2], 2, 1))
+    old = notes.key.copy()
+    editor.setNoteValues(ids, "key", old + 12)
+    history.push(ChangeNotesCommand(editor, ids, "key", old, old + 12))
+
+    history.undo()
+    assert [note.key for note in editor.notes.values()] == [33, 45, 57]
+    history.undo()
+    assert [note.tick for note in editor.notes.values()] == [0, 4, 8]
+    history.redo()
+    history.redo()
+    assert [note.tick for note in editor.notes.values()] == [2, 6, 8]
+    assert [note.key for note in editor.notes.values()] == [45, 57, 69]
+
+
+def test_push_clears_redo(editor: NoteDict, notes: NoteStore) -> None:
+    history = History()
+    editor.add(history, notes[:1])
+    history.undo()
+    editor.add(history, notes[1:])
+    assert not history.can_redo
+    assert len(history) == 1
+
+
+def test_group(editor: NoteDict, notes: NoteStore) -> None:
+    history = History()
+    with history.group("Replace notes"):
+        ids = editor.add(history, notes)
+        editor.removeNotes(ids[:1])
+        history.push(RemoveNotesCommand(editor, ids[:1], notes[:1]))
+    assert len(history) == 1
+    assert history.undo_description == "Replace notes"
+    history.undo()
+    assert editor.notes == {}
+    history.redo()
+    assert sorted(editor.notes) == [1, 2]
+
+
+def test_push_while_replaying_is_ignored(editor: NoteDict, notes: NoteStore) -> None:
+    history = History()
+    ids = editor.add(history, notes)
+    # Simulate an editor that records the changes made to it unconditionally
+    editor.removeNotes = lambda ids: history.push(  # type: ignore
+        RemoveNotesCommand(editor, ids, notes)
+    )
+    history.undo()
+    assert len(history) == 1
+    assert history.can_redo
+
+
+def test_memory_usage(editor: NoteDict, notes: NoteStore) -> None:
+    history = History()
+    assert history.memory_usage == 0
+    ids = editor.add(history, notes)
+    assert history.memory_usage == COMMAND_OVERHEAD + ids.nbytes + notes.nbytes
+    history.clear()
+    assert history.memory_usage == 0
+
+
+def test_memory_limit_evicts_oldest(editor: NoteDict) -> None:
+    history = History()
+    note = NoteStore.from_arrays(tick=0, layer=0, instrument=0, key=45)
+    for _ in range(10):
+        editor.add(history, note)
+    size = history.memory_usage // 10
+    history.memory_limit = size * 3
+    assert len(history) == 3
+    assert history.memory_usage == size * 3
+    for _ in range(5):
+        editor.add(history, note)
+    assert len(history) == 3
+    for _ in range(3):
+        history.undo()
+    assert not history.can_undo
+    assert len(editor.notes) == 12
+
+
+def test_large_paste_delta_is_compact(editor: NoteDict) -> None:
+    history = History()
+    count = 100_000
+    notes = NoteStore.from_arrays(tick=np.arange(count), layer=0, instrument=0, key=45)
+    ids = editor.add(history, notes)
+    editor.moveNotes(ids, 1, 0)
+    history.push(MoveNotesCommand(editor, ids, 1, 0))
+    # A move stores only the IDs of the moved notes, not the notes themselves
+    assert history.memory_usage < 2 * (notes.nbytes + ids.nbytes)
@@ -0,0 +1,115 @@
+import pytest
+
+from nbs.core.index import GridIndex, SortedIndex
+
+
+@pytest.fixture
+def grid() -> GridIndex[str]:
+    grid: GridIndex[str] = GridIndex()
+    grid.add(0, 0, "a")
+    grid.add(4, 1, "b")
+    grid.add(4, 2, "c")
+    return grid
+
+
+def test_grid_lookup(grid: GridIndex[str]) -> None:
+    assert len(grid) == 3
+    assert grid.get(4, 1) == "b"
+    assert grid.at(4, 2) == ["c"]
+    assert grid.get(1, 1) is None
+    assert grid.at(1, 1) == ()
+    assert grid.is_occupied(0, 0)
+    assert not grid.is_occupied(0, 1)
+
+
+def test_grid_stacked_items(grid: GridIndex[str]) -> None:
+    grid.add(0, 0, "d")
+    assert grid.at(0, 0) == ["a", "d"]
+    assert grid.get(0, 0) == "d"
+    grid.remove(0, 0, "d")
+    assert grid.at(0, 0) == ["a"]
+    assert len(grid) == 3
+
+
+def test_grid_move(grid: GridIndex[str]) -> None:
+    grid.move("b", 4, 1, 5, 3)
+    assert not grid.is_occupied(4, 1)
+    assert grid.get(5, 3) == "b"
+    assert len(grid) == 3
+
+
+def test_grid_remove(grid: GridIndex[str]) -> None:
+    grid.remove(0, 0, "a")
+    assert (0, 0) not in grid
+    assert len(grid) == 2
+    with pytest.raises(KeyError):
+        grid.remove(0, 0, "a")
+    with pytest.raises(KeyError):
+        grid.remove(4, 1, "c")
+
+
+def test_grid_clear(grid: GridIndex[str]) -> None:
+    grid.clear()
+    assert len(grid) == 0
+    assert list(grid) == []
+
+
+@pytest.fixture
+def ticks() -> SortedIndex[str]:
+    ticks: SortedIndex[str] = SortedIndex()
+    for tick, item in [(8, "c"), (0, "a"), (4, "b"), (4, "d"), (16, "e")]:
+        ticks.add(tick, item)
+    return ticks
+
+
+def test_sorted_keys(ticks: SortedIndex[str]) -> None:
+    assert len(ticks) == 5
+    assert list(ticks.keys()) == [0, 4, 8, 16]
+    assert ticks.first_key() == 0
+    assert ticks.last_key() == 16
+    assert ticks.at(4) == ["b", "d"]
+    assert ticks.at(5) == ()
+
+
+def test_sorted_range(ticks: SortedIndex[str]) -> None:
+    assert ticks.range(4, 16) == ["b", "d", "c"]
+    assert ticks.range(None, 5) == ["a", "b", "d"]
+    assert ticks.range(9, None) == ["e"]
+    assert ticks.range(17, None) == []
+    assert list(ticks.keys_in(1, 9)) == [4, 8]
+
+
+def test_sorted_neighbors(ticks: SortedIndex[str]) -> None:
+    assert ticks.next_key(4) == 8
+    assert ticks.next_key(5) == 8
+    assert ticks.next_key(16) is None
+    assert ticks.previous_key(4) == 0
+    assert ticks.previous_key(0) is None
+    assert ticks.previous_key(100) == 16
+
+
+def test_sorted_remove_updates_bounds(ticks: SortedIndex[str]) -> None:
+    ticks.remove(16, "e")
+    assert ticks.last_key() == 8
+    ticks.remove(4, "b")
+    assert 4 in ticks
+    ticks.remove(4, "d")
+    assert 4 not in ticks
+    with pytest.raises(KeyError):
+        ticks.remove(4, "d")
+
+
+def test_sorted_move(ticks: SortedIndex[str]) -> None:
+    ticks.move("a", 0, 20)
+    assert ticks.first_key() == 4
+    assert ticks.last_key() == 20
+    assert len(ticks) == 5
+
+
+def test_sorted_empty() -> None:
+    ticks: SortedIndex[str] = SortedIndex()
+    assert not ticks
+    assert ticks.first_key() is None
+    assert ticks.last_key() is None
+    assert ticks.next_key(0) is None
+    assert ticks.range() == []
@@ -0,0 +1,108 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from nbs.core.data import Layer, NoteStore, Song, SongHeader
+from nbs.core.journal import Journal, read_journal
+
+
+def make_song(size: int) -> Song:
+    notes = NoteStore.from_arrays(
+        tick=np.arange(size), layer=np.arange(size) % 3, instrument=0, key=45
+    )
+    return Song(SongHeader(title="Song"), notes, [Layer(), Layer(), Layer()], [])
+
+
+def test_replay_journal(tmp_path: Path) -> None:
+    path = tmp_path / "autosave.journal"
+    song = make_song(10)
+    journal = Journal(path)
+    journal.snapshot(song.snapshot(), np.arange(10))
+
+    # Remove notes 2 and 3, modify note 5, and add note 10
+    changed = song.notes[[5]]
+    changed.writeable_column("key")[:] = 60
+    added = NoteStore.from_arrays(tick=20, layer=1, instrument=2, key=50)
+    changed.extend(added)
+    journal.record_notes(np.array([2, 3]), np.array([5, 10]), changed)
+    song.layers[1].name = "Bass"
+    journal.record_song(song.snapshot())
+    journal.close()
+
+    recovered = read_journal(path)
+    assert recovered.header.title == "Song"
+    assert recovered.layers[1].name == "Bass"
+    assert recovered.notes.tick.tolist() == [0, 1, 4, 5, 6, 7, 8, 9, 20]
+    assert recovered.notes.key.tolist() == [45, 45, 45, 60, 45, 45, 45, 45, 50]
+
+
+def test_replay_ignores_incomplete_record(tmp_path: Path) -> None:
+    path = tmp_path / "autosave.journal"
+    song = make_song(10)
+    journal = Journal(path)
+    journal.snapshot(song.snapshot(), np.arange(10))
+    journal.record_notes(np.array([0]), np.zeros(0, np.int64), NoteStore())
+    journal.flush()
+    size = path.stat().st_size
+    journal.record_notes(np.array([1]), np.zeros(0, np.int64), NoteStore())
+    journal.close()
+
+    # The last record was cut short by a crash
+    with open(path, "r+b") as f:
+        f.truncate(path.stat().st_size - 2)
+    assert len(read_journal(path).notes) == 9
+    with open(path, "r+b") as f:
+        f.truncate(size)
+    assert len(read_journal(path).notes) == 9
+
+
+def test_journal_snapshot_replaces_changes(tmp_path: Path) -> None:
+    path = tmp_path / "autosave.journal"
+    song = make_song(1000)
+    journal = Journal(path, compact_size=500)
+    journal.snapshot(song.snapshot(), np.arange(1000))
+    for id in range(100):
+        journal.record_notes(np.array([id]), np.zeros(0, np.int64), NoteStore())
+    assert journal.needs_snapshot
+    journal.flush()
+    size = path.stat().st_size
+
+    song.notes = song.notes[100:]
+    journal.snapshot(song.snapshot(), np.arange(100, 1000))
+    assert not journal.needs_snapshot
+    journal.close()
+    assert path.stat().st_size < size
+    assert read_journal(path).notes.tick.tolist() == list(range(100, 1000))
+
+
+def test_journal_close_discard(tmp_path: Path) -> None:
+    path = tmp_path / "autosave.journal"
+    journal = Journal(path)
+    journal.snapshot(make_song(1).snapshot(), np.arange(1))
+    journal.close(discard=True)
+    assert not path.exists()
+
+
+def test_read_invalid_journal(tmp_path: Path) -> None:
+    path = tmp_path / "autosave.journal"
+    path.write_bytes(b"NBS")
+    with pytest.raises(ValueError):
+        read_journal(path)
+
+
+def test_journal_write_error(tmp_path: Path) -> None:
+    path = tmp_path / "missing" / "autosave.journal"
+    song = make_song(10)
+    journal = Journal(path)
+    journal.snapshot(song.snapshot(), np.arange(10))
+    journal.flush()
+    assert isinstance(journal.error, OSError)
+
+    # Writing a snapshot again clears the error
+    path.parent.mkdir()
+    journal.snapshot(song.snapshot(), np.arange(10))
+    journal.flush()
+    assert journal.error is None
+    journal.close()
+    assert read_journal(path).notes == song.notes
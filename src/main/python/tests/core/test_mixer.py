@@ -0,0 +1,164 @@
+import numpy as np
+import pytest
+
+from nbs.core.mixer import BLOCK_SIZE, Mixer, RingBuffer
+
+
+def make_mixer(**kwargs) -> Mixer:
+    mixer = Mixer(**kwargs)
+    # A constant sound, and a ramp whose value is its position
+    mixer.add_sound(np.full(1000, 1000, np.int16), 44100)
+    mixer.add_sound(np.arange(2000, dtype=np.int16)[:, None].repeat(2, 1), 44100)
+    return mixer
+
+
+def test_ring_buffer() -> None:
+    buffer = RingBuffer(8)
+    frames = np.arange(12, dtype=np.int16)[:, None].repeat(2, 1)
+    assert buffer.write(frames[:6]) == 6
+    assert buffer.read(4)[:, 0].tolist() == [0, 1, 2, 3]
+    # Wraps around the end of the buffer, and stops when full
+    assert buffer.write(frames[6:]) == 6
+    assert len(buffer) == 8
+    assert buffer.free == 0
+    assert buffer.read(100)[:, 1].tolist() == [4, 5, 6, 7, 8, 9, 10, 11]
+    assert len(buffer) == 0
+
+
+def test_mix_panning() -> None:
+    mixer = make_mixer()
+    mixer.play(0, 1.0, 0.0, -1.0)
+    left, right = mixer.mix(16).T
+    np.testing.assert_allclose(left, 1000)
+    np.testing.assert_allclose(right, 0, atol=1e-3)
+
+    mixer.stop_all()
+    mixer.play(0, 0.5, 0.0, 0.0)
+    mixer.play(0, 0.5, 0.0, 0.0)
+    # Constant power: each channel gets cos(pi/4) of each voice
+    np.testing.assert_allclose(mixer.mix(16), 1000 * np.sqrt(0.5), rtol=1e-5)
+
+
+def test_mix_pitch() -> None:
+    mixer = make_mixer()
+    # An octave up: the ramp is read two frames at a time
+    mixer.play(1, 1.0, 12.0, -1.0)
+    left = mixer.mix(8)[:, 0]
+    np.testing.assert_allclose(left, np.arange(8) * 2)
+    # The next block continues where the last one stopped
+    left = mixer.mix(4)[:, 0]
+    np.testing.assert_allclose(left, np.arange(8, 12) * 2)
+
+
+def test_voices_end() -> None:
+    mixer = make_mixer()
+    mixer.play(0, 1.0, 12.0, -1.0)
+    output = mixer.mix(BLOCK_SIZE)[:, 0]
+    # The sound at double speed, then silence
+    assert mixer.voice_count == 0
+    np.testing.assert_allclose(output[:500], 1000)
+    np.testing.assert_allclose(output[500:], 0)
+
+
+def test_voices_share_cache_entries() -> None:
+    mixer = make_mixer()
+    for key in (0.0, 0.0, 12.0, 12.0, 12.0):
+        mixer.play(0, 1.0, key, 0.0)
+    stats = mixer.cache.stats
+    assert (stats.hits, stats.misses, stats.entries) == (3, 2, 2)
+
+
+def test_warm_up() -> None:
+    mixer = make_mixer()
+    mixer.warm_up([(1, 12.0), (0, -1.5), (7, 0.0)]).join()
+    mixer.mix(1)
+    assert len(mixer.cache) == 2
+    mixer.play(1, 1.0, 12.0, -1.0)
+    mixer.play(0, 1.0, -1.5, -1.0)
+    assert mixer.cache.stats.hit_rate == 1.0
+    np.testing.assert_allclose(mixer.mix(3)[:, 0], [1000, 1002, 1004])
+
+    # Only what was resampled from a sound replaced meanwhile is discarded
+    thread = mixer.warm_up([(0, 2.0), (1, 2.0)])
+    mixer.set_sound(0, np.full(1000, 500, np.int16), 44100)
+    thread.join()
+    mixer.mix(1)
+    assert (0, 2, 0) not in mixer.cache
+    assert (1, 2, 0) in mixer.cache
+
+    # Discarded if sounds are removed meanwhile
+    thread = mixer.warm_up([(1, 1.0)])
+    mixer.remove_sound(0)
+    thread.join()
+    mixer.mix(1)
+    assert (1, 1, 0) not in mixer.cache
+
+
+def test_steal_voice() -> None:
+    mixer = make_mixer(max_voices=2)
+    mixer.play(1, 1.0, 0.0, -1.0)
+    mixer.play(0, 1.0, 0.0, 1.0)
+    mixer.mix(4)
+    # The constant sound ends before the ramp, so it's stopped first
+    mixer.play(0, 0.5, 0.0, 1.0)
+    assert mixer.voice_count == 2
+    left, right = mixer.mix(4).T
+    np.testing.assert_allclose(left, [4, 5, 6, 7])
+    np.testing.assert_allclose(right, 500)
+    assert mixer.stats.steals == 1
+    assert mixer.stats.peak_voices == 2
+
+
+def test_voice_expiry() -> None:
+    mixer = make_mixer()
+    for key in (0.0, 12.0, 24.0):
+        mixer.play(0, 1.0, key, -1.0)
+    mixer.play(1, 1.0, 0.0, 1.0)
+    # Sounds of 1000, 500 and 250 frames, and a ramp of 2000 frames
+    for voices in (3, 2, 2, 1, 1, 1, 1, 0):
+        mixer.mix(256)
+        assert mixer.voice_count == voices
+    assert mixer.stats.expiries == 4
+    assert mixer.stats.peak_voices == 4
+
+
+def test_remove_sound() -> None:
+    mixer = make_mixer()
+    mixer.play(0, 1.0, 0.0, -1.0)
+    mixer.play(1, 1.0, 0.0, -1.0)
+    mixer.remove_sound(0)
+    assert mixer.voice_count == 1
+    # The ramp is now sound 0
+    np.testing.assert_allclose(mixer.mix(4)[:, 0], [0, 1, 2, 3])
+    # Unknown or missing sounds play nothing
+    mixer.add_sound(None, 44100)
+    mixer.play(1, 1.0, 0.0, 0.0)
+    mixer.play(5, 1.0, 0.0, 0.0)
+    assert mixer.voice_count == 1
+
+
+@pytest.mark.parametrize("voices", [0, 1, 300])
+def test_fill(voices: int) -> None:
+    mixer = make_mixer(buffer_size=4 * BLOCK_SIZE)
+    for _ in range(voices):
+        mixer.play(0, 1.0, 0.0, -1.0)
+    mixer.fill(BLOCK_SIZE + 1)
+    assert len(mixer.buffer) == 2 * BLOCK_SIZE
+    frames = mixer.buffer.read(BLOCK_SIZE)
+    assert frames.dtype == np.int16
+    # Clipped to 16 bits
+    assert frames[0, 0] == min(voices * 1000, 32767)
+
+
+def test_set_sound() -> None:
+    mixer = make_mixer()
+    mixer.play(0, 1.0, 0.0, -1.0)
+    # Sounds can be set in any order, by index
+    mixer.set_sound(3, np.full((100, 2), 200, np.int16), 44100)
+    assert mixer.sounds[2] is None
+    mixer.set_sound(0, np.full(100, 300, np.int16), 44100)
+    mixer.play(0, 1.0, 0.0, -1.0)
+    mixer.play(3, 1.0, 0.0, -1.0)
+    # The voice playing the old sound plays it to the end
+    np.testing.assert_allclose(mixer.mix(2)[:, 0], 1500)
+    assert mixer.voice_count == 3
@@ -0,0 +1,53 @@
+import threading
+
+import numpy as np
+
+from nbs.core.note_queue import NOTE_RECORD, NoteQueue
+
+
+def make_notes(sounds) -> np.ndarray:
+    notes = np.zeros(len(sounds), NOTE_RECORD)
+    notes["sound"] = sounds
+    notes["key"] = 12.5
+    return notes
+
+
+def test_push_pop() -> None:
+    queue = NoteQueue(capacity=8)
+    assert queue.push(make_notes(range(5))) == 5
+    assert queue.pop()["sound"].tolist() == [0, 1, 2, 3, 4]
+    # Wraps around the end of the ring
+    assert queue.push(make_notes(range(5, 11))) == 6
+    assert queue.push_note(11, 0.0, 1.0, -0.5)
+    assert len(queue) == 7
+    notes = queue.pop()
+    assert notes["sound"].tolist() == [5, 6, 7, 8, 9, 10, 11]
+    assert notes["key"].tolist() == [12.5] * 6 + [0.0]
+    assert len(queue.pop()) == 0
+
+
+def test_full_queue_drops_notes() -> None:
+    queue = NoteQueue(capacity=4)
+    assert queue.push(make_notes(range(6))) == 4
+    assert not queue.push_note(6, 0.0, 1.0, 0.0)
+    assert queue.dropped == 3
+    assert queue.pop()["sound"].tolist() == [0, 1, 2, 3]
+
+
+def test_producer_consumer() -> None:
+    queue = NoteQueue(capacity=64)
+    received = []
+    done = threading.Event()
+
+    def consume() -> None:
+        while not done.is_set() or len(queue):
+            received.extend(queue.pop()["sound"].tolist())
+
+    consumer = threading.Thread(target=consume)
+    consumer.start()
+    sent = 0
+    while sent < 10000:
+        sent += queue.push(make_notes(range(sent, min(sent + 10, 10000))))
+    done.set()
+    consumer.join()
+    assert received == list(range(10000))
@@ -0,0 +1,69 @@
+import numpy as np
+
+from nbs.core.data import NoteStore
+from nbs.core.resample import ENTRY_PADDING, ResampleCache, note_pitches, pitch_key
+
+
+def get_samples(cache: ResampleCache, entry: int) -> np.ndarray:
+    offset = cache.offsets[entry]
+    return cache.bank[offset : offset + cache.lengths[entry]]
+
+
+def test_pitch_key() -> None:
+    assert pitch_key(3, 12.0) == (3, 12, 0)
+    assert pitch_key(3, 0.25) == (3, 0, 25)
+    assert pitch_key(3, -0.25) == (3, -1, 75)
+
+
+def test_note_pitches() -> None:
+    notes = NoteStore.from_arrays(
+        tick=np.arange(6),
+        layer=0,
+        instrument=[0, 1, 1, 0, 1, 2],
+        key=[45, 57, 57, 45, 57, 33],
+        pitch=[0, 0, 0, 0, 0, -50],
+    )
+    assert note_pitches(notes) == [(1, 12.0), (0, 0.0), (2, -12.5)]
+
+
+def test_cache_lru() -> None:
+    size = 100 + ENTRY_PADDING
+    cache = ResampleCache(max_size=3 * size * 4)
+    cache.bank = np.zeros(3 * size, np.float32)
+    entries = [
+        cache.add((0, key, 0), np.full(100, key, np.float32), ()) for key in range(3)
+    ]
+    assert cache.get((0, 0, 0)) == entries[0]
+
+    # Entry 1 is the least recently used, but still playing
+    cache.add((0, 3, 0), np.full(100, 3, np.float32), [entries[1]])
+    assert (0, 1, 0) in cache
+    assert (0, 2, 0) not in cache
+    assert cache.get((0, 2, 0)) == -1
+    assert cache.stats.evictions == 1
+    assert cache.stats.hit_rate == 0.5
+    assert cache.stats.size <= cache.max_size
+    # Entries keep their IDs when they're moved
+    for key in (0, 1, 3):
+        entry = cache.get((0, key, 0))
+        np.testing.assert_array_equal(get_samples(cache, entry), key)
+        assert cache.bank[cache.offsets[entry] + 100] == 0
+
+
+def test_cache_remove_sound() -> None:
+    cache = ResampleCache()
+    first = cache.add((0, 0, 0), np.ones(10, np.float32), ())
+    second = cache.add((1, 0, 0), np.ones(20, np.float32), ())
+    cache.remove_sound(0)
+    assert len(cache) == 1
+    assert cache.get((0, 0, 0)) == second
+    assert first != second
+
+
+def test_cache_replace_sound() -> None:
+    cache = ResampleCache()
+    cache.add((0, 0, 0), np.ones(10, np.float32), ())
+    second = cache.add((1, 0, 0), np.ones(20, np.float32), ())
+    cache.remove_sound(0, shift=False)
+    assert (0, 0, 0) not in cache
+    assert cache.get((1, 0, 0)) == second
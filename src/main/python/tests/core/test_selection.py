@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from nbs.controller.note import NoteController
+from nbs.core.data import NoteStore
+from nbs.core.selection import Selection
+
+
+@pytest.fixture
+def selection() -> Selection:
+    selection = Selection()
+    selection.select(np.array([1, 3, 5]))
+    return selection
+
+
+def test_select(selection: Selection) -> None:
+    assert selection.count == 3
+    assert selection.ids().tolist() == [1, 3, 5]
+    assert 3 in selection
+    assert 2 not in selection
+    assert 1000 not in selection
+    assert selection.contains(np.array([0, 1, 1000])).tolist() == [False, True, False]
+
+
+def test_select_grows_mask(selection: Selection) -> None:
+    selection.select(np.array([5, 100]))
+    assert selection.count == 4
+    assert selection.ids().tolist() == [1, 3, 5, 100]
+
+
+def test_deselect(selection: Selection) -> None:
+    selection.deselect(np.array([1, 2, 1000]))
+    assert selection.count == 2
+    assert selection.ids().tolist() == [3, 5]
+
+
+def test_set(selection: Selection) -> None:
+    selection.set(np.array([0, 5]))
+    assert selection.count == 2
+    assert selection.ids().tolist() == [0, 5]
+
+
+def test_invert(selection: Selection) -> None:
+    selection.invert(np.arange(6))
+    assert selection.count == 3
+    assert selection.ids().tolist() == [0, 2, 4]
+
+
+def test_clear(selection: Selection) -> None:
+    selection.clear()
+    assert selection.count == 0
+    assert len(selection.ids()) == 0
+
+
+def test_changed_once_per_operation(selection: Selection) -> None:
+    calls = []
+    selection.changed.connect(lambda: calls.append(selection.count))
+    selection.select(np.arange(1000))
+    selection.select(np.array([1, 3]))  # Already selected
+    selection.invert(np.arange(2000))
+    selection.set(np.arange(1000, 2000))  # Unchanged
+    selection.deselect(np.array([0]))  # Not selected
+    selection.clear()
+    assert calls == [1000, 1000, 0]
+
+
+def test_removed_notes_are_deselected() -> None:
+    notes = NoteStore.from_arrays(tick=[0, 1, 2], layer=0, instrument=0, key=45)
+    controller = NoteController(notes)
+    controller.selection.select(controller.ids)
+    controller.removeNotes(np.array([1]))
+    assert controller.selection.ids().tolist() == [0, 2]
+    controller.load(notes)
+    assert controller.selection.count == 0
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from nbs.core.data import NoteStore
+from nbs.core.stats import NoteStatistics
+
+
+@pytest.fixture
+def notes() -> NoteStore:
+    return NoteStore.from_arrays(
+        tick=[0, 0, 0, 4, 8], layer=[0, 1, 2, 1, 3], instrument=[0, 0, 2, 1, 0], key=45
+    )
+
+
+def test_stats(notes: NoteStore) -> None:
+    stats = NoteStatistics(notes)
+    assert stats.count == 5
+    assert stats.instrument_counts.tolist() == [3, 1, 1]
+    assert stats.layer_counts.tolist() == [1, 2, 1, 1]
+    assert stats.count_in_instrument(2) == 1
+    assert stats.count_in_instrument(100) == 0
+    assert stats.count_in_layer(1) == 2
+    assert stats.polyphony(0) == 3
+    assert stats.max_polyphony == 3
+    assert (stats.first_tick, stats.last_tick) == (0, 8)
+    assert (stats.first_layer, stats.last_layer) == (0, 3)
+    assert stats.length == 9
+    assert stats.height == 4
+
+
+def test_stats_empty() -> None:
+    stats = NoteStatistics()
+    assert stats.count == 0
+    assert stats.max_polyphony == 0
+    assert stats.first_tick is None
+    assert stats.length == 0
+    assert len(stats.instrument_counts) == 0
+
+
+def test_stats_remove_updates_bounds(notes: NoteStore) -> None:
+    stats = NoteStatistics(notes)
+    stats.remove(notes[[0, 1, 2]])
+    assert stats.count == 2
+    assert stats.first_tick == 4
+    assert stats.first_layer == 1
+    assert stats.max_polyphony == 1
+    stats.remove(notes[[3, 4]])
+    assert stats.count == 0
+    assert stats.first_tick is None
+    assert stats.last_layer is None
+    assert stats.max_polyphony == 0
+
+
+def test_stats_replace(notes: NoteStore) -> None:
+    stats = NoteStatistics(notes)
+    moved = notes[[3, 4]]
+    moved.writeable_column("tick")[:] = 0
+    stats.replace(notes[[3, 4]], moved)
+    assert stats.max_polyphony == 5
+    assert stats.length == 1
+
+
+def test_stats_reset(notes: NoteStore) -> None:
+    stats = NoteStatistics(notes)
+    stats.reset(notes[[0]])
+    assert stats.count == 1
+    assert stats.length == 1
+
+
+def test_stats_match_notes() -> None:
+    rng = np.random.default_rng(0)
+    size = 1000
+    notes = NoteStore.from_arrays(
+        tick=rng.integers(0, 100, size),
+        layer=rng.integers(0, 20, size),
+        instrument=rng.integers(0, 16, size),
+        key=45,
+    )
+    stats = NoteStatistics(notes)
+    for _ in range(20):
+        rows = rng.choice(len(notes), 50, replace=False)
+        old = notes[rows]
+        notes.writeable_column("tick")[rows] = rng.integers(0, 200, len(rows))
+        notes.writeable_column("layer")[rows] = rng.integers(0, 30, len(rows))
+        stats.replace(old, notes[rows])
+
+    assert stats.instrument_counts.tolist() == np.bincount(notes.instrument).tolist()
+    assert stats.layer_counts.tolist() == np.bincount(notes.layer).tolist()
+    assert stats.max_polyphony == np.bincount(notes.tick).max()
+    assert stats.first_tick == notes.tick.min()
+    assert stats.last_tick == notes.tick.max()
+
+
+def test_stats_negative_values(notes: NoteStore) -> None:
+    stats = NoteStatistics(notes)
+    moved = notes[[0]]
+    moved.writeable_column("tick")[:] = -3
+    with pytest.raises(ValueError):
+        stats.add(moved)
+    assert stats.polyphony(13) == 0
+    assert stats.first_tick == 0
@@ -0,0 +1,86 @@
+import json
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from nbs import cli
+from nbs.core.data import Layer, NoteStore, Song, SongHeader
+from nbs.core.file import load_song, save_song
+
+
+@pytest.fixture
+def songs(tmp_path: Path) -> List[Path]:
+    paths = [tmp_path / "songs" / "a.nbs", tmp_path / "songs" / "sub" / "b.nbs"]
+    for i, path in enumerate(paths):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        notes = NoteStore.from_arrays(
+            tick=[0, 4, 4], layer=[0, 0, 1], instrument=0, key=45
+        )
+        layers = [Layer() for _ in range(2 - i)]
+        save_song(Song(SongHeader(title=f"Song {i}"), notes, layers, []), path)
+    (tmp_path / "songs" / "broken.nbs").write_bytes(b"\x00\x00\x05\x10")
+    (tmp_path / "songs" / "notes.txt").write_text("Not a song")
+    return paths
+
+
+def read_report(path: Path) -> List[dict]:
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_find_songs(tmp_path: Path, songs: List[Path]) -> None:
+    found = list(cli.find_songs([str(tmp_path / "songs")]))
+    assert [Path(path).name for path in found] == ["a.nbs", "broken.nbs", "b.nbs"]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_info(tmp_path: Path, songs: List[Path], jobs: int) -> None:
+    report = tmp_path / "report.jsonl"
+    args = ["info", str(tmp_path / "songs"), "-j", str(jobs), "-r", str(report)]
+    assert cli.main(args) == 1
+    results = read_report(report)
+    assert [result["ok"] for result in results] == [True, False, True]
+    assert results[0]["title"] == "Song 0"
+    assert results[0]["note_count"] == 3
+    assert results[0]["length"] == 5
+    assert results[1]["error"].startswith("ValueError")
+
+
+def test_validate(tmp_path: Path, songs: List[Path]) -> None:
+    report = tmp_path / "report.jsonl"
+    assert cli.main(["validate", str(songs[1]), "-r", str(report)]) == 0
+    (result,) = read_report(report)
+    assert result["note_count"] == 3
+    assert result["problems"] == ["1 notes in layers past the last layer"]
+
+
+def test_convert(tmp_path: Path, songs: List[Path]) -> None:
+    report = tmp_path / "report.jsonl"
+    output = tmp_path / "converted"
+    args = ["convert", str(tmp_path / "songs"), "--version", "3", "-o", str(output)]
+    assert cli.main(args + ["-r", str(report), "-j", "2", "--chunk-size", "1"]) == 1
+    assert [result["ok"] for result in read_report(report)] == [True, False, True]
+    song = load_song(output / "sub" / "b.nbs")
+    assert song.header.version == 3
+    assert song.header.title == "Song 1"
+    assert not (output / "broken.nbs").exists()
+
+
+def test_recompress(tmp_path: Path, songs: List[Path]) -> None:
+    report = tmp_path / "report.jsonl"
+    expected = [load_song(path) for path in songs]
+    args = ["convert", str(tmp_path / "songs"), "--compress", "xz", "--replace"]
+    assert cli.main(args + ["-r", str(report)]) == 1
+    for path, song in zip(songs, expected):
+        assert not path.exists()
+        assert load_song(path.with_suffix(".nbs.xz")) == song
+
+    # Compressed songs are found, and can be recompressed again
+    args = ["convert", str(tmp_path / "songs"), "--compress", "gzip", "--replace"]
+    assert cli.main(args + ["-r", str(report)]) == 1
+    assert sorted(path.name for path in (tmp_path / "songs").rglob("*.nbs*")) == [
+        "a.nbs.gz",
+        "b.nbs.gz",
+        "broken.nbs",
+    ]
+    assert load_song(songs[0].with_suffix(".nbs.gz")) == expected[0]
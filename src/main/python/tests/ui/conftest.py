@@ -0,0 +1,4 @@
+from PyQt5 import QtWidgets
+
+# The workspace modules read the application's style when they're imported
+app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
@@ -0,0 +1,55 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+from PyQt5 import QtWidgets
+
+from nbs.core.data import NoteStore
+from nbs.ui.workspace.constants import BLOCK_SIZE
+from nbs.ui.workspace.note_blocks import NoteBlockArea
+
+
+@pytest.fixture
+def area() -> NoteBlockArea:
+    notes = NoteStore.from_arrays(tick=[0, 1, 2, 3], layer=0, key=45, instrument=0)
+    area = NoteBlockArea([], QtWidgets.QMenu())
+    area.loadNoteData(notes)
+    return area
+
+
+def selected_ticks(area: NoteBlockArea) -> list:
+    ids = np.sort(area.selectedIds())
+    return area.noteController.getNotes(ids).tick.tolist()
+
+
+def test_select_all_left_of_click_inside_tick(area: NoteBlockArea) -> None:
+    # A click in the middle of tick 1 selects up to and including it
+    area.selectAllLeft(BLOCK_SIZE * 1.5)
+    assert selected_ticks(area) == [0, 1]
+
+
+def test_select_all_right_of_click_inside_tick(area: NoteBlockArea) -> None:
+    area.selectAllRight(BLOCK_SIZE * 1.5)
+    assert selected_ticks(area) == [1, 2, 3]
+
+
+def test_note_block_memory() -> None:
+    size = 20_000
+    notes = NoteStore.from_arrays(
+        tick=np.arange(size) // 4,
+        layer=np.arange(size) % 4,
+        instrument=np.arange(size) % 16,
+        key=np.arange(size) % 88,
+    )
+    area = NoteBlockArea([], QtWidgets.QMenu())
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        area.loadNoteData(notes)
+        scene_size = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    assert len(area.blocksById) == size
+    # The block, its indices and the stored note. The Qt item behind each block
+    # is allocated by Qt, so it isn't traced
+    assert scene_size / size <= 800